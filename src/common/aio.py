@@ -0,0 +1,142 @@
+"""
+asyncio API: evaluate without blocking the event loop (bots, dashboards).
+
+* CPU work is offloaded to an executor (threads by default, or processes with `executor="process"`),
+* single-flight: identical requests in flight (same profiles, compared by value) are computed once and shared,
+* the number of evaluations running at the same time is bounded by a semaphore,
+* `stream` evaluates a (possibly huge, sync or async) iterable of requests with backpressure: at most `max_pending`
+requests are pulled ahead of the consumer, results are yielded in the order of the requests.
+
+By default, an evaluation is `kernel.evaluate` (same as `launch_workflow`): any function `f(weapon, target, rules)`
+can be given instead (e.g. `engine.evaluate`; must be picklable with processes).
+
+Usage:
+```
+async with AsyncEvaluator() as evaluator:
+    enemy_dead, remaining_hp = await evaluator.evaluate(weapon, target, rules)
+    async for index, result in evaluator.stream(rows):  # rows: iterable of (weapon, target, rules)
+        ...
+```
+"""
+import asyncio
+import sys
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from os.path import dirname, abspath
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, Tuple, Union
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.kernel import evaluate
+from common.profile import WeaponProfile, TargetProfile, RuleSet
+from common.utils import AIO_MAX_CONCURRENCY, AIO_MAX_PENDING
+
+# Request: (weapon, target, rules)
+Row = Tuple[WeaponProfile, TargetProfile, RuleSet]
+
+
+class AsyncEvaluator:
+    """
+    Evaluate requests from coroutines (see module docstring).
+    """
+
+    def __init__(self,
+                 function: Callable[[WeaponProfile, TargetProfile, RuleSet], Any] = evaluate,
+                 max_concurrency: int = AIO_MAX_CONCURRENCY,
+                 executor: Union[str, Executor] = "thread"):
+        """
+        :param function: Evaluation of one request
+        :param max_concurrency: Maximum number of evaluations running at the same time
+        :param executor: "thread", "process", or an `Executor` (not shut down by `close`)
+        """
+        self.function = function
+        self.max_concurrency = max_concurrency
+        if executor == "thread":
+            self._executor, self._owned = ThreadPoolExecutor(max_concurrency), True
+        elif executor == "process":
+            self._executor, self._owned = ProcessPoolExecutor(max_concurrency), True
+        elif isinstance(executor, Executor):
+            self._executor, self._owned = executor, False
+        else:
+            raise ValueError(f"Unknown executor {executor!r}, expected 'thread', 'process' or an Executor")
+        # Created lazily (bound to the running loop)
+        self._semaphore = None
+        self._in_flight: Dict[Row, asyncio.Task] = {}
+        # Counters
+        self.nb_computed = 0
+        self.nb_coalesced = 0
+
+    async def evaluate(self, weapon: WeaponProfile, target: TargetProfile, rules: RuleSet) -> Any:
+        """
+        Evaluate one request. If the same request is already in flight, wait for its result instead.
+        """
+        key = (weapon, target, rules)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute(key))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.nb_coalesced += 1
+        # Shielded: a caller cancelled does not cancel the computation shared with the others
+        return await asyncio.shield(task)
+
+    async def stream(self, rows: Union[Iterable[Row], AsyncIterable[Row]],
+                     max_pending: int = AIO_MAX_PENDING) -> AsyncIterator[Tuple[int, Any]]:
+        """
+        Evaluate an iterable of requests, with at most `max_pending` requests pulled ahead of the consumer.
+
+        :return: Async iterator over (<index of the request>, <result>), in the order of the requests
+        """
+        pending = deque()
+        index = 0
+        try:
+            async for row in _aiter(rows):
+                pending.append(asyncio.ensure_future(self.evaluate(*row)))
+                if len(pending) >= max_pending:
+                    # Backpressure: wait for the oldest request (and the consumer) before pulling more
+                    yield index, await pending.popleft()
+                    index += 1
+            while pending:
+                yield index, await pending.popleft()
+                index += 1
+        finally:
+            # Consumer gone: cancel the requests not consumed
+            for task in pending:
+                task.cancel()
+
+    async def close(self) -> None:
+        if self._owned:
+            await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    async def __aenter__(self) -> "AsyncEvaluator":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def _compute(self, key: Row) -> Any:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            self.nb_computed += 1
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self.function, *key)
+
+
+async def _aiter(rows: Union[Iterable[Row], AsyncIterable[Row]]) -> AsyncIterator[Row]:
+    """
+    Iterate over a sync or async iterable.
+    """
+    if hasattr(rows, "__aiter__"):
+        async for row in rows:
+            yield row
+    else:
+        for row in rows:
+            yield row
@@ -0,0 +1,233 @@
+"""
+Fast approximation of the result of an attack for large dice pools (hordes, big sweeps).
+
+Instead of PMFs (`distribution.py`) or dice rolls (`montecarlo.py`), the first 3 cumulants (mean, variance, third
+central moment) of each variable are propagated analytically through the stages of the workflow:
+1. wound dice: Bernoulli (damage event = failed save or devastating wound),
+2. attack: mixture of miss / hit / critical hit (sustain hits: random sum of wound dice, lethal hit: save only),
+3. figurine: random sum of attacks, unit: sum of `nb_figs` figurines,
+4. allocation: renewal theory. Killing a figurine takes a random number of events T (mean and variance computed on the
+HP of one figurine), so kills ~ N / E[T] + (Var[T] - E[T]^2 + E[T]) / (2 E[T]^2) (discrete renewal correction), with
+variance N * Var[T] / E[T]^3 + Var[N] / E[T]^2. HP lost: kills * HP + average damage on the current figurine.
+
+Cost does not depend on the size of the pool (O(1) per target, O(HP) for the allocation).
+
+Random sum S of N copies of X (cumulants k1, k2, k3):
+    k1(S) = k1(N) k1(X)
+    k2(S) = k1(N) k2(X) + k2(N) k1(X)^2
+    k3(S) = k1(N) k3(X) + 3 k2(N) k1(X) k2(X) + k3(N) k1(X)^3
+
+The result is a normal law, skew-corrected (Edgeworth), with an error estimate on the probabilities (Berry-Esseen bound
+on the number of events). Small pools fall back automatically to the exact distribution.
+
+Usage:
+```
+result = approximate(weapon, target, rules)
+result.mean_dead, result.std_dead
+result.kill_probability(10)  # Probability to kill at least 10 enemies
+```
+"""
+import math
+import sys
+from dataclasses import dataclass
+from os.path import dirname, abspath
+from typing import Iterable, Tuple, Union
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.dice import dice_expression_pmf, average_dice_expression
+from common.distribution import (ExactResult, PMF, exact_distribution, stage_probas, attack_event_pmf,
+                                 event_damage_pmf)
+from common.profile import WeaponProfile, TargetProfile, RuleSet
+from common.utils import APPROX_MIN_ATTACKS
+
+# Cumulants (k1, k2, k3)
+Cumulants = Tuple[float, float, float]
+
+# Constant of the Berry-Esseen theorem (Shevtsova, 2011)
+BERRY_ESSEEN_CONSTANT = 0.4748
+
+
+@dataclass(frozen=True)
+class ApproxResult:
+    """
+    Approximated distribution of the result of an attack.
+    """
+    mean_dead: float
+    std_dead: float
+    # Skewness of the number of dead enemies (0: symmetric)
+    skewness_dead: float
+    mean_hp_lost: float
+    std_hp_lost: float
+    # Estimated error on the probabilities
+    error: float
+    # If True, probabilities are skew-corrected
+    skew: bool = True
+
+    def kill_probability(self, min_dead: int) -> float:
+        """
+        Probability to kill at least `min_dead` enemies (with continuity correction).
+        """
+        if self.std_dead == 0:
+            return float(self.mean_dead >= min_dead)
+        z = (min_dead - 0.5 - self.mean_dead) / self.std_dead
+        cdf = _normal_cdf(z)
+        if self.skew:
+            # Edgeworth expansion (first order)
+            cdf -= _normal_pdf(z) * self.skewness_dead / 6 * (z ** 2 - 1)
+        return min(max(1 - cdf, 0.), 1.)
+
+
+def approximate(weapon: WeaponProfile,
+                target: TargetProfile,
+                rules: RuleSet,
+                skew: bool = True,
+                min_attacks: float = APPROX_MIN_ATTACKS) -> Union[ApproxResult, ExactResult]:
+    """
+    Approximate the distribution of the number of dead enemies and of the HP lost.
+
+    :param weapon: Attacking unit
+    :param target: Target (a squad large enough to absorb all the damage)
+    :param rules: Criticals, re-rolls and weapon abilities
+    :param skew: If True, probabilities are skew-corrected
+    :param min_attacks: Below this average number of attacks, the exact distribution is returned
+
+    :return: `ApproxResult` or `ExactResult` (small pools). Both give `mean_dead`, `mean_hp_lost`,
+        `kill_probability()` and `error`.
+    """
+    nb_attack = weapon.nb_figs * average_dice_expression(weapon.weapon_a)
+    if nb_attack < min_attacks:
+        return exact_distribution(weapon, target, rules)
+
+    # 1/ Damage events of one attack
+    # ------------------------------------------------------------------------------
+    probas = stage_probas(weapon, target, rules)
+    wound_dice = _bernoulli_cumulants(probas["event_wound"])
+    if rules.torrent:
+        attack = wound_dice
+    else:
+        sustain = _compound_cumulants(_pmf_cumulants(dice_expression_pmf(rules.sustain_hit)), wound_dice)
+        first = _bernoulli_cumulants(probas["failed_save"]) if rules.lethal_hit else wound_dice
+        crit_hit = _sum_cumulants(first, sustain)
+        attack = _mixture_cumulants([(probas["miss"], (0., 0., 0.)), (probas["hit"], wound_dice),
+                                     (probas["crit_hit"], crit_hit)])
+
+    # 2/ Damage events of the unit
+    # ------------------------------------------------------------------------------
+    figurine = _compound_cumulants(_pmf_cumulants(dice_expression_pmf(weapon.weapon_a)), attack)
+    n1, n2, n3 = (weapon.nb_figs * k for k in figurine)
+
+    # 3/ Allocation (renewal: number of events to kill one figurine)
+    # ------------------------------------------------------------------------------
+    mean_events, var_events, mean_wounds = events_to_kill(event_damage_pmf(weapon, target), target.enemy_hp)
+    if n1 == 0 or mean_events == math.inf:
+        return ApproxResult(mean_dead=0., std_dead=0., skewness_dead=0., mean_hp_lost=0., std_hp_lost=0., error=0.,
+                            skew=skew)
+
+    mean_dead = n1 / mean_events + (var_events - mean_events ** 2 + mean_events) / (2 * mean_events ** 2)
+    var_dead = n1 * var_events / mean_events ** 3 + n2 / mean_events ** 2
+    third_dead = n3 / mean_events ** 3
+    std_dead = math.sqrt(var_dead)
+
+    # 4/ Error estimate: Berry-Esseen bound on the number of events (sum of `nb_attack` attacks)
+    # ------------------------------------------------------------------------------
+    per_attack = attack_event_pmf(weapon, target, rules)
+    mu, var = attack[0], attack[1]
+    if var > 0:
+        rho = sum(p * abs(x - mu) ** 3 for x, p in per_attack.items())
+        error = min(BERRY_ESSEEN_CONSTANT * rho / (var ** 1.5 * math.sqrt(nb_attack)), 1.)
+    else:
+        error = 0.
+
+    return ApproxResult(mean_dead=mean_dead,
+                        std_dead=std_dead,
+                        skewness_dead=third_dead / std_dead ** 3 if std_dead > 0 else 0.,
+                        mean_hp_lost=mean_dead * target.enemy_hp + mean_wounds,
+                        std_hp_lost=std_dead * target.enemy_hp,
+                        error=error,
+                        skew=skew)
+
+
+# Cumulants
+# ----------------------------------------------------------------------------
+def _bernoulli_cumulants(p: float) -> Cumulants:
+    return p, p * (1 - p), p * (1 - p) * (1 - 2 * p)
+
+
+def _pmf_cumulants(pmf: PMF) -> Cumulants:
+    k1 = sum(x * p for x, p in pmf.items())
+    k2 = sum((x - k1) ** 2 * p for x, p in pmf.items())
+    k3 = sum((x - k1) ** 3 * p for x, p in pmf.items())
+    return k1, k2, k3
+
+
+def _sum_cumulants(a: Cumulants, b: Cumulants) -> Cumulants:
+    """
+    Cumulants of the sum of 2 independent variables.
+    """
+    return a[0] + b[0], a[1] + b[1], a[2] + b[2]
+
+
+def _compound_cumulants(count: Cumulants, item: Cumulants) -> Cumulants:
+    """
+    Cumulants of a random sum: N (cumulants `count`) independent copies of X (cumulants `item`).
+    """
+    n1, n2, n3 = count
+    x1, x2, x3 = item
+    return (n1 * x1,
+            n1 * x2 + n2 * x1 ** 2,
+            n1 * x3 + 3 * n2 * x1 * x2 + n3 * x1 ** 3)
+
+
+def _mixture_cumulants(weighted: Iterable[Tuple[float, Cumulants]]) -> Cumulants:
+    """
+    Cumulants of a mixture: list of (<weight>, <cumulants>), through the raw moments.
+    """
+    m1 = m2 = m3 = 0.
+    for weight, (k1, k2, k3) in weighted:
+        m1 += weight * k1
+        m2 += weight * (k2 + k1 ** 2)
+        m3 += weight * (k3 + 3 * k1 * k2 + k1 ** 3)
+    return m1, m2 - m1 ** 2, m3 - 3 * m1 * m2 + 2 * m1 ** 3
+
+
+def events_to_kill(damage_pmf: PMF, enemy_hp: int) -> Tuple[float, float, float]:
+    """
+    Mean and variance of the number of events needed to kill one figurine (damage exceeding the HP is lost), and
+    average damage on the figurine currently wounded (in the long run).
+
+    m1(h), m2(h): first 2 moments of the number of events to remove `h` HP, with events of damage 0 (feel no pain)
+    looping on the same state. visits(w): average number of events received by a figurine with `w` damage.
+
+    :return: Tuple (mean, variance, average damage), (inf, 0, 0) if the events never deal damage
+    """
+    p0 = damage_pmf.get(0, 0.)
+    if p0 >= 1:
+        return math.inf, 0., 0.
+
+    visits = [0.] * enemy_hp
+    for w in range(enemy_hp):
+        visits[w] = ((w == 0) + sum(visits[w - d] * p for d, p in damage_pmf.items() if 0 < d <= w)) / (1 - p0)
+
+    m1 = [0.] * (enemy_hp + 1)
+    m2 = [0.] * (enemy_hp + 1)
+    for h in range(1, enemy_hp + 1):
+        after = [(p, max(h - d, 0)) for d, p in damage_pmf.items() if d > 0]
+        m1[h] = (1 + sum(p * m1[r] for p, r in after)) / (1 - p0)
+        m2[h] = (1 + 2 * p0 * m1[h] + sum(p * (2 * m1[r] + m2[r]) for p, r in after)) / (1 - p0)
+    return m1[enemy_hp], m2[enemy_hp] - m1[enemy_hp] ** 2, sum(w * v for w, v in enumerate(visits)) / m1[enemy_hp]
+
+
+def _normal_cdf(z: float) -> float:
+    return 0.5 * (1 + math.erf(z / math.sqrt(2)))
+
+
+def _normal_pdf(z: float) -> float:
+    return math.exp(-z ** 2 / 2) / math.sqrt(2 * math.pi)
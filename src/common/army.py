@@ -0,0 +1,170 @@
+"""
+Army list builder: composition (number of copies of each unit) maximizing the expected damage against a mix of
+targets, within a points budget and slot limits (max copies of each unit, max number of units).
+
+1. Value table: expected damage (HP lost, `engine.evaluate`, i.e. `launch_workflow`) of each unit against each target,
+computed once in one batch,
+2. Bounded knapsack, by dynamic programming over (points spent, number of units), one unit at a time. Each cell keeps:
+    * the best `top` compositions (weighted damage of the mix), so the `top` best armies are exact,
+    * or, multi-objective (`pareto=True`): the compositions not dominated on the damage against each target (capped to
+    `ARMY_MAX_FRONT` per cell, best weighted damage first).
+Points are divided by their greatest common divisor (e.g. 5) to keep the table small.
+
+Usage:
+```
+units = [ArmyUnit("intercessors", WeaponProfile(nb_figs=5, ...), points=80, max_count=3), ...]
+solutions = optimize_army(units, budget=1000, max_units=8)
+solutions[0].counts  # {"intercessors": 3, ...}
+```
+"""
+import sys
+from dataclasses import dataclass, field
+from math import gcd
+from os.path import dirname, abspath
+from typing import Dict, List, Optional, Tuple
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.engine import evaluate
+from common.enemy import opponent_datasheets
+from common.profile import WeaponProfile, TargetProfile, RuleSet
+from common.utils import ARMY_TOP_SOLUTIONS, ARMY_MAX_FRONT
+
+# Partial composition in a cell: (<weighted damage>, <damage per target>, <copies of each unit seen so far>)
+Partial = Tuple[float, Tuple[float, ...], Tuple[int, ...]]
+
+
+@dataclass(frozen=True)
+class ArmyUnit:
+    name: str
+    weapon: WeaponProfile
+    rules: RuleSet = field(default_factory=RuleSet)
+    points: int = 0
+    # Maximum number of copies of the unit in the army
+    max_count: int = 1
+
+
+@dataclass(frozen=True)
+class ArmySolution:
+    # {<unit name>: <number of copies>} (units taken only)
+    counts: Dict[str, int]
+    points: int
+    # Expected damage weighted by the target mix
+    value: float
+    # {<target name>: <expected damage>}
+    damage: Dict[str, float]
+
+
+def value_table(units: List[ArmyUnit], targets: Dict[str, TargetProfile]) -> List[Tuple[float, ...]]:
+    """
+    Expected damage (HP lost) of one copy of each unit against each target.
+
+    :return: List (index: unit) of tuples (index: target, in the order of `targets`)
+    """
+    return [tuple(evaluate(unit.weapon, target, unit.rules).mean_hp_lost for target in targets.values())
+            for unit in units]
+
+
+def optimize_army(units: List[ArmyUnit],
+                  budget: int,
+                  targets: Dict[str, TargetProfile] = None,
+                  weights: Dict[str, float] = None,
+                  max_units: Optional[int] = None,
+                  top: int = ARMY_TOP_SOLUTIONS,
+                  pareto: bool = False,
+                  verbose: bool = False) -> List[ArmySolution]:
+    """
+    Best armies within the points budget.
+
+    :param units: Units available
+    :param budget: Points budget
+    :param targets: {<name>: <target>} (default: the datasheets of `opponent_datasheets`)
+    :param weights: {<target name>: <weight>} of the mix (default: same weight for all the targets)
+    :param max_units: Maximum number of units in the army (None: no limit)
+    :param top: Number of solutions returned
+    :param pareto: If True, return the armies not dominated on the damage against each target (best weighted damage
+        first, at most `top`)
+    :param verbose: If True, print the size of the DP table
+
+    :return: List of `ArmySolution`, best first
+    """
+    if targets is None:
+        targets = {name: TargetProfile.from_datasheet(carac) for name, carac in opponent_datasheets.items()}
+    weights = weights or {name: 1. for name in targets}
+    total = sum(weights.values())
+    weight_vector = tuple(weights.get(name, 0.) / total for name in targets)
+
+    # 1/ Value table (one batch)
+    # ------------------------------------------------------------------------------
+    table = value_table(units, targets)
+
+    # 2/ Bounded knapsack over (points, number of units), points divided by their GCD
+    # ------------------------------------------------------------------------------
+    step = 0
+    for points in [unit.points for unit in units] + [budget]:
+        step = gcd(step, int(points))
+    step = step or 1
+    capacity = budget // step
+    zero = tuple(0. for _ in targets)
+    cells: Dict[Tuple[int, int], List[Partial]] = {(0, 0): [(0., zero, ())]}
+    for unit, damage in zip(units, table):
+        cost = unit.points // step
+        unit_value = sum(w * d for w, d in zip(weight_vector, damage))
+        new_cells: Dict[Tuple[int, int], List[Partial]] = {}
+        for (spent, nb_units), partials in cells.items():
+            for count in range(unit.max_count + 1):
+                key = (spent + count * cost, nb_units + count)
+                if key[0] > capacity or (max_units is not None and key[1] > max_units):
+                    break
+                new_cells.setdefault(key, []).extend(
+                    (value + count * unit_value, tuple(v + count * d for v, d in zip(vector, damage)), counts + (count,))
+                    for value, vector, counts in partials)
+        cells = {key: _pareto(partials, ARMY_MAX_FRONT) if pareto else _top(partials, top)
+                 for key, partials in new_cells.items()}
+    if verbose:
+        print(f"[DEBUG] DP table: {len(cells)} cells, {sum(len(p) for p in cells.values())} partial armies")
+
+    # 3/ Best solutions over all the cells
+    # ------------------------------------------------------------------------------
+    partials = [partial for cell in cells.values() for partial in cell]
+    best = _pareto(partials, top) if pareto else _top(partials, top)
+    names = list(targets)
+    return [ArmySolution(counts={unit.name: count for unit, count in zip(units, counts) if count},
+                         points=sum(unit.points * count for unit, count in zip(units, counts)),
+                         value=value,
+                         damage=dict(zip(names, vector)))
+            for value, vector, counts in best]
+
+
+# Utils
+# ----------------------------------------------------------------------------
+def _top(partials: List[Partial], top: int) -> List[Partial]:
+    """
+    The `top` best partial armies (weighted damage).
+    """
+    return sorted(partials, key=lambda partial: partial[0], reverse=True)[:top]
+
+
+def _pareto(partials: List[Partial], max_size: int) -> List[Partial]:
+    """
+    Partial armies not dominated on the damage against each target (best weighted damage first, at most `max_size`).
+    """
+    front = []
+    for partial in sorted(partials, key=lambda partial: partial[0], reverse=True):
+        # Sorted by weighted damage: a partial army can only be dominated by one seen before
+        if not any(_dominates(other[1], partial[1]) for other in front):
+            front.append(partial)
+            if len(front) == max_size:
+                break
+    return front
+
+
+def _dominates(a: Tuple[float, ...], b: Tuple[float, ...]) -> bool:
+    return all(x >= y for x, y in zip(a, b)) and a != b
@@ -0,0 +1,365 @@
+"""
+Split the fire of an army across enemy units: assignment of each attacker to one target maximizing the expected kills
+(or points removed), "kill this unit first" targets being served first.
+
+1. Value matrix: the distribution of the dead enemies of each (attacker, target) pair is computed once, in one batch
+(exact distribution, cached per pair: the same weapon against the same target is never recomputed),
+2. Solver:
+    * `exclusive=True` (at most one attacker per target): Hungarian algorithm on the value matrix, O(n^3),
+    * otherwise, several attackers may shoot the same target: the kills of a target are the sum of the kills of its
+    attackers (convolution of their distributions, capped by the size of the unit: no value for overkill). Exact search
+    by dynamic programming over the subsets of attackers (O(targets * 3^attackers)), or local search (moving one
+    attacker at a time) above `ASSIGNMENT_MAX_DP_ATTACKERS` attackers.
+
+Score of a target: expected dead models (`objective="kills"`) or expected points removed (`objective="points"`). A
+target with `min_dead` ("kill first") adds the probability to kill at least `min_dead` models, weighted by
+`THRESHOLD_WEIGHT` times the total value of the enemies: thresholds are served first (lexicographic order).
+
+NB: the damage of an attacker on a model not killed is not carried over to the next attacker. To split the models of
+an attacker, use `split` (each part is an attacker).
+
+Usage:
+```
+attackers = [Attacker("intercessors", WeaponProfile(...)), *split(Attacker("devastators", WeaponProfile(...)), 2)]
+enemies = [EnemyUnit("marine", TargetProfile(...), nb_models=10, points=90, min_dead=5), ...]
+plan = assign(attackers, enemies, objective="points")
+plan.targets  # {"intercessors": "marine", ...}
+```
+"""
+import sys
+from dataclasses import dataclass, field
+from functools import lru_cache
+from os.path import dirname, abspath
+from typing import Dict, List, Optional
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.distribution import PMF, exact_distribution
+from common.profile import WeaponProfile, TargetProfile, RuleSet
+from common.utils import ASSIGNMENT_MAX_DP_ATTACKERS
+
+# Size of the cache of (attacker, target) distributions
+CACHE_SIZE = 4096
+
+OBJECTIVES = ("kills", "points")
+
+# Weight of the "kill first" thresholds (relative to the total value of the enemies)
+THRESHOLD_WEIGHT = 1e6
+
+
+@dataclass(frozen=True)
+class Attacker:
+    """
+    Shooting unit.
+    """
+    name: str
+    weapon: WeaponProfile
+    rules: RuleSet = field(default_factory=RuleSet)
+
+
+@dataclass(frozen=True)
+class EnemyUnit:
+    """
+    Target unit.
+    """
+    name: str
+    target: TargetProfile
+    nb_models: int
+    # Points of the whole unit (objective "points")
+    points: float = 0.
+    # "Kill this unit first": number of dead models to reach (None: no priority)
+    min_dead: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class Assignment:
+    """
+    Result of `assign`.
+    """
+    # {<attacker name>: <enemy name>}
+    targets: Dict[str, str]
+    # {<enemy name>: <expected dead models>}
+    expected_dead: Dict[str, float]
+    # {<enemy name>: <probability to kill at least `min_dead` models>} (enemies with `min_dead` only)
+    threshold_probabilities: Dict[str, float]
+    # Expected kills or points removed
+    value: float
+
+
+def split(attacker: Attacker, nb_parts: int) -> List[Attacker]:
+    """
+    Split the models of an attacker in `nb_parts` attackers (as even as possible), to split its fire.
+    """
+    nb_parts = min(nb_parts, attacker.weapon.nb_figs)
+    size, extra = divmod(attacker.weapon.nb_figs, nb_parts)
+    return [Attacker(f"{attacker.name} #{k + 1}", attacker.weapon.replace(nb_figs=size + (k < extra)), attacker.rules)
+            for k in range(nb_parts)]
+
+
+def assign(attackers: List[Attacker],
+           enemies: List[EnemyUnit],
+           objective: str = "kills",
+           exclusive: bool = False,
+           max_dp_attackers: int = ASSIGNMENT_MAX_DP_ATTACKERS,
+           verbose: bool = False) -> Assignment:
+    """
+    Assign each attacker to one enemy unit.
+
+    :param attackers: Shooting units
+    :param enemies: Target units
+    :param objective: "kills" (expected dead models) or "points" (expected points removed)
+    :param exclusive: If True, at most one attacker per enemy (attackers left are not assigned)
+    :param max_dp_attackers: Above this number of attackers, local search instead of the exact search
+    :param verbose: If True, print the solver used
+
+    :return: `Assignment`
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective}, expected one of {OBJECTIVES}")
+
+    # 1/ Distributions of the dead models of each pair (one batch, cached)
+    # ------------------------------------------------------------------------------
+    matrix = kill_matrix(attackers, enemies)
+    # Weight of the "kill first" thresholds: far more than all the kills
+    weight = THRESHOLD_WEIGHT * (1 + sum(_model_value(enemy, objective) * enemy.nb_models for enemy in enemies))
+
+    # 2/ Solver
+    # ------------------------------------------------------------------------------
+    if exclusive:
+        if verbose:
+            print("[DEBUG] Solver: hungarian")
+        values = [[_score(enemy, _capped(matrix[i][j], enemy.nb_models), objective, weight)
+                   for j, enemy in enumerate(enemies)] for i in range(len(attackers))]
+        choice = hungarian(values)
+    elif len(attackers) <= max_dp_attackers:
+        if verbose:
+            print("[DEBUG] Solver: dynamic programming over the subsets of attackers")
+        choice = _subset_search(matrix, enemies, objective, weight)
+    else:
+        if verbose:
+            print("[DEBUG] Solver: local search")
+        choice = _local_search(matrix, enemies, objective, weight)
+
+    # 3/ Result
+    # ------------------------------------------------------------------------------
+    targets, expected_dead, thresholds = {}, {}, {}
+    value = 0.
+    for j, enemy in enumerate(enemies):
+        pmf = _combined(matrix, [i for i, c in enumerate(choice) if c == j], j, enemy.nb_models)
+        expected_dead[enemy.name] = sum(dead * p for dead, p in pmf.items())
+        value += expected_dead[enemy.name] * _model_value(enemy, objective)
+        if enemy.min_dead is not None:
+            thresholds[enemy.name] = _tail(pmf, enemy.min_dead)
+    for i, c in enumerate(choice):
+        if c is not None:
+            targets[attackers[i].name] = enemies[c].name
+    return Assignment(targets=targets, expected_dead=expected_dead, threshold_probabilities=thresholds, value=value)
+
+
+def kill_matrix(attackers: List[Attacker], enemies: List[EnemyUnit]) -> List[List[PMF]]:
+    """
+    Distribution of the dead models of each (attacker, enemy) pair.
+
+    :return: List (index: attacker) of lists (index: enemy) of PMF (not capped by the size of the unit)
+    """
+    return [[pair_dead_pmf(attacker.weapon, enemy.target, attacker.rules) for enemy in enemies]
+            for attacker in attackers]
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def pair_dead_pmf(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet) -> PMF:
+    """
+    Distribution of the dead models of one attacker against one target, cached.
+    """
+    return exact_distribution(weapon, target, rules).dead_pmf
+
+
+def hungarian(values: List[List[float]]) -> List[Optional[int]]:
+    """
+    Assignment maximizing the sum of the values, each column taken at most once (Hungarian algorithm with potentials,
+    O(rows^2 * columns)).
+
+    :param values: Matrix (rows: attackers, columns: targets)
+    :return: Column of each row (None: row not assigned, if there are more rows than columns)
+    """
+    nb_rows = len(values)
+    if nb_rows == 0:
+        return []
+    # More rows than columns: dummy columns of value 0 (row not assigned)
+    nb_cols = max(len(values[0]), nb_rows)
+    cost = [[-row[j] if j < len(row) else 0. for j in range(nb_cols)] for row in values]
+
+    # Rows and columns indexed from 1 (0: virtual)
+    u, v = [0.] * (nb_rows + 1), [0.] * (nb_cols + 1)
+    matched = [0] * (nb_cols + 1)
+    way = [0] * (nb_cols + 1)
+    for row in range(1, nb_rows + 1):
+        matched[0] = row
+        col = 0
+        min_to = [float("inf")] * (nb_cols + 1)
+        used = [False] * (nb_cols + 1)
+        while matched[col] != 0:
+            used[col] = True
+            current, delta, next_col = matched[col], float("inf"), 0
+            for j in range(1, nb_cols + 1):
+                if not used[j]:
+                    reduced = cost[current - 1][j - 1] - u[current] - v[j]
+                    if reduced < min_to[j]:
+                        min_to[j], way[j] = reduced, col
+                    if min_to[j] < delta:
+                        delta, next_col = min_to[j], j
+            for j in range(nb_cols + 1):
+                if used[j]:
+                    u[matched[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_to[j] -= delta
+            col = next_col
+        # Augmenting path
+        while col != 0:
+            previous = way[col]
+            matched[col] = matched[previous]
+            col = previous
+
+    choice = [None] * nb_rows
+    for j in range(1, nb_cols + 1):
+        if matched[j] and j <= len(values[0]):
+            choice[matched[j] - 1] = j - 1
+    return choice
+
+
+# Solvers
+# ----------------------------------------------------------------------------
+def _subset_search(matrix: List[List[PMF]], enemies: List[EnemyUnit], objective: str,
+                   weight: float) -> List[Optional[int]]:
+    """
+    Exact search: best[mask] = best score of the attackers of `mask` over the enemies seen so far, one enemy at a time
+    (each subset of the attackers of `mask` may shoot the new enemy).
+    """
+    nb_attackers = len(matrix)
+    full = (1 << nb_attackers) - 1
+    best = [0.] * (full + 1)
+    # choices[j][mask]: attackers of `mask` assigned to the enemy j
+    choices = []
+    for j, enemy in enumerate(enemies):
+        # Score of the enemy for each subset of attackers (PMF of a subset: PMF of the subset without its lowest
+        # attacker convolved with the PMF of this attacker)
+        pmfs = [{0: 1.}] + [None] * full
+        scores = [_score(enemy, pmfs[0], objective, weight)] + [0.] * full
+        for sub in range(1, full + 1):
+            low = (sub & -sub).bit_length() - 1
+            pmfs[sub] = _capped(_convolve(pmfs[sub & (sub - 1)], matrix[low][j]), enemy.nb_models)
+            scores[sub] = _score(enemy, pmfs[sub], objective, weight)
+
+        new_best = [0.] * (full + 1)
+        choice = [0] * (full + 1)
+        for mask in range(full + 1):
+            best_score, best_sub = best[mask] + scores[0], 0
+            sub = mask
+            while sub:
+                score = best[mask ^ sub] + scores[sub]
+                if score > best_score:
+                    best_score, best_sub = score, sub
+                sub = (sub - 1) & mask
+            new_best[mask], choice[mask] = best_score, best_sub
+        best = new_best
+        choices.append(choice)
+
+    # Backtrack from the last enemy
+    result = [None] * nb_attackers
+    mask = full
+    for j in range(len(enemies) - 1, -1, -1):
+        sub = choices[j][mask]
+        for i in range(nb_attackers):
+            if sub >> i & 1:
+                result[i] = j
+        mask ^= sub
+    return result
+
+
+def _local_search(matrix: List[List[PMF]], enemies: List[EnemyUnit], objective: str,
+                  weight: float) -> List[Optional[int]]:
+    """
+    Greedy start (each attacker on its best marginal target), then move one attacker at a time while the score
+    improves.
+    """
+    choice = [None] * len(matrix)
+
+    def total(j: int, removed: int = None, added: int = None) -> float:
+        members = [i for i, c in enumerate(choice) if c == j and i != removed] + ([added] if added is not None else [])
+        return _score(enemies[j], _combined(matrix, members, j, enemies[j].nb_models), objective, weight)
+
+    scores = [total(j) for j in range(len(enemies))]
+    for i in range(len(matrix)):
+        gains = [total(j, added=i) - scores[j] for j in range(len(enemies))]
+        choice[i] = max(range(len(enemies)), key=gains.__getitem__)
+        scores[choice[i]] = total(choice[i])
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(matrix)):
+            current = choice[i]
+            loss = scores[current] - total(current, removed=i)
+            for j in range(len(enemies)):
+                if j != current and total(j, added=i) - scores[j] > loss + 1e-12:
+                    choice[i] = j
+                    scores[current], scores[j] = total(current), total(j)
+                    improved = True
+                    break
+    return choice
+
+
+# Utils
+# ----------------------------------------------------------------------------
+def _model_value(enemy: EnemyUnit, objective: str) -> float:
+    return enemy.points / enemy.nb_models if objective == "points" else 1.
+
+
+def _score(enemy: EnemyUnit, pmf: PMF, objective: str, weight: float) -> float:
+    """
+    Score of an enemy from the distribution of its dead models (capped by the size of the unit).
+    """
+    score = sum(dead * p for dead, p in pmf.items()) * _model_value(enemy, objective)
+    if enemy.min_dead is not None:
+        score += weight * _tail(pmf, enemy.min_dead)
+    return score
+
+
+def _combined(matrix: List[List[PMF]], members: List[int], j: int, nb_models: int) -> PMF:
+    """
+    Distribution of the dead models of the enemy `j` shot by the attackers `members`.
+    """
+    pmf = {0: 1.}
+    for i in members:
+        pmf = _capped(_convolve(pmf, matrix[i][j]), nb_models)
+    return pmf
+
+
+def _convolve(a: PMF, b: PMF) -> PMF:
+    result = {}
+    for x, p in a.items():
+        for y, q in b.items():
+            result[x + y] = result.get(x + y, 0.) + p * q
+    return result
+
+
+def _capped(pmf: PMF, nb_models: int) -> PMF:
+    """
+    Dead models cannot exceed the size of the unit.
+    """
+    result = {}
+    for dead, p in pmf.items():
+        result[min(dead, nb_models)] = result.get(min(dead, nb_models), 0.) + p
+    return result
+
+
+def _tail(pmf: PMF, min_dead: int) -> float:
+    return sum((p for dead, p in pmf.items() if dead >= min_dead), 0.)
@@ -0,0 +1,246 @@
+"""
+Attrition over several turns: two squads trading shots, the survivors of each side setting its `nb_figs` for the next
+round.
+
+The joint distribution of (survivors of A, survivors of B) is propagated round after round (dynamic programming over
+the squad sizes). Each round, A shoots B then B shoots back with its survivors (or both shoot at the same time with
+`simultaneous=True`: A's shots, then B's shots with its number of figurines before A's shots).
+
+At each shot, the table of the shooters is folded at the current size of the target (all the kills above it wipe the
+target out): a shot costs at most (size of the target + 1) outcomes per state.
+
+Transition tables (distribution of the dead enemies for each number of shooters) are computed once per squad and cached:
+the table of n shooters is the one of n - 1 shooters convolved with one more figurine, and the allocation of the
+damage (see `distribution.AllocationSummary`) is shared by all the sizes.
+
+NB: the damage on a figurine not killed is not carried over to the next round.
+
+Usage:
+```
+a = Squad(weapon=WeaponProfile(nb_figs=20, ...), target=TargetProfile(...), rules=RuleSet())
+b = Squad(...)
+result = attrition(a, b, nb_turns=5)
+result.wipe_probability_b[-1]  # Probability that B is wiped out after 5 turns
+```
+"""
+import sys
+from dataclasses import dataclass, field
+from functools import lru_cache
+from os.path import dirname, abspath
+from typing import Dict, List, Tuple
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.distribution import AllocationSummary, Distribution, event_damage_pmf, figurine_event_counts
+from common.profile import WeaponProfile, TargetProfile, RuleSet
+from common.utils import DISTRIBUTION_EPSILON
+
+# Size of the cache of transition tables
+CACHE_SIZE = 1024
+
+
+@dataclass(frozen=True)
+class Squad:
+    """
+    One side of the fight.
+    """
+    # Weapon of the squad (`nb_figs`: initial number of figurines)
+    weapon: WeaponProfile
+    # The squad as a target
+    target: TargetProfile
+    # Rules of the weapon of the squad
+    rules: RuleSet = field(default_factory=RuleSet)
+
+
+@dataclass(frozen=True)
+class AttritionResult:
+    """
+    Result of `attrition`: one value per turn (index 0: after the first turn).
+    """
+    # Joint distribution {(<survivors of A>, <survivors of B>): <probability>}
+    distributions: List[Dict[Tuple[int, int], float]]
+    # Expected losses (figurines) of each side during the turn
+    expected_losses_a: List[float]
+    expected_losses_b: List[float]
+    # Probability that the side is wiped out at the end of the turn
+    wipe_probability_a: List[float]
+    wipe_probability_b: List[float]
+    # Probability mass discarded (pruning): bound of the error on the probabilities
+    error: float
+
+
+def attrition(squad_a: Squad, squad_b: Squad, nb_turns: int = 5, simultaneous: bool = False,
+              epsilon: float = DISTRIBUTION_EPSILON) -> AttritionResult:
+    """
+    Propagate the joint distribution of the survivors of 2 squads over `nb_turns` rounds.
+
+    :param squad_a: Squad shooting first
+    :param squad_b: Squad shooting back
+    :param nb_turns: Number of rounds
+    :param simultaneous: If True, both squads shoot with the survivors of the previous round
+    :param epsilon: Probabilities below `epsilon` are dropped
+
+    :return: `AttritionResult`
+    """
+    # Transition tables: kills of A on B and of B on A, for each number of shooters
+    kills_a = kill_tables(squad_a.weapon, squad_b.target, squad_a.rules, squad_a.weapon.nb_figs, epsilon)
+    kills_b = kill_tables(squad_b.weapon, squad_a.target, squad_b.rules, squad_b.weapon.nb_figs, epsilon)
+
+    survivors_a, survivors_b = _Survivors(kills_a), _Survivors(kills_b)
+
+    state = {(squad_a.weapon.nb_figs, squad_b.weapon.nb_figs): 1.}
+    distributions, losses_a, losses_b, wipe_a, wipe_b = [], [], [], [], []
+    error = 0.
+    for _ in range(nb_turns):
+        # 1/ Shots: A then B (with its survivors), or both at the same time
+        if simultaneous:
+            new_state, discarded = _exchange(state, survivors_a, survivors_b, epsilon)
+        else:
+            after_a, discarded_a = _shoot(state, survivors_a, shooter=0, epsilon=epsilon)
+            new_state, discarded_b = _shoot(after_a, survivors_b, shooter=1, epsilon=epsilon)
+            discarded = discarded_a + discarded_b
+        error += discarded
+
+        # 2/ Statistics of the turn
+        distributions.append(new_state)
+        losses_a.append(_expected(state, 0) - _expected(new_state, 0))
+        losses_b.append(_expected(state, 1) - _expected(new_state, 1))
+        wipe_a.append(sum(p for (a, _), p in new_state.items() if a == 0))
+        wipe_b.append(sum(p for (_, b), p in new_state.items() if b == 0))
+        state = new_state
+
+    return AttritionResult(distributions=distributions, expected_losses_a=losses_a, expected_losses_b=losses_b,
+                           wipe_probability_a=wipe_a, wipe_probability_b=wipe_b, error=error)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def kill_tables(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet, max_figs: int,
+                epsilon: float = DISTRIBUTION_EPSILON) -> Tuple[Distribution, ...]:
+    """
+    Distribution of the number of dead enemies for each number of shooters (from 0 to `max_figs`), cached.
+
+    :param weapon: Weapon of the shooters (`nb_figs` is ignored)
+    :param target: Target
+    :param rules: Criticals, re-rolls and weapon abilities
+    :param max_figs: Maximum number of shooters
+
+    :return: Tuple (index: number of shooters) of `Distribution` of the dead enemies
+    """
+    # Damage events for each number of shooters, allocated by the same summary
+    events = figurine_event_counts(weapon, target, rules, max_figs, epsilon)
+    allocation = AllocationSummary(event_damage_pmf(weapon, target), target.enemy_hp, max(e.max_value for e in events),
+                                   epsilon)
+    return tuple(allocation.mix(distribution)[0] for distribution in events)
+
+
+# Utils
+# ----------------------------------------------------------------------------
+class _Survivors:
+    """
+    Transition table of a squad (see `kill_tables`) folded at the size of the target: distribution of the survivors of
+    the target, for each (number of shooters, size of the target), computed at the first use.
+    """
+
+    def __init__(self, kills: Tuple[Distribution, ...]):
+        self.kills = kills
+        self._cache: Dict[Tuple[int, int], Tuple[List[Tuple[int, float]], float]] = {}
+
+    def get(self, shooters: int, targets: int) -> Tuple[List[Tuple[int, float]], float]:
+        """
+        :return: Tuple (list of (<survivors>, <probability>), mass discarded by the table)
+        """
+        key = (shooters, targets)
+        if key not in self._cache:
+            table = self.kills[shooters]
+            survivors = [0.] * (targets + 1)
+            for dead, q in table.items():
+                survivors[max(targets - dead, 0)] += q
+            self._cache[key] = ([(n, q) for n, q in enumerate(survivors) if q > 0], table.discarded)
+        return self._cache[key]
+
+
+def _shoot(state: Dict[Tuple[int, int], float], survivors: _Survivors, shooter: int,
+           epsilon: float) -> Tuple[Dict[Tuple[int, int], float], float]:
+    """
+    One side shoots the other: survivors of the target decrease by the kills of the current number of shooters.
+
+    :param state: Joint distribution {(a, b): p}
+    :param survivors: Transition table of the shooter (see `_Survivors`)
+    :param shooter: 0 if A shoots, 1 if B shoots
+
+    :return: Tuple (new state, mass discarded)
+    """
+    new_state = {}
+    discarded = 0.
+    for key, p in state.items():
+        shooters, targets = key[shooter], key[1 - shooter]
+        if shooters == 0 or targets == 0:
+            new_state[key] = new_state.get(key, 0.) + p
+            continue
+        outcomes, table_discarded = survivors.get(shooters, targets)
+        discarded += p * table_discarded
+        for left, q in outcomes:
+            new_key = (shooters, left) if shooter == 0 else (left, shooters)
+            new_state[new_key] = new_state.get(new_key, 0.) + p * q
+
+    new_state, pruned = _prune(new_state, epsilon)
+    return new_state, discarded + pruned
+
+
+def _exchange(state: Dict[Tuple[int, int], float], survivors_a: _Survivors, survivors_b: _Survivors,
+              epsilon: float) -> Tuple[Dict[Tuple[int, int], float], float]:
+    """
+    Both sides shoot at the same time, in 2 passes: A's shots (the number of shooters of B before the shots is kept
+    in the intermediate states), then B's shots with this number (see `_shoot`).
+
+    :return: Tuple (new state, mass discarded)
+    """
+    # 1/ A shoots: {(a, b before the shots, b after the shots): p}
+    intermediate = {}
+    discarded = 0.
+    for (a, b), p in state.items():
+        if a == 0 or b == 0:
+            intermediate[(a, b, b)] = intermediate.get((a, b, b), 0.) + p
+            continue
+        outcomes, table_discarded = survivors_a.get(a, b)
+        discarded += p * table_discarded
+        for left, q in outcomes:
+            intermediate[(a, b, left)] = p * q
+
+    # 2/ B shoots with its number of figurines before A's shots
+    new_state = {}
+    for (a, b, left_b), p in intermediate.items():
+        if a == 0 or b == 0:
+            new_state[(a, left_b)] = new_state.get((a, left_b), 0.) + p
+            continue
+        outcomes, table_discarded = survivors_b.get(b, a)
+        discarded += p * table_discarded
+        for left_a, q in outcomes:
+            new_state[(left_a, left_b)] = new_state.get((left_a, left_b), 0.) + p * q
+
+    new_state, pruned = _prune(new_state, epsilon)
+    return new_state, discarded + pruned
+
+
+def _prune(state: Dict[Tuple[int, int], float], epsilon: float) -> Tuple[Dict[Tuple[int, int], float], float]:
+    """
+    Drop the states of probability below `epsilon`.
+
+    :return: Tuple (pruned state, mass discarded)
+    """
+    pruned = {key: p for key, p in state.items() if p >= epsilon}
+    return pruned, sum(p for p in state.values() if p < epsilon)
+
+
+def _expected(state: Dict[Tuple[int, int], float], side: int) -> float:
+    """
+    Expected number of survivors of a side (0: A, 1: B).
+    """
+    return sum(key[side] * p for key, p in state.items())
@@ -3,23 +3,112 @@ A script permitting to read `data/enemy.csv` and write content into a `.py` file
 
 This procedure permits to avoid using pandas (heavy lib) during the main.
 
+The constants of each datasheet used at each evaluation (effective save per AP, failed save and FNP probabilities,
+wound threshold per strength, see `target_table.py`) are also computed here, and written into the same file
+(`opponent_tables`).
+
+The build only uses the standard library (`csv`, read in one streaming pass, each column validated) and is
+incremental: the SHA-256 of each input file and of each row is recorded into a build manifest (`<output>.json`).
+* Input file unchanged (and same version of the app): the output is not rewritten,
+* Else: the output is rewritten, and the rows added / modified / removed since the previous build are returned in the
+build report (`"changes"`), so that the caches of results can invalidate only these targets.
+
+The manifest only depends on the input (hashes and version, no per-build data): it is committed with the output.
+
 Usage: On a terminal:
 ```
-python build_enemy.py
+python build_enemy.py  # data/enemy.csv -> src/common/enemy.py
+python build_enemy.py data/other.csv --output other.py --force
 ```
 """
-import pandas as pd
-from numpy import nan
-from os.path import dirname, abspath, join
+import csv
+import hashlib
+import json
+import os
+import sys
+from os.path import dirname, abspath, join, exists, splitext
+from typing import Dict, Iterator, Optional, Tuple
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from __version__ import VERSION
+from common.profile import TargetProfile
+from common.target_table import compute_target_table
+
+# Column containing the name of the datasheet
+NAME_COLUMN = "Name"
+# 1/ Type of each column of the CSV (optional columns: an empty cell means "no save" / "no FNP")
+COLUMNS = {"svg": (int, False),
+           "svg invul": (int, True),
+           "feel no pain": (int, True),
+           "toughness": (int, False),
+           "w": (int, False)}
+# Size of the blocks read to hash an input file
+HASH_BLOCK_SIZE = 1 << 16
+
+
+# 2/ CSV > dict (streaming, stdlib only)
+# ------------------------------------------------------
+def read_datasheets(csv_path: str) -> Iterator[Tuple[str, dict]]:
+    """
+    Read the datasheets of a `;`-separated CSV, one row at a time.
+
+    :return: Iterator over (<name>, <datasheet>), e.g. ("marine", {'svg': 3, 'svg invul': None, ...})
+    :raises: ValueError if a column is missing, a name is duplicated, or a cell has an invalid value
+    """
+    names = set()
+    with open(csv_path, newline="") as file:
+        reader = csv.DictReader(file, delimiter=";")
+        missing = ({NAME_COLUMN} | set(COLUMNS)) - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"{csv_path}: missing columns {sorted(missing)}")
+        for row in reader:
+            name = row[NAME_COLUMN].strip()
+            if not name or name in names:
+                raise ValueError(f"{csv_path}:{reader.line_num}: empty or duplicated name '{name}'")
+            names.add(name)
+            yield name, {column: _parse_cell(csv_path, reader.line_num, column, row[column])
+                         for column in COLUMNS}
+
+
+def _parse_cell(csv_path: str, line: int, column: str, cell: Optional[str]):
+    """
+    Value of a cell, typed as defined in `COLUMNS` (None for an empty optional cell).
+    """
+    kind, optional = COLUMNS[column]
+    cell = (cell or "").strip()
+    if not cell:
+        if optional:
+            return None
+        raise ValueError(f"{csv_path}:{line}: column '{column}' is required")
+    try:
+        value = float(cell)
+        if kind is int:
+            if not value.is_integer():
+                raise ValueError
+            value = int(value)
+        return value
+    except ValueError:
+        raise ValueError(f"{csv_path}:{line}: invalid value '{cell}' for column '{column}' ({kind.__name__})")
+
 
 # 3/ dict into .py file
 # ------------------------------------------------------
-def write_dict_to_py(dictionary: dict, file_path: str, dict_name: str='opponent_datasheets') -> None:
+def write_dict_to_py(dictionary: dict, file_path: str, dict_name: str='opponent_datasheets', mode: str='w') -> None:
     """
     Wirte dict `dictionnary` into a .py file containing :
     ```
     <dict_name> = ... < content of the dict>
     ```
+
+    :param mode: 'w' to overwrite the file, 'a' to append the dict to the file
     """
     def format_value(value):
         if isinstance(value, str):
@@ -36,34 +125,115 @@ def write_dict_to_py(dictionary: dict, file_path: str, dict_name: str='opponent_
             items.append(f"{'    ' * (indent + 1)}'{key}': {formatted_value}")
         return '{\n' + ',\n'.join(items) + f"\n{'    ' * indent}}}"
 
-    with open(file_path, 'w') as file:
+    with open(file_path, mode) as file:
         file.write(f"{dict_name} = {format_dict(dictionary)}\n")
 
 
+# 4/ Tables of the datasheets
+# ------------------------------------------------------
+def build_tables(datasheets: dict) -> dict:
+    """
+    Compute the table of each datasheet (see `target_table.py`).
+
+    :param datasheets: {<name>: <datasheet>} (see `opponent_datasheets`)
+    :return: {<name>: <table as a dict>}
+    """
+    return {name: compute_target_table(TargetProfile.from_datasheet(carac)).as_dict()
+            for name, carac in datasheets.items()}
+
+
+# 5/ Incremental build
+# ------------------------------------------------------
+def build_datasheets(csv_path: str, output_path: str, force: bool = False, verbose: bool = False) -> dict:
+    """
+    Build `output_path` (datasheets and their tables) from `csv_path`, if the CSV changed since the last build.
+
+    :param csv_path: `;`-separated CSV (see `data/enemy.csv`)
+    :param output_path: .py file written
+    :param force: If True, rebuild even if nothing changed
+    :param verbose: Set to True to print the changes
+
+    :return: Build report: the manifest (written into `<output>.json`: "input", "file_hash", "version", "rows"
+        ({<name>: <row hash>})), plus "changes" ({"added", "modified", "removed": [<names>]} since the previous build)
+        and "built" (False if the output was up to date)
+    """
+    manifest_path = manifest_path_of(output_path)
+    previous = {}
+    if exists(manifest_path):
+        with open(manifest_path) as file:
+            previous = json.load(file)
+
+    # Whole file unchanged: nothing to do
+    file_hash = hash_file(csv_path)
+    if not force and exists(output_path) and previous.get("file_hash") == file_hash and \
+            previous.get("version") == VERSION:
+        if verbose: print(f"[DEBUG] '{output_path}' up to date")
+        return {**previous, "changes": {"added": [], "modified": [], "removed": []}, "built": False}
+
+    # Parse and hash each row (one pass)
+    datasheets, rows = {}, {}
+    for name, carac in read_datasheets(csv_path):
+        datasheets[name] = carac
+        rows[name] = hash_row(name, carac)
+
+    previous_rows = previous.get("rows", {})
+    changes = {"added": [name for name in rows if name not in previous_rows],
+               "modified": [name for name in rows if name in previous_rows and previous_rows[name] != rows[name]],
+               "removed": [name for name in previous_rows if name not in rows]}
+    if verbose: print(f"[DEBUG] Changes of '{csv_path}': {changes}")
+
+    # Write the output, then the manifest (both atomically)
+    tmp_path = output_path + ".tmp"
+    write_dict_to_py(datasheets, tmp_path)
+    write_dict_to_py(build_tables(datasheets), tmp_path, dict_name='opponent_tables', mode='a')
+    os.replace(tmp_path, output_path)
+
+    manifest = {"input": os.path.basename(csv_path), "file_hash": file_hash, "version": VERSION, "rows": rows}
+    with open(manifest_path + ".tmp", "w") as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return {**manifest, "changes": changes, "built": True}
+
+
+def manifest_path_of(output_path: str) -> str:
+    return splitext(output_path)[0] + ".json"
+
+
+def hash_file(path: str) -> str:
+    """
+    SHA-256 of the content of a file (read by blocks).
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_row(name: str, carac: dict) -> str:
+    """
+    SHA-256 of a parsed row (independent of the formatting of the CSV, e.g. "6" or "6.0").
+    """
+    return hashlib.sha256(json.dumps([name, carac], sort_keys=True).encode()).hexdigest()
+
+
 if __name__ == "__main__":
+    import argparse
+
     # 0/ PATHS
     # ------------------------------------------------------
-    # ENV PATH
-    SRC_PATH = dirname(abspath(__file__))
-    # <absolute_path>/40k-dice-stats-computing/src/common/
-    ROOT_PATH = dirname(dirname(SRC_PATH))
     # <absolute_path>/40k-dice-stats-computing/
+    REPO_PATH = dirname(ROOT_PATH)
 
-    # Path where file is read
-    output_file_path = join(SRC_PATH, "enemy.py")
-    # Path to the CSV to read
-    OPPONENT_DATA_PATH = join(ROOT_PATH, "data", "enemy.csv")
-
-    # 2/ Open CSV > into dict
-    # ------------------------------------------------------
-    df = pd.read_csv(OPPONENT_DATA_PATH, sep=";")
-
-    # Set the index column
-    df.set_index("Name", inplace=True)
-
-    # Convert the DataFrame to a nested dictionary
-    nested_dict = df.replace([nan], [None], regex=False).to_dict(orient='index')
+    parser = argparse.ArgumentParser(description="Build a .py file of datasheets from a CSV")
+    parser.add_argument("csv", nargs="?", default=join(REPO_PATH, "data", "enemy.csv"), help="CSV to read")
+    parser.add_argument("--output", default=join(SRC_PATH, "enemy.py"), help=".py file written")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the CSV did not change")
+    args = parser.parse_args()
 
     # Launch
-    write_dict_to_py(nested_dict, output_file_path)
-    print(f"Successfuly transformed '{OPPONENT_DATA_PATH}' into '{output_file_path}'")
+    report = build_datasheets(args.csv, args.output, force=args.force, verbose=True)
+    if report["built"]:
+        print(f"Successfuly transformed '{args.csv}' into '{args.output}'")
+    else:
+        print(f"'{args.output}' is up to date")
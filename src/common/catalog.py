@@ -0,0 +1,276 @@
+"""
+Queries over a catalog of weapon profiles with points costs: top-k "kills per point" ranking and Pareto frontier
+(cost vs. expected kills) against a mix of targets (by default, the datasheets of `data/enemy.csv`).
+
+Expected kills: renewal estimate of `approx.py` (mean only), split into cached stages shared by the whole catalog:
+* events per attack: depends on (hit, S, AP, rules, target), not on A, D nor the number of figurines,
+* events to kill one figurine: depends on (D, target) only.
+So evaluating a catalog of thousands of profiles mostly costs dict lookups.
+
+Pruning: the optimistic bound of a profile replaces each attack by its best case (torrent, auto-wound, no save, max
+sustained hits). Profiles are evaluated by decreasing bound, and the ranking stops as soon as the bound cannot beat the
+current k-th best. The frontier (sort by cost, sweep: O(n log n)) skips the profiles whose bound does not beat the best
+kills of a cheaper profile.
+
+A catalog is a CSV (sep ";") with columns `name`, `points`, and any argument of `launch_workflow` for the weapon and
+the rules (missing columns take the default values).
+
+Usage: On a terminal:
+```
+python catalog.py catalog.csv --top 10
+```
+Or:
+```
+entries = load_catalog("catalog.csv")
+top_k(entries, target_mix())  # [Ranked(entry, expected_dead, per_point), ...]
+pareto_frontier(entries, target_mix())
+```
+"""
+import csv
+import heapq
+import sys
+from dataclasses import dataclass, field
+from functools import lru_cache
+from os.path import dirname, abspath
+from typing import Dict, List, Optional, Tuple
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.approx import events_to_kill
+from common.dice import DiceExpression, average_dice_expression
+from common.distribution import stage_probas, event_damage_pmf
+from common.enemy import opponent_datasheets
+from common.profile import WeaponProfile, TargetProfile, RuleSet
+from common.utils import CATALOG_TOP_K
+
+# Size of the caches of the stages
+CACHE_SIZE = 65536
+
+# List of (<target>, <weight>), weights summing to 1
+TargetMix = List[Tuple[TargetProfile, float]]
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    name: str
+    weapon: WeaponProfile
+    rules: RuleSet = field(default_factory=RuleSet)
+    points: float = 0.
+
+
+@dataclass(frozen=True)
+class Ranked:
+    entry: CatalogEntry
+    # Expected dead enemies (weighted by the target mix)
+    expected_dead: float
+
+    @property
+    def per_point(self) -> float:
+        return self.expected_dead / self.entry.points if self.entry.points > 0 else float("inf")
+
+
+def load_catalog(path: str) -> List[CatalogEntry]:
+    """
+    Load a catalog from a CSV (sep ";"): columns `name`, `points` and arguments of `launch_workflow`.
+    """
+    entries = []
+    with open(path, newline="") as file:
+        for row in csv.DictReader(file, delimiter=";"):
+            row = {k: _parse_value(v) for k, v in row.items() if v not in ("", None)}
+            name, points = str(row.pop("name")), float(row.pop("points", 0.))
+            weapon = WeaponProfile(**{k: v for k, v in row.items() if k in WeaponProfile._FIELDS})
+            rules = RuleSet(**{k: v for k, v in row.items() if k in RuleSet._FIELDS})
+            unknown = set(row) - set(WeaponProfile._FIELDS + RuleSet._FIELDS)
+            if unknown:
+                raise ValueError(f"Unknown columns in {path}: {sorted(unknown)}")
+            entries.append(CatalogEntry(name, weapon, rules, points))
+    return entries
+
+
+def target_mix(datasheets: Dict[str, dict] = None, weights: Dict[str, float] = None) -> TargetMix:
+    """
+    Mix of targets from datasheets.
+
+    :param datasheets: {<name>: <datasheet>} (default: `opponent_datasheets`)
+    :param weights: {<name>: <weight>} (default: same weight for all the datasheets)
+    """
+    datasheets = opponent_datasheets if datasheets is None else datasheets
+    weights = weights or {name: 1. for name in datasheets}
+    total = sum(weights.values())
+    return [(TargetProfile.from_datasheet(datasheets[name]), weight / total) for name, weight in weights.items()]
+
+
+def evaluate_catalog(entries: List[CatalogEntry], mix: TargetMix) -> List[float]:
+    """
+    Expected dead enemies of each profile of the catalog (weighted by the target mix).
+    """
+    return [_mix_value(entry, mix, expected_dead) for entry in entries]
+
+
+def top_k(entries: List[CatalogEntry], mix: TargetMix, k: int = CATALOG_TOP_K, verbose: bool = False) -> List[Ranked]:
+    """
+    The `k` profiles killing the most per point.
+
+    :return: List of `Ranked`, best first (empty if `k` <= 0)
+    """
+    if k <= 0:
+        return []
+    bounds = sorted(((_mix_value(entry, mix, optimistic_dead) / _points(entry), index)
+                     for index, entry in enumerate(entries)), reverse=True)
+    # Min-heap of the k best (per point, -index): on ties, the first profiles of the catalog are kept
+    best = []
+    nb_evaluated = 0
+    for bound, index in bounds:
+        if len(best) == k and bound <= best[0][0]:
+            # Bounds are sorted: no profile left can beat the k-th best
+            break
+        value = _mix_value(entries[index], mix, expected_dead)
+        nb_evaluated += 1
+        item = (value / _points(entries[index]), -index)
+        if len(best) < k:
+            heapq.heappush(best, item)
+        elif item > best[0]:
+            heapq.heapreplace(best, item)
+    if verbose:
+        print(f"[DEBUG] {nb_evaluated}/{len(entries)} profiles evaluated")
+
+    return [Ranked(entries[-negative_index], per_point * _points(entries[-negative_index]))
+            for per_point, negative_index in sorted(best, reverse=True)]
+
+
+def pareto_frontier(entries: List[CatalogEntry], mix: TargetMix, verbose: bool = False) -> List[Ranked]:
+    """
+    Profiles not dominated (no other profile is cheaper or as cheap, and kills more), by increasing cost.
+    """
+    order = sorted(range(len(entries)), key=lambda index: entries[index].points)
+    frontier = []
+    best = -1.
+    nb_evaluated = 0
+    start = 0
+    # Sweep by group of equal costs: the best of the group is on the frontier if it beats all the cheaper profiles
+    while start < len(order):
+        end = start
+        while end < len(order) and entries[order[end]].points == entries[order[start]].points:
+            end += 1
+        group_best: Optional[Ranked] = None
+        for index in order[start:end]:
+            if _mix_value(entries[index], mix, optimistic_dead) <= best:
+                continue
+            value = _mix_value(entries[index], mix, expected_dead)
+            nb_evaluated += 1
+            if value > best and (group_best is None or value > group_best.expected_dead):
+                group_best = Ranked(entries[index], value)
+        if group_best is not None:
+            frontier.append(group_best)
+            best = group_best.expected_dead
+        start = end
+    if verbose:
+        print(f"[DEBUG] {nb_evaluated}/{len(entries)} profiles evaluated")
+    return frontier
+
+
+def expected_dead(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet) -> float:
+    """
+    Expected dead enemies (renewal estimate, see `approx.py`).
+    """
+    events = weapon.nb_figs * average_dice_expression(weapon.weapon_a) * _attack_events(
+        weapon.hit_threshold, weapon.weapon_s, weapon.weapon_ap, target, rules)
+    return _renewal(events, *_events_to_kill(weapon.weapon_d, target))
+
+
+def optimistic_dead(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet) -> float:
+    """
+    Upper bound of `expected_dead`: each attack hits automatically (torrent) and wounds automatically without save,
+    with the maximum of sustained hits.
+    """
+    sustain = rules.sustain_hit.nb_dice * rules.sustain_hit.dice_face + rules.sustain_hit.bonus
+    events = weapon.nb_figs * average_dice_expression(weapon.weapon_a) * (1 + sustain)
+    return _renewal(events, *_events_to_kill(weapon.weapon_d, target))
+
+
+# Stages (cached)
+# ----------------------------------------------------------------------------
+@lru_cache(maxsize=CACHE_SIZE)
+def _attack_events(hit_threshold: int, weapon_s: int, weapon_ap: int, target: TargetProfile, rules: RuleSet) -> float:
+    """
+    Average number of damage events of one attack.
+    """
+    weapon = WeaponProfile(nb_figs=1, weapon_a=1, hit_threshold=hit_threshold, weapon_s=weapon_s, weapon_ap=weapon_ap)
+    probas = stage_probas(weapon, target, rules)
+    if rules.torrent:
+        return probas["event_wound"]
+    first = probas["failed_save"] if rules.lethal_hit else probas["event_wound"]
+    return probas["hit"] * probas["event_wound"] + probas["crit_hit"] * (
+            first + rules.average_sustain_hit * probas["event_wound"])
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _events_to_kill(weapon_d: DiceExpression, target: TargetProfile) -> Tuple[float, float]:
+    """
+    Mean and variance of the number of events to kill one figurine.
+    """
+    mean_events, var_events, _ = events_to_kill(event_damage_pmf(WeaponProfile(weapon_d=weapon_d), target),
+                                                target.enemy_hp)
+    return mean_events, var_events
+
+
+# Utils
+# ----------------------------------------------------------------------------
+def _renewal(events: float, mean_events: float, var_events: float) -> float:
+    """
+    Expected kills of `events` damage events (renewal estimate with discrete correction, clipped to 0).
+    """
+    if events == 0 or mean_events == float("inf"):
+        return 0.
+    return max(events / mean_events + (var_events - mean_events ** 2 + mean_events) / (2 * mean_events ** 2), 0.)
+
+
+def _mix_value(entry: CatalogEntry, mix: TargetMix, function) -> float:
+    return sum(weight * function(entry.weapon, target, entry.rules) for target, weight in mix)
+
+
+def _points(entry: CatalogEntry) -> float:
+    """
+    Points of a profile (a free profile is ranked by its kills).
+    """
+    return entry.points if entry.points > 0 else 1.
+
+
+def _parse_value(value: str):
+    """
+    Parse a cell of a catalog: int, float, bool ("True" / "False") or dice expression (str).
+    """
+    if value in ("True", "False"):
+        return value == "True"
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rank a catalog of weapon profiles against the enemy datasheets")
+    parser.add_argument("catalog", help="CSV file (sep ';') with columns name, points and launch_workflow arguments")
+    parser.add_argument("--top", type=int, default=CATALOG_TOP_K)
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.catalog)
+    mix = target_mix()
+    print(f"Top {args.top} (kills per point):")
+    for ranked in top_k(catalog, mix, args.top, verbose=True):
+        print(f"  {ranked.entry.name}: {ranked.per_point:.4f} ({ranked.expected_dead:.2f} kills, "
+              f"{ranked.entry.points} pts)")
+    print("Pareto frontier (cost vs. kills):")
+    for ranked in pareto_frontier(catalog, mix, verbose=True):
+        print(f"  {ranked.entry.points} pts: {ranked.entry.name} ({ranked.expected_dead:.2f} kills)")
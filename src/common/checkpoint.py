@@ -0,0 +1,223 @@
+"""
+Checkpointed, resumable sweeps (see `sweep.py`): a crash or a reboot only loses the chunk being computed.
+
+The grid is split into chunks: one chunk per combination of the values of the `chunk_keys` (by default all the keys
+but the last one), each chunk being the sub-grid {<chunk key>: [<value>], <other key>: <all the values>}.
+
+Each chunk is content-addressed: its id is the SHA-256 of its sub-grid (keys in order, values), of the result columns,
+of the result dtype and of the version of the app. Changing the grid only invalidates the affected chunks (e.g.
+adding a value to a chunk key adds new chunks, the others are kept), and a new version recomputes everything.
+
+Output directory:
+* `chunks/<id><extension>`: one sweep file per chunk (written by `sweep.run_sweep` into a temporary file, then moved
+atomically with `os.replace`: a chunk file is always complete),
+* `manifest.json`: grid, chunk keys, and the list of the chunks (id, sub-grid, file, number of rows, done), rewritten
+atomically after each chunk.
+On restart, the chunks whose file exists are skipped.
+
+Usage: On a terminal:
+```
+python checkpoint.py grid.json output_dir/ --chunk-keys weapon_s weapon_ap
+```
+"""
+import hashlib
+import json
+import os
+import sys
+from itertools import product
+from os.path import dirname, abspath, join, exists
+from typing import Dict, Iterator, List, Tuple
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from __version__ import VERSION
+from common.sweep import RESULT_COLUMNS, WRITERS, run_sweep, load_grid
+from common.utils import SWEEP_RESULT_DTYPE
+
+MANIFEST_NAME = "manifest.json"
+CHUNKS_DIR = "chunks"
+# Suffix of the files being written (removed on restart)
+TMP_SUFFIX = ".tmp"
+
+
+def plan_chunks(grid: Dict[str, list], chunk_keys: List[str] = None,
+                result_dtype: str = SWEEP_RESULT_DTYPE) -> List[Tuple[str, Dict[str, list]]]:
+    """
+    Split `grid` into content-addressed chunks (deterministic: same grid, same chunks).
+
+    :param grid: Dict {<launch_workflow argument>: [<values>]}
+    :param chunk_keys: Keys defining the chunks (default: all the keys but the last one)
+    :param result_dtype: "float32" or "float64"
+
+    :return: List of (<chunk id>, <sub-grid>)
+    """
+    chunk_keys = list(grid)[:-1] if chunk_keys is None else list(chunk_keys)
+    unknown = set(chunk_keys) - set(grid)
+    if unknown:
+        raise ValueError(f"Unknown chunk keys: {sorted(unknown)}")
+
+    chunks = []
+    for values in product(*[grid[k] for k in chunk_keys]):
+        fixed = dict(zip(chunk_keys, values))
+        sub_grid = {k: [fixed[k]] if k in fixed else list(v) for k, v in grid.items()}
+        chunks.append((chunk_id(sub_grid, result_dtype), sub_grid))
+    return chunks
+
+
+def chunk_id(sub_grid: Dict[str, list], result_dtype: str = SWEEP_RESULT_DTYPE) -> str:
+    """
+    SHA-256 of the content of a chunk (canonical JSON).
+    """
+    content = {"grid": [[k, v] for k, v in sub_grid.items()],
+               "columns": list(RESULT_COLUMNS),
+               "dtype": result_dtype,
+               "version": VERSION}
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+def run_checkpointed_sweep(grid: Dict[str, list],
+                           directory: str,
+                           chunk_keys: List[str] = None,
+                           extension: str = ".csv",
+                           result_dtype: str = SWEEP_RESULT_DTYPE,
+                           clean: bool = False,
+                           verbose: bool = False) -> Dict[str, int]:
+    """
+    Run a sweep chunk by chunk into `directory`, skipping the chunks already done.
+
+    :param grid: Dict {<launch_workflow argument>: [<values>]}
+    :param directory: Output directory (created if needed)
+    :param chunk_keys: Keys defining the chunks (default: all the keys but the last one)
+    :param extension: Format of the chunk files (see `sweep.WRITERS`)
+    :param result_dtype: "float32" or "float64"
+    :param clean: If True, remove the chunk files not belonging to `grid` (e.g. left by a previous grid)
+    :param verbose: Set to True to print progression
+
+    :return: Dict of counters: "chunks", "skipped", "computed", "removed"
+    """
+    manifest, chunks, removed = prepare_directory(grid, directory, chunk_keys, extension, result_dtype, clean)
+
+    # Compute the missing chunks
+    skipped = computed = 0
+    for index, (chunk, sub_grid) in enumerate(chunks):
+        if manifest["chunks"][index]["done"]:
+            skipped += 1
+            continue
+        tmp_path = chunk_tmp_path(directory, manifest, index)
+        rows = run_sweep(sub_grid, tmp_path, result_dtype=result_dtype)
+        commit_chunk(directory, manifest, index, tmp_path, rows)
+        computed += 1
+        if verbose: print(f"[DEBUG] Chunk {computed + skipped}/{len(chunks)} written ({rows} rows)")
+
+    return {"chunks": len(chunks), "skipped": skipped, "computed": computed, "removed": removed}
+
+
+def prepare_directory(grid: Dict[str, list],
+                      directory: str,
+                      chunk_keys: List[str] = None,
+                      extension: str = ".csv",
+                      result_dtype: str = SWEEP_RESULT_DTYPE,
+                      clean: bool = False) -> Tuple[dict, List[Tuple[str, Dict[str, list]]], int]:
+    """
+    Plan the chunks of `grid`, remove the files left by an interrupted run (and the chunks of other grids if
+    `clean`), and write the manifest (chunks whose file exists are done).
+
+    :return: Tuple (manifest, chunks (see `plan_chunks`), number of chunk files removed)
+    """
+    if extension not in WRITERS:
+        raise ValueError(f"Unknown sweep format: '{extension}', expected one of {list(WRITERS)}")
+    chunks_dir = join(directory, CHUNKS_DIR)
+    os.makedirs(chunks_dir, exist_ok=True)
+
+    chunks = plan_chunks(grid, chunk_keys, result_dtype)
+    files = {chunk: f"{chunk}{extension}" for chunk, _ in chunks}
+    removed = 0
+    for name in os.listdir(chunks_dir):
+        if TMP_SUFFIX in name or (clean and name not in files.values()):
+            os.remove(join(chunks_dir, name))
+            removed += TMP_SUFFIX not in name
+
+    manifest = {"grid": [[k, v] for k, v in grid.items()],
+                "chunk_keys": list(grid)[:-1] if chunk_keys is None else list(chunk_keys),
+                "extension": extension,
+                "result_dtype": result_dtype,
+                "version": VERSION,
+                "chunks": []}
+    previous = {c["id"]: c for c in load_manifest(directory).get("chunks", [])} if exists(
+        join(directory, MANIFEST_NAME)) else {}
+    for chunk, sub_grid in chunks:
+        done = exists(join(chunks_dir, files[chunk]))
+        manifest["chunks"].append({"id": chunk,
+                                   "grid": [[k, v] for k, v in sub_grid.items()],
+                                   "file": join(CHUNKS_DIR, files[chunk]),
+                                   "rows": previous.get(chunk, {}).get("rows") if done else None,
+                                   "done": done})
+    _write_manifest(directory, manifest)
+    return manifest, chunks, removed
+
+
+def chunk_tmp_path(directory: str, manifest: dict, index: int) -> str:
+    """
+    Temporary file of the chunk `index` (same extension as the chunk file).
+    """
+    return join(directory, CHUNKS_DIR, f"{manifest['chunks'][index]['id']}{TMP_SUFFIX}{manifest['extension']}")
+
+
+def commit_chunk(directory: str, manifest: dict, index: int, tmp_path: str, rows: int) -> None:
+    """
+    Move the temporary file of the chunk `index` to its final place (atomic), and mark it as done in the manifest.
+    """
+    entry = manifest["chunks"][index]
+    os.replace(tmp_path, join(directory, entry["file"]))
+    entry["rows"], entry["done"] = rows, True
+    _write_manifest(directory, manifest)
+
+
+def load_manifest(directory: str) -> dict:
+    with open(join(directory, MANIFEST_NAME)) as file:
+        return json.load(file)
+
+
+def iter_chunks(directory: str) -> Iterator[Tuple[Dict[str, list], str]]:
+    """
+    Iterate over the chunks done, in the order of the grid.
+
+    :return: Iterator over (<sub-grid>, <path of the chunk file>). Input columns of a chunk file are indices in its
+        sub-grid (see `sweep.iter_record_batches`).
+    """
+    for entry in load_manifest(directory)["chunks"]:
+        if entry["done"]:
+            yield dict(entry["grid"]), join(directory, entry["file"])
+
+
+def _write_manifest(directory: str, manifest: dict) -> None:
+    """
+    Write the manifest atomically (temporary file, then `os.replace`).
+    """
+    tmp_path = join(directory, MANIFEST_NAME + TMP_SUFFIX)
+    with open(tmp_path, "w") as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(tmp_path, join(directory, MANIFEST_NAME))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a resumable sweep of `launch_workflow`, chunk by chunk")
+    parser.add_argument("grid", help="JSON file containing the grid {<argument>: [<values>]}")
+    parser.add_argument("directory", help="Output directory (chunks and manifest)")
+    parser.add_argument("--chunk-keys", nargs="*", default=None, help="Keys defining the chunks")
+    parser.add_argument("--format", default=".csv", choices=list(WRITERS))
+    parser.add_argument("--clean", action="store_true", help="Remove the chunks of previous grids")
+    args = parser.parse_args()
+
+    counters = run_checkpointed_sweep(load_grid(args.grid), args.directory, chunk_keys=args.chunk_keys,
+                                      extension=args.format, clean=args.clean, verbose=True)
+    print(f"{counters['computed']} chunks computed, {counters['skipped']} already done")
@@ -0,0 +1,411 @@
+"""
+Distributed sweeps: a coordinator hands out the chunks of a checkpointed sweep (see `checkpoint.py`) to workers on
+any host, over TCP (`multiprocessing.managers`, no external broker).
+
+* Coordinator: plans the chunks (the chunks already done in the output directory are skipped), serves a queue of
+chunks, writes the results returned by the workers (same directory layout as `checkpoint.py`: a cluster run can be
+resumed locally and conversely).
+* Workers: lease a chunk, evaluate all its rows in one batch (`kernel.evaluate_batch`), return compact binary results
+(see `pack_results`), and start again until the queue is empty.
+* Leases: a chunk not returned within `lease_timeout` seconds (worker dead or slow) is given to another worker (the
+first result returned wins). A chunk failing `CLUSTER_MAX_ATTEMPTS` times is abandoned.
+
+Trust model: `multiprocessing.managers` unpickles the messages of the other side, i.e. any peer knowing the shared
+secret (authkey) can run code on the coordinator, and the coordinator on the workers. The secret is the only
+protection:
+* it has no default: given by `--authkey` / the `authkey` argument, or the environment variable `CLUSTER_AUTHKEY`
+(preferred: command line arguments are visible to the other users of the host),
+* without it, only the loopback address is accepted (a random secret of the process is used: the workers have to be
+started by this process, see `multiprocessing.current_process().authkey`),
+* use a long random secret (e.g. `python -c "import secrets; print(secrets.token_hex(32))"`), only on trusted
+networks: the connection is authenticated, not encrypted.
+
+Usage: On a terminal:
+```
+export CLUSTER_AUTHKEY=<secret>  # Same secret on each host
+python cluster.py coordinator grid.json output_dir/ --host 0.0.0.0 --port 8041
+python cluster.py worker --host <coordinator host> --port 8041  # On each host, as many times as CPUs
+```
+"""
+import ipaddress
+import multiprocessing
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from itertools import product
+from multiprocessing.managers import BaseManager
+from os.path import dirname, abspath
+from typing import Dict, List, Optional, Tuple
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.checkpoint import prepare_directory, chunk_tmp_path, commit_chunk
+from common.kernel import evaluate_batch
+from common.profile import profiles_from_kwargs
+from common.sweep import RESULT_COLUMNS, WRITERS, iter_grid_indices, load_grid, _TYPECODES
+from common.utils import (CLUSTER_HOST, CLUSTER_PORT, CLUSTER_AUTHKEY_ENV, CLUSTER_LEASE_TIMEOUT, CLUSTER_POLL,
+                          CLUSTER_MAX_ATTEMPTS, SWEEP_RESULT_DTYPE)
+
+# Binary results: header (magic, typecode of the values, number of rows), then one column per result (little endian)
+RESULTS_MAGIC = b"40KR"
+RESULTS_HEADER = struct.Struct("<4scxxI")
+
+
+class ChunkQueue:
+    """
+    Chunks of a sweep and their leases. Lives in the coordinator (server of the manager), used by the workers through
+    proxies.
+    """
+
+    def __init__(self, grid: Dict[str, list], directory: str, chunk_keys: List[str] = None, extension: str = ".csv",
+                 result_dtype: str = SWEEP_RESULT_DTYPE, lease_timeout: float = CLUSTER_LEASE_TIMEOUT):
+        self.directory = directory
+        self.result_dtype = result_dtype
+        self.lease_timeout = lease_timeout
+        self.manifest, chunks, _ = prepare_directory(grid, directory, chunk_keys, extension, result_dtype)
+        self.grids = {chunk: sub_grid for chunk, sub_grid in chunks}
+        self.index = {chunk: i for i, (chunk, _) in enumerate(chunks)}
+        self.todo = [chunk for chunk, _ in chunks if not self.manifest["chunks"][self.index[chunk]]["done"]]
+        # {<chunk>: (<worker>, <deadline>)}
+        self.leases: Dict[str, Tuple[str, float]] = {}
+        self.attempts: Dict[str, int] = {}
+        self.failed: Dict[str, str] = {}
+        # Counters
+        self.nb_skipped = len(chunks) - len(self.todo)
+        self.nb_done = 0
+        self.nb_reissued = 0
+        # The server of the manager serves each worker in a thread
+        self._lock = threading.Lock()
+
+    def lease(self, worker: str) -> Optional[Tuple[Optional[str], Optional[Dict[str, list]]]]:
+        """
+        Give a chunk to `worker`: a chunk never leased, else a chunk whose lease expired.
+
+        :return: (<chunk id>, <sub-grid>), (None, None) if all the chunks left are leased (retry later), or None if
+            the sweep is finished
+        """
+        with self._lock:
+            if not self.todo:
+                return None
+            now = time.monotonic()
+            for chunk in self.todo:
+                if chunk in self.leases:
+                    if self.leases[chunk][1] > now:
+                        continue
+                    self.nb_reissued += 1
+                self.leases[chunk] = (worker, now + self.lease_timeout)
+                self.attempts[chunk] = self.attempts.get(chunk, 0) + 1
+                return chunk, self.grids[chunk]
+            return None, None
+
+    def complete(self, worker: str, chunk: str, data: bytes) -> bool:
+        """
+        Write the results of a chunk. Invalid results count as a failure of the worker (see `fail`).
+
+        :return: False if the results were ignored (chunk already done, or invalid results)
+        """
+        with self._lock:
+            if chunk not in self.todo:
+                return False
+            sub_grid = self.grids[chunk]
+            expected = 1
+            for values in sub_grid.values():
+                expected *= len(values)
+            try:
+                columns = unpack_results(data)
+                for k in RESULT_COLUMNS:
+                    if len(columns[k]) != expected:
+                        raise ValueError(f"{len(columns[k])} rows received for '{k}', {expected} expected")
+            except (ValueError, struct.error) as e:
+                self._fail(chunk, repr(e))
+                return False
+
+            # Same batch layout as `sweep.iter_record_batches`
+            index = self.index[chunk]
+            batch = {k: array("i") for k in sub_grid}
+            for indices in iter_grid_indices(sub_grid):
+                for k, i in zip(sub_grid, indices):
+                    batch[k].append(i)
+            batch.update({k: array(_TYPECODES[self.result_dtype], columns[k]) for k in RESULT_COLUMNS})
+            tmp_path = chunk_tmp_path(self.directory, self.manifest, index)
+            with WRITERS[self.manifest["extension"]](tmp_path, sub_grid, self.result_dtype) as writer:
+                writer.write_batch(batch)
+            commit_chunk(self.directory, self.manifest, index, tmp_path, expected)
+
+            self.todo.remove(chunk)
+            self.leases.pop(chunk, None)
+            self.nb_done += 1
+            return True
+
+    def fail(self, worker: str, chunk: str, message: str) -> None:
+        """
+        A worker could not evaluate a chunk: give it to another worker, or abandon it after `CLUSTER_MAX_ATTEMPTS`.
+        """
+        with self._lock:
+            if chunk in self.todo:
+                self._fail(chunk, message)
+
+    def finished(self) -> bool:
+        return not self.todo
+
+    def status(self) -> Dict[str, int]:
+        with self._lock:
+            return {"chunks": len(self.index), "skipped": self.nb_skipped, "done": self.nb_done,
+                    "todo": len(self.todo), "leased": len(self.leases), "reissued": self.nb_reissued,
+                    "failed": len(self.failed)}
+
+    def failures(self) -> Dict[str, str]:
+        """
+        Chunks abandoned: {<chunk id>: <last error>}
+        """
+        with self._lock:
+            return dict(self.failed)
+
+    def _fail(self, chunk: str, message: str) -> None:
+        self.leases.pop(chunk, None)
+        if self.attempts.get(chunk, 0) >= CLUSTER_MAX_ATTEMPTS:
+            self.todo.remove(chunk)
+            self.failed[chunk] = message
+
+
+class ClusterManager(BaseManager):
+    pass
+
+
+# The queue of the coordinator (in the server process of the manager)
+_QUEUE: Optional[ChunkQueue] = None
+
+
+def _create_queue(*args, **kwargs) -> ChunkQueue:
+    global _QUEUE
+    _QUEUE = ChunkQueue(*args, **kwargs)
+    return _QUEUE
+
+
+def _get_queue() -> ChunkQueue:
+    return _QUEUE
+
+
+ClusterManager.register("create_queue", callable=_create_queue)
+ClusterManager.register("get_queue", callable=_get_queue)
+
+
+class Coordinator:
+    """
+    Serve the chunks of a sweep to the workers.
+
+    Usage:
+    ```
+    coordinator = Coordinator(grid, "output_dir/", address=("0.0.0.0", 8041), authkey=secret)
+    coordinator.start()
+    coordinator.wait()  # Until all the chunks are done
+    coordinator.stop()
+    ```
+    """
+
+    def __init__(self, grid: Dict[str, list], directory: str, address: Tuple[str, int] = (CLUSTER_HOST, CLUSTER_PORT),
+                 authkey: bytes = None, chunk_keys: List[str] = None, extension: str = ".csv",
+                 result_dtype: str = SWEEP_RESULT_DTYPE, lease_timeout: float = CLUSTER_LEASE_TIMEOUT):
+        """
+        :param authkey: Shared secret (see `get_authkey`)
+        :raises: ValueError if no secret is given for a non-loopback address
+        """
+        self.manager = ClusterManager(address=address, authkey=get_authkey(address[0], authkey))
+        self._queue_args = (grid, directory, chunk_keys, extension, result_dtype, lease_timeout)
+        self.queue = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """
+        Address of the coordinator (the port is known once started, if 0 was given).
+        """
+        return self.manager.address
+
+    def start(self) -> None:
+        self.manager.start()
+        self.queue = self.manager.create_queue(*self._queue_args)
+
+    def wait(self, poll: float = CLUSTER_POLL, verbose: bool = False) -> Dict[str, int]:
+        """
+        Wait until all the chunks are done (or abandoned).
+
+        :return: Counters (see `ChunkQueue.status`)
+        """
+        status = self.queue.status()
+        while not self.queue.finished():
+            time.sleep(poll)
+            if verbose and self.queue.status() != status:
+                status = self.queue.status()
+                print(f"[DEBUG] {status}")
+        return self.queue.status()
+
+    def stop(self) -> None:
+        self.manager.shutdown()
+
+
+def run_worker(address: Tuple[str, int] = (CLUSTER_HOST, CLUSTER_PORT), authkey: bytes = None,
+               worker: str = None, poll: float = CLUSTER_POLL, result_dtype: str = SWEEP_RESULT_DTYPE) -> int:
+    """
+    Evaluate chunks until the sweep is finished (or the coordinator is gone).
+
+    :param address: Address of the coordinator
+    :param authkey: Shared secret (see `get_authkey`)
+    :param worker: Name of the worker (default: host and pid)
+    :param poll: Time to wait when all the chunks left are leased
+    :param result_dtype: Type of the results sent ("float32" halves the size)
+
+    :return: Number of chunks evaluated
+    :raises: ValueError if no secret is given for a non-loopback address
+    """
+    authkey = get_authkey(address[0], authkey)
+    if worker is None:
+        import socket
+        worker = f"{socket.gethostname()}-{os.getpid()}"
+    manager = ClusterManager(address=address, authkey=authkey)
+    manager.connect()
+    queue = manager.get_queue()
+
+    nb_chunks = 0
+    try:
+        while True:
+            lease = queue.lease(worker)
+            if lease is None:
+                return nb_chunks
+            chunk, sub_grid = lease
+            if chunk is None:
+                time.sleep(poll)
+                continue
+            try:
+                data = pack_results(evaluate_chunk(sub_grid), result_dtype)
+            except Exception as e:
+                queue.fail(worker, chunk, repr(e))
+                continue
+            queue.complete(worker, chunk, data)
+            nb_chunks += 1
+    except (EOFError, ConnectionError):
+        # Coordinator gone
+        return nb_chunks
+
+
+def get_authkey(host: str, authkey: bytes = None) -> bytes:
+    """
+    Shared secret: `authkey`, else the environment variable `CLUSTER_AUTHKEY`, else (loopback `host` only) the random
+    secret of the process (see module docstring).
+
+    :raises: ValueError if no secret is given for a non-loopback `host`
+    """
+    if not authkey and os.environ.get(CLUSTER_AUTHKEY_ENV):
+        authkey = os.environ[CLUSTER_AUTHKEY_ENV].encode()
+    if authkey:
+        return authkey
+    if not is_loopback(host):
+        raise ValueError(f"A shared secret is required on a non-loopback address ('{host}'): "
+                         f"set --authkey or the environment variable {CLUSTER_AUTHKEY_ENV}")
+    return bytes(multiprocessing.current_process().authkey)
+
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        # Host name: may resolve to any address
+        return False
+
+
+def evaluate_chunk(sub_grid: Dict[str, list]) -> List[Tuple[float, float]]:
+    """
+    Evaluate all the rows of a sub-grid in one batch, in the order of `sweep.iter_grid_indices`.
+    """
+    keys = list(sub_grid)
+    rows = [profiles_from_kwargs(**dict(zip(keys, values))) for values in product(*sub_grid.values())]
+    return evaluate_batch(rows)
+
+
+# Binary results
+# ----------------------------------------------------------------------------
+def pack_results(results: List[Tuple[float, float]], result_dtype: str = SWEEP_RESULT_DTYPE) -> bytes:
+    """
+    Pack results (one column per result of `RESULT_COLUMNS`) into bytes: header, then the columns, little endian.
+    """
+    typecode = _TYPECODES[result_dtype]
+    data = [RESULTS_HEADER.pack(RESULTS_MAGIC, typecode.encode(), len(results))]
+    for k in range(len(RESULT_COLUMNS)):
+        column = array(typecode, (result[k] for result in results))
+        if sys.byteorder == "big":
+            column.byteswap()
+        data.append(column.tobytes())
+    return b"".join(data)
+
+
+def unpack_results(data: bytes) -> Dict[str, array]:
+    """
+    Inverse of `pack_results`.
+
+    :return: {<result column>: <array of values>}
+    :raises: ValueError if `data` is not a complete packed result (e.g. truncated)
+    """
+    magic, typecode, nb_rows = RESULTS_HEADER.unpack_from(data)
+    if magic != RESULTS_MAGIC:
+        raise ValueError("Not a packed result")
+    typecode = typecode.decode(errors="replace")
+    if typecode not in _TYPECODES.values():
+        raise ValueError(f"Unknown typecode '{typecode}', expected one of {list(_TYPECODES.values())}")
+    expected = RESULTS_HEADER.size + nb_rows * array(typecode).itemsize * len(RESULT_COLUMNS)
+    if len(data) != expected:
+        raise ValueError(f"Packed result of {len(data)} bytes, {expected} expected for {nb_rows} rows")
+    columns = {}
+    offset = RESULTS_HEADER.size
+    for k in RESULT_COLUMNS:
+        column = array(typecode)
+        column.frombytes(data[offset:offset + nb_rows * column.itemsize])
+        if sys.byteorder == "big":
+            column.byteswap()
+        columns[k] = column
+        offset += nb_rows * column.itemsize
+    return columns
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Distributed sweep of `launch_workflow` (coordinator / worker)")
+    parser.add_argument("mode", choices=["coordinator", "worker"])
+    parser.add_argument("grid", nargs="?", help="Coordinator: JSON file containing the grid {<argument>: [<values>]}")
+    parser.add_argument("directory", nargs="?", help="Coordinator: output directory (chunks and manifest)")
+    parser.add_argument("--host", default=CLUSTER_HOST)
+    parser.add_argument("--port", type=int, default=CLUSTER_PORT)
+    parser.add_argument("--chunk-keys", nargs="*", default=None, help="Keys defining the chunks")
+    parser.add_argument("--format", default=".csv", choices=list(WRITERS))
+    parser.add_argument("--lease-timeout", type=float, default=CLUSTER_LEASE_TIMEOUT)
+    parser.add_argument("--authkey", default=None,
+                        help=f"Shared secret (prefer the environment variable {CLUSTER_AUTHKEY_ENV})")
+    args = parser.parse_args()
+
+    # Separate processes: the random secret of the process cannot be shared, a secret is always required
+    authkey = (args.authkey or os.environ.get(CLUSTER_AUTHKEY_ENV, "")).encode()
+    if not authkey:
+        parser.error(f"a shared secret is required: set --authkey or the environment variable {CLUSTER_AUTHKEY_ENV}")
+
+    if args.mode == "coordinator":
+        coordinator = Coordinator(load_grid(args.grid), args.directory, (args.host, args.port), authkey,
+                                  chunk_keys=args.chunk_keys, extension=args.format, lease_timeout=args.lease_timeout)
+        coordinator.start()
+        print(f"Coordinator listening on {coordinator.address}")
+        try:
+            print(coordinator.wait(verbose=True))
+        finally:
+            coordinator.stop()
+    else:
+        print(f"{run_worker((args.host, args.port), authkey)} chunks evaluated")
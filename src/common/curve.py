@@ -0,0 +1,177 @@
+"""
+Response curve of an attack to the number of figurines: mean dead enemies, mean HP lost and probability to kill at
+least `min_dead` enemies, for `nb_figs` = 1 to `max_figs`, in about the cost of a single evaluation (for
+`max_figs` figurines).
+
+"exact" engine (see `distribution.py`):
+* the number of damage events of one figurine is computed once (all the stages up to the failed saves), and the
+distribution for n figurines is built from the one for n - 1 (one convolution each),
+* the allocation states are computed once, up to the largest number of events (`max_figs` figurines), and summarized
+per number of events (PMF of the dead, mean HP lost, see `distribution.AllocationSummary`, shared with
+`attrition.py`): each point of the curve is then a single sum over the number of events,
+* over several targets (`response_curves`), targets having the same toughness and saves share the events, and targets
+having the same FNP and HP share the allocation (extended when a target needs more events).
+
+"average" engine (see `kernel.py`): the arguments of the kernel (target table lookups, averages of the dice
+expressions) are computed once, then the kernel is called for each number of figurines (no kill probability).
+
+Usage:
+```
+curve = response_curve(weapon, target, rules, max_figs=20, min_dead=3)
+curve.mean_dead[4]  # Average number of dead enemies with 5 figurines
+curves = response_curves(weapon, {name: TargetProfile.from_datasheet(carac) for name, carac in ...}, rules)
+```
+"""
+import sys
+from dataclasses import dataclass
+from os.path import dirname, abspath
+from typing import Dict, List, Optional, Tuple
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.distribution import AllocationSummary, Distribution, event_damage_pmf, figurine_event_counts
+from common.kernel import flags_key, get_kernel, kernel_arguments
+from common.profile import WeaponProfile, TargetProfile, RuleSet
+from common.utils import CURVE_MAX_FIGS, DISTRIBUTION_EPSILON
+
+ENGINES = ("exact", "average")
+
+
+@dataclass(frozen=True)
+class ResponseCurve:
+    """
+    Results for `nb_figs` = 1 to `max_figs` (index: `nb_figs` - 1).
+    """
+    mean_dead: Tuple[float, ...]
+    mean_hp_lost: Tuple[float, ...]
+    # Probability to kill at least `min_dead` enemies (None if not asked, or "average" engine)
+    kill_probability: Optional[Tuple[float, ...]]
+    # Bound of the error on the probabilities (see `ExactResult.error`, 0 for the "average" engine)
+    error: Tuple[float, ...]
+
+    @property
+    def nb_figs(self) -> Tuple[int, ...]:
+        return tuple(range(1, len(self.mean_dead) + 1))
+
+    def __len__(self) -> int:
+        return len(self.mean_dead)
+
+
+def response_curve(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet, max_figs: int = CURVE_MAX_FIGS,
+                   min_dead: int = None, engine: str = "exact",
+                   epsilon: float = DISTRIBUTION_EPSILON) -> ResponseCurve:
+    """
+    Response curve of the attack of `weapon` on `target` (see module docstring). `weapon.nb_figs` is ignored.
+
+    :param max_figs: Largest number of figurines
+    :param min_dead: If given, compute the probability to kill at least `min_dead` enemies ("exact" engine only)
+    :param engine: "exact" or "average"
+    :param epsilon: Probabilities below `epsilon` are dropped ("exact" engine, see `exact_distribution`)
+
+    :return: `ResponseCurve`
+    """
+    return response_curves(weapon, {"": target}, rules, max_figs, min_dead, engine, epsilon)[""]
+
+
+def response_curves(weapon: WeaponProfile, targets: Dict[str, TargetProfile], rules: RuleSet,
+                    max_figs: int = CURVE_MAX_FIGS, min_dead: int = None, engine: str = "exact",
+                    epsilon: float = DISTRIBUTION_EPSILON, verbose: bool = False) -> Dict[str, ResponseCurve]:
+    """
+    Response curves of the attack of `weapon` on each target (see `response_curve`).
+
+    :param targets: {<name>: <target>}
+    :param verbose: Set to True to print the number of distributions shared between the targets
+
+    :return: {<name>: `ResponseCurve`}
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
+    if max_figs < 1:
+        raise ValueError(f"max_figs must be at least 1, got {max_figs}")
+
+    if engine == "average":
+        return {name: _average_curve(weapon, target, rules, max_figs) for name, target in targets.items()}
+
+    # 1/ Events of 0 to `max_figs` figurines, shared by the targets having the same toughness and saves
+    events: Dict[tuple, List[Distribution]] = {}
+    # 2/ Allocation, shared by the targets having the same FNP and HP
+    allocations: Dict[tuple, AllocationSummary] = {}
+    curves = {}
+    for name, target in targets.items():
+        events_key = (target.enemy_toughness, target.svg_enemy, target.svg_invul_enemy)
+        if events_key not in events:
+            events[events_key] = figurine_event_counts(weapon, target, rules, max_figs, epsilon)
+        counts = events[events_key][1:]
+
+        allocation_key = (target.fnp_enemy, target.enemy_hp)
+        if allocation_key not in allocations:
+            allocations[allocation_key] = AllocationSummary(event_damage_pmf(weapon, target), target.enemy_hp,
+                                                            epsilon=epsilon)
+        allocation = allocations[allocation_key]
+        allocation.extend(max(count.max_value for count in counts))
+
+        # 3/ One point per number of figurines
+        points = [_point(*allocation.mix(count), min_dead) for count in counts]
+        mean_dead, mean_hp_lost, kill_probability, error = zip(*points)
+        curves[name] = ResponseCurve(mean_dead=mean_dead, mean_hp_lost=mean_hp_lost,
+                                     kill_probability=None if min_dead is None else kill_probability, error=error)
+
+    if verbose: print(f"[DEBUG] {len(targets)} targets: {len(events)} event distributions, "
+                      f"{len(allocations)} allocations")
+    return curves
+
+
+# Utils
+# ----------------------------------------------------------------------------
+def _point(dead: Distribution, mean_hp_lost: float,
+           min_dead: Optional[int]) -> Tuple[float, float, Optional[float], float]:
+    """
+    Point of the curve from the result of `AllocationSummary.mix`.
+
+    :return: Tuple (mean dead, mean HP lost, kill probability (None if no `min_dead`), error)
+    """
+    kill_probability = None if min_dead is None else sum(p for nb_dead, p in dead.items() if nb_dead >= min_dead)
+    return dead.mean, mean_hp_lost, kill_probability, dead.discarded
+
+
+def _average_curve(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet, max_figs: int) -> ResponseCurve:
+    """
+    Curve of the "average" engine: the kernel, with its arguments computed once (same results as `engine.evaluate`).
+    """
+    kernel = get_kernel(flags_key(rules))
+    arguments = list(kernel_arguments(weapon, target, rules))
+    mean_dead, mean_hp_lost = [], []
+    for nb_figs in range(1, max_figs + 1):
+        # `nb_figs` is the first argument of the kernels (see `ARGUMENTS`)
+        arguments[0] = nb_figs
+        enemy_dead, remaining_hp = kernel(*arguments)
+        mean_dead.append(enemy_dead + (target.enemy_hp - remaining_hp) / target.enemy_hp)
+        mean_hp_lost.append(enemy_dead * target.enemy_hp + target.enemy_hp - remaining_hp)
+    return ResponseCurve(mean_dead=tuple(mean_dead), mean_hp_lost=tuple(mean_hp_lost), kill_probability=None,
+                         error=(0.,) * max_figs)
+
+
+if __name__ == "__main__":
+    import argparse
+    from common.enemy import opponent_datasheets
+
+    parser = argparse.ArgumentParser(description="Response curve of an attack to the number of figurines")
+    parser.add_argument("target", help="Name of a datasheet (see `enemy.py`)")
+    parser.add_argument("--max-figs", type=int, default=CURVE_MAX_FIGS)
+    parser.add_argument("--min-dead", type=int, default=1)
+    parser.add_argument("--engine", default="exact", choices=ENGINES)
+    args = parser.parse_args()
+
+    curve = response_curve(WeaponProfile(), TargetProfile.from_datasheet(opponent_datasheets[args.target]),
+                           RuleSet(), args.max_figs, args.min_dead, args.engine)
+    for i, nb_figs in enumerate(curve.nb_figs):
+        kill = "" if curve.kill_probability is None else \
+            f", P(dead >= {args.min_dead}) = {curve.kill_probability[i]:.3f}"
+        print(f"{nb_figs} figurines: {curve.mean_dead[i]:.3f} dead, {curve.mean_hp_lost[i]:.3f} HP lost{kill}")
@@ -0,0 +1,172 @@
+"""
+Index over the datasheets (see `enemy.py`): filter targets by stat ranges and autocomplete on name prefix, without a
+scan of all the datasheets at each query.
+
+* Rows are numbered in the (case-insensitive) alphabetical order of their names: the rows matching a name prefix are a
+contiguous range of numbers (found by bisection in the sorted names),
+* A set of rows is a bitmap (a Python int, bit i set if row i belongs to the set): filters are combined with `&`,
+* For each stat, the distinct values are sorted and, for each of them, the bitmap of the rows having a lower value is
+stored: the rows with a value in [low, high] are `below[high + 1] & ~below[low]` (2 bisections and 2 bitmap
+operations, whatever the number of rows).
+
+Stats are named as the attributes of `TargetProfile` (a missing save / FNP is 7, as in `TargetProfile`).
+
+Usage:
+```
+index = DatasheetIndex(opponent_datasheets)
+index.select(enemy_toughness=(8, None), svg_enemy=(None, 2), svg_invul_enemy=(None, 4))  # T8+, 2+ save and 4++
+index.select(enemy_hp=(3, 6))  # W between 3 and 6
+index.autocomplete("ter")  # ["terminator"]
+```
+"""
+import sys
+from bisect import bisect_left, bisect_right
+from os.path import dirname, abspath
+from typing import Dict, List, Optional, Tuple, Union
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.enemy import opponent_datasheets
+from common.utils import DATASHEET_AUTOCOMPLETE_LIMIT
+
+# {<stat (attribute of `TargetProfile`)>: <column of the datasheets>}
+STAT_COLUMNS = {"enemy_toughness": "toughness",
+                "svg_enemy": "svg",
+                "svg_invul_enemy": "svg invul",
+                "fnp_enemy": "feel no pain",
+                "enemy_hp": "w"}
+
+# Range of a stat: exact value, or (low, high), bounds included (None: no bound)
+Range = Union[int, Tuple[Optional[int], Optional[int]]]
+
+
+class StatColumn:
+    """
+    Sorted distinct values of one stat, and the bitmap of the rows below each of them.
+    """
+
+    def __init__(self, values: List[int]):
+        """
+        :param values: Value of the stat for each row
+        """
+        bitmaps: Dict[int, int] = {}
+        for row, value in enumerate(values):
+            bitmaps[value] = bitmaps.get(value, 0) | (1 << row)
+        self.values = sorted(bitmaps)
+        # below[j]: rows with a value < values[j] (below[-1]: all the rows)
+        self.below = [0]
+        for value in self.values:
+            self.below.append(self.below[-1] | bitmaps[value])
+
+    def between(self, low: Optional[int] = None, high: Optional[int] = None) -> int:
+        """
+        Bitmap of the rows whose value is in [low, high].
+        """
+        start = 0 if low is None else bisect_left(self.values, low)
+        stop = len(self.values) if high is None else bisect_right(self.values, high)
+        if start >= stop:
+            return 0
+        return self.below[stop] & ~self.below[start]
+
+
+class DatasheetIndex:
+    """
+    Index of datasheets (see module docstring). Built once: rebuild it if the datasheets change.
+    """
+
+    def __init__(self, datasheets: Dict[str, dict] = None):
+        """
+        :param datasheets: {<name>: <datasheet>} (default: `opponent_datasheets`)
+        """
+        datasheets = opponent_datasheets if datasheets is None else datasheets
+        self.names = sorted(datasheets, key=lambda name: (name.casefold(), name))
+        self._keys = [name.casefold() for name in self.names]
+        self.all = (1 << len(self.names)) - 1
+        self.columns = {stat: StatColumn([_stat_value(datasheets[name][column]) for name in self.names])
+                        for stat, column in STAT_COLUMNS.items()}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def bitmap(self, prefix: str = "", **ranges: Range) -> int:
+        """
+        Bitmap of the rows whose name starts with `prefix` (case-insensitive) and whose stats are in `ranges`.
+
+        :param ranges: {<stat>: <value or (low, high)>}, e.g. `enemy_toughness=(8, None)`
+        :raises: ValueError if a stat is unknown
+        """
+        unknown = set(ranges) - set(STAT_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown stats: {sorted(unknown)}, expected some of {list(STAT_COLUMNS)}")
+
+        bitmap = self.all
+        if prefix:
+            start, stop = self.prefix_range(prefix)
+            bitmap = ((1 << stop) - 1) ^ ((1 << start) - 1)
+        for stat, value in ranges.items():
+            low, high = (value, value) if isinstance(value, int) else value
+            bitmap &= self.columns[stat].between(low, high)
+            if not bitmap:
+                break
+        return bitmap
+
+    def select(self, prefix: str = "", limit: Optional[int] = None, **ranges: Range) -> List[str]:
+        """
+        Names of the datasheets matching the filters (see `bitmap`), in alphabetical order.
+
+        :param limit: Maximum number of names returned (None: all)
+        """
+        return [self.names[row] for row in _rows(self.bitmap(prefix, **ranges), limit)]
+
+    def count(self, prefix: str = "", **ranges: Range) -> int:
+        """
+        Number of datasheets matching the filters (see `bitmap`).
+        """
+        return bin(self.bitmap(prefix, **ranges)).count("1")
+
+    def autocomplete(self, prefix: str, limit: int = DATASHEET_AUTOCOMPLETE_LIMIT) -> List[str]:
+        """
+        First names (alphabetical order) starting with `prefix` (case-insensitive).
+        """
+        start, stop = self.prefix_range(prefix)
+        return self.names[start:min(stop, start + limit)]
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """
+        Rows [start, stop) whose name starts with `prefix` (case-insensitive).
+        """
+        prefix = prefix.casefold()
+        start = bisect_left(self._keys, prefix)
+        # Names starting with `prefix` are below `prefix` followed by the last code point
+        stop = bisect_left(self._keys, prefix + "\U0010ffff", lo=start)
+        return start, stop
+
+
+# Utils
+# ----------------------------------------------------------------------------
+def _stat_value(value) -> int:
+    """
+    Value of a stat in a datasheet: a missing save / FNP (None) is 7 (see `TargetProfile`).
+    """
+    return 7 if value is None else int(value)
+
+
+def _rows(bitmap: int, limit: Optional[int] = None) -> List[int]:
+    """
+    Rows (set bits) of a bitmap, in increasing order.
+    """
+    # Bits as a string, lowest first: finding the set bits is a scan in C, not a Python loop over all the bits
+    bits = bin(bitmap)[:1:-1]
+    rows = []
+    row = bits.find("1")
+    while row >= 0 and (limit is None or len(rows) < limit):
+        rows.append(row)
+        row = bits.find("1", row + 1)
+    return rows
@@ -6,13 +6,16 @@ Terminology:
 * function starting with `add`: result to be added to a `proba` function
 """
 from dataclasses import dataclass
-from typing import Union
+from math import comb
+from typing import Tuple, Union
 
-@dataclass
+@dataclass(frozen=True)
 class DiceExpression:
     """
     This object stores the dice expressed as "complex expressions"
     Example: "2D6+1" --> DiceExpression(nb_dice=2, dice_face=6, bonus=1)
+
+    NB: frozen (hashable), permits to use it in profiles used as dict keys (see `profile.py`).
     """
     nb_dice: int
     dice_face: int
@@ -107,11 +110,66 @@ def _define_average_launch(dice_expression: str) -> float:
     d = _parse_str_expression(dice_expression)
     # ex: DiceExpression(nb_dice=2, dice_face=6, bonus=1)
 
+    return average_dice_expression(d)
+
+
+def average_dice_expression(d: DiceExpression) -> float:
+    """
+    Average result of an already parsed dice expression.
+
+    Exemple: DiceExpression(nb_dice=2, dice_face=6, bonus=1) --> result =  2*3.5+1 = 8
+
+    :param d: Parsed dice expression (see `_parse_str_expression`)
+    :return: Average result of `d`
+    """
     # Average value of one dice = (the highest value + 1) / 2
     average_value_one_dice = (d.dice_face + 1) / 2
     # ex: 3.5 is the average result of 1D6 dice
     # ex: 2 is the average result of 1D3 dice
     return d.nb_dice * average_value_one_dice + d.bonus
+
+
+def dice_expression_pmf(d: DiceExpression) -> dict:
+    """
+    Probability of each result of an already parsed dice expression.
+
+    Exemple: DiceExpression(nb_dice=1, dice_face=3, bonus=1) ("D3+1") --> result = {2: 1/3, 3: 1/3, 4: 1/3}
+
+    :param d: Parsed dice expression (see `_parse_str_expression`)
+    :return: Dict {<result>: <probability>}
+    """
+    pmf = {d.bonus: 1.}
+    for _ in range(d.nb_dice):
+        rolled = {}
+        for value, proba in pmf.items():
+            for face in range(1, d.dice_face + 1):
+                rolled[value + face] = rolled.get(value + face, 0.) + proba / d.dice_face
+        pmf = rolled
+    return pmf
+
+
+def fnp_damage_pmf(damage_pmf: dict, proba_fnp_failed: float) -> dict:
+    """
+    Apply feel no pain (one dice per point of damage) on a distribution of damage.
+
+    Exemple: damage_pmf = {2: 1.}, proba_fnp_failed=1/2 (FNP 4+) --> result = {0: 1/4, 1: 1/2, 2: 1/4}
+
+    :param damage_pmf: Dict {<damage>: <probability>}
+    :param proba_fnp_failed: Probability to fail the feel no pain (1 if no FNP)
+    :return: Dict {<damage after FNP>: <probability>}
+    """
+    if proba_fnp_failed == 1:
+        return dict(damage_pmf)
+
+    result = {}
+    for damage, proba in damage_pmf.items():
+        # Binomial(damage, proba_fnp_failed)
+        for k in range(damage + 1):
+            p = comb(damage, k) * proba_fnp_failed ** k * (1 - proba_fnp_failed) ** (damage - k)
+            result[k] = result.get(k, 0.) + proba * p
+    return result
+
+
 def proba_dice(dice_requested: int, succeed=True) -> float:
     """
     Get the probability to succeed in having more (or equal) than `dice_requested` on a 6 face launch (case
@@ -165,6 +223,37 @@ def proba_rr_all(dice_requested:int) -> float:
     proba = proba_dice(dice_requested)
     return proba + proba * proba_dice(dice_requested, succeed=False)
 
+def proba_outcomes(dice_requested: int, crit: int, rr_ones: bool = False, rr_all: bool = False,
+                   fish: bool = False) -> Tuple[float, float, float]:
+    """
+    Get the probability of each outcome of one dice (fail, non critical success, critical success), dice by dice.
+    Re-rolled faces: the ones (`rr_ones`), the failures (`rr_all`), or all non criticals (`rr_all` and `fish`).
+
+    Exemple: dice_requested=4, crit=6, no re-roll --> result = (1/2, 1/3, 1/6)
+
+    :param dice_requested: Dice value requested. 3 means 3+ (shall be <= `crit`: a critical is always a success)
+    :param crit: Dice value to get a crit (6 means 6+)
+    :param rr_ones: If True, re-roll the ones
+    :param rr_all: If True, re-roll the failures
+    :param fish: If True (and `rr_all`), re-roll all non critical dices
+    :return: Tuple of probabilities (fail, success not critical, critical)
+    """
+    if rr_all and fish:
+        rerolled = [f for f in range(1, 7) if f < crit]
+    elif rr_all:
+        rerolled = [f for f in range(1, 7) if f < dice_requested]
+    elif rr_ones:
+        rerolled = [1]
+    else:
+        rerolled = []
+
+    # Probability of each final face: not re-rolled (1/6), or re-rolled then obtained (nb re-rolled faces / 36)
+    faces = {f: (0 if f in rerolled else 1 / 6) + len(rerolled) / 36 for f in range(1, 7)}
+
+    fail = sum(p for f, p in faces.items() if f < dice_requested)
+    critical = sum(p for f, p in faces.items() if f >= crit)
+    return fail, 1 - fail - critical, critical
+
 # additional proba if sustain hit (to be added to proba)
 def add_sustain_hit(sustain: float, crit: int=6) -> float:
     """
@@ -0,0 +1,476 @@
+"""
+Exact distribution of the result of an attack (number of dead enemies, HP lost), computed with probability mass
+functions (PMF, dict {<value>: <probability>}) instead of rolling dice.
+
+Same dice rules as the Monte Carlo simulation (see `montecarlo.py`):
+1. each attack gives a number of "damage events" (failed saves and devastating wounds), through the hit / sustain /
+lethal / wound / save splits. The PMF of one attack is compounded over the number of attacks,
+2. each event deals a random damage (damage dice, then feel no pain),
+3. damage is allocated figurine by figurine (damage exceeding the HP of a figurine is lost): dynamic programming over
+the states (dead enemies, damage on the current figurine), event after event.
+
+The allocation states only depend on the damage PMF and the HP of the target: they are re-used by the engines that
+need the distribution for several numbers of events (`allocation_states`).
+
+Large pools carry thousands of support points of negligible probability: each stage drops the probabilities below
+`epsilon` (see `Distribution`). The mass dropped is tracked all along the stages and reported as `error` (a rigorous
+bound of the error on any probability of the result).
+
+Usage:
+```
+result = exact_distribution(weapon, target, rules)
+result.mean_dead  # Average number of dead enemies
+result.kill_probability(3)  # Probability to kill at least 3 enemies
+```
+"""
+import sys
+from dataclasses import dataclass
+from os.path import dirname, abspath
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.dice import (proba_dice, proba_outcomes, get_wound_threshold, dice_expression_pmf, fnp_damage_pmf)
+from common.profile import WeaponProfile, TargetProfile, RuleSet
+from common.utils import DISTRIBUTION_EPSILON, DISTRIBUTION_DENSE_FILL
+
+# PMF: {<value>: <probability>}
+PMF = Dict[int, float]
+
+
+@dataclass(frozen=True)
+class ExactResult:
+    """
+    Exact distribution of the result of an attack.
+    """
+    # PMF of the number of dead enemies and of the HP lost
+    dead_pmf: Dict[int, float]
+    hp_lost_pmf: Dict[int, float]
+    # Probability mass discarded (pruning): bound of the error on the probabilities (the true probabilities are in
+    # [p, p + error])
+    error: float = 0.
+
+    @property
+    def mean_dead(self) -> float:
+        return mean(self.dead_pmf)
+
+    @property
+    def mean_hp_lost(self) -> float:
+        return mean(self.hp_lost_pmf)
+
+    def kill_probability(self, min_dead: int) -> float:
+        """
+        Probability to kill at least `min_dead` enemies.
+        """
+        return sum(p for dead, p in self.dead_pmf.items() if dead >= min_dead)
+
+
+def exact_distribution(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet,
+                       epsilon: float = DISTRIBUTION_EPSILON) -> ExactResult:
+    """
+    Compute the exact distribution (up to the pruning) of the number of dead enemies and of the HP lost.
+
+    Cost: (number of events) * (number of allocation states) * (size of the damage PMF): use it for small pools
+    (see `approx.py` for large pools).
+
+    :param weapon: Attacking unit
+    :param target: Target (a squad large enough to absorb all the damage)
+    :param rules: Criticals, re-rolls and weapon abilities
+    :param epsilon: Probabilities below `epsilon` are dropped at each stage (0: no pruning)
+
+    :return: `ExactResult`
+    """
+    events = event_count_pmf(weapon, target, rules, epsilon)
+    states, discarded = allocation_states(event_damage_pmf(weapon, target), target.enemy_hp, events.max_value,
+                                          epsilon)
+
+    dead_pmf, hp_lost_pmf = {}, {}
+    error = events.discarded
+    for nb_events, p_events in events.items():
+        error += p_events * discarded[nb_events]
+        for (dead, wounds), p in states[nb_events].items():
+            dead_pmf[dead] = dead_pmf.get(dead, 0.) + p_events * p
+            hp_lost = dead * target.enemy_hp + wounds
+            hp_lost_pmf[hp_lost] = hp_lost_pmf.get(hp_lost, 0.) + p_events * p
+
+    return ExactResult(dead_pmf=dead_pmf, hp_lost_pmf=hp_lost_pmf, error=error)
+
+
+# Stages of the workflow
+# ----------------------------------------------------------------------------
+def stage_probas(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet) -> Dict[str, float]:
+    """
+    Probabilities of the outcomes of each dice of the workflow.
+
+    :return: Dict with keys:
+        * "miss", "hit", "crit_hit": outcomes of a hit dice (non critical hit / critical hit),
+        * "wound", "crit_wound": outcomes of a wound dice (non critical wound / critical wound),
+        * "event_wound": probability that a wound dice ends as a damage event (failed save or devastating wound),
+        * "failed_save": probability that a lethal hit (automatic wound) ends as a damage event.
+    """
+    hit_threshold = min(rules.crit, weapon.hit_threshold)
+    wounds_threshold = min(rules.crit_wounds,
+                           get_wound_threshold(weapon_s=weapon.weapon_s, enemy_toughness=target.enemy_toughness)
+                           - rules.bonus_wound)
+    svg = min(target.svg_enemy + weapon.weapon_ap, 7, target.svg_invul_enemy)
+    failed_save = proba_dice(svg, succeed=False)
+
+    miss, hit, crit_hit = proba_outcomes(hit_threshold, rules.crit, rr_ones=rules.rr_hit_ones,
+                                         rr_all=rules.rr_hit_all, fish=rules.fish_hit)
+    _, wound, crit_wound = proba_outcomes(wounds_threshold, rules.crit_wounds, rr_ones=rules.rr_wounds_ones,
+                                          rr_all=rules.twin, fish=rules.fish_wound and rules.devastating_wounds)
+    if rules.devastating_wounds:
+        event_wound = crit_wound + wound * failed_save
+    else:
+        event_wound = (crit_wound + wound) * failed_save
+
+    return {"miss": miss, "hit": hit, "crit_hit": crit_hit, "wound": wound, "crit_wound": crit_wound,
+            "event_wound": event_wound, "failed_save": failed_save}
+
+
+def attack_event_pmf(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet) -> "Distribution":
+    """
+    Distribution of the number of damage events (failed saves and devastating wounds) of one attack.
+    """
+    probas = stage_probas(weapon, target, rules)
+    wound_dice = bernoulli(probas["event_wound"])
+    if rules.torrent:
+        return Distribution(wound_dice)
+
+    sustain = compound(dice_expression_pmf(rules.sustain_hit), wound_dice)
+    crit_hit = convolve(bernoulli(probas["failed_save"]) if rules.lethal_hit else wound_dice, sustain)
+    return mixture([(probas["miss"], {0: 1.}), (probas["hit"], wound_dice), (probas["crit_hit"], crit_hit)])
+
+
+def event_count_pmf(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet,
+                    epsilon: float = DISTRIBUTION_EPSILON) -> "Distribution":
+    """
+    Distribution of the total number of damage events of the unit (all the figurines, all the attacks).
+
+    :param epsilon: Probabilities below `epsilon` are dropped
+    """
+    return power(figurine_event_pmf(weapon, target, rules, epsilon), weapon.nb_figs, epsilon)
+
+
+def figurine_event_pmf(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet,
+                       epsilon: float = DISTRIBUTION_EPSILON) -> "Distribution":
+    """
+    Distribution of the number of damage events of one figurine (all its attacks).
+    """
+    return compound(dice_expression_pmf(weapon.weapon_a), attack_event_pmf(weapon, target, rules), epsilon)
+
+
+def event_damage_pmf(weapon: WeaponProfile, target: TargetProfile) -> PMF:
+    """
+    PMF of the damage of one event, after feel no pain.
+    """
+    return fnp_damage_pmf(dice_expression_pmf(weapon.weapon_d), proba_dice(target.fnp_enemy, succeed=False))
+
+
+def allocation_states(damage_pmf: PMF, enemy_hp: int, max_events: int,
+                      epsilon: float = 0.) -> Tuple[List[Dict[Tuple[int, int], float]], List[float]]:
+    """
+    Allocate the damage events figurine by figurine (damage exceeding the HP of a figurine is lost).
+
+    :param damage_pmf: PMF of the damage of one event
+    :param enemy_hp: HP of a figurine of the target
+    :param max_events: Maximum number of events
+    :param epsilon: States of probability below `epsilon` are dropped
+
+    :return: Tuple:
+        * list (index: number of events, from 0 to `max_events`) of dicts {(<dead>, <damage on the current
+        figurine>): <probability>},
+        * list of the probability mass discarded (same index)
+    """
+    states, discarded = [{(0, 0): 1.}], [0.]
+    extend_allocation(states, discarded, damage_pmf, enemy_hp, max_events, epsilon)
+    return states, discarded
+
+
+def extend_allocation(states: List[Dict[Tuple[int, int], float]], discarded: List[float], damage_pmf: PMF,
+                      enemy_hp: int, max_events: int, epsilon: float = 0.) -> None:
+    """
+    Extend (in place) the result of `allocation_states` up to `max_events` events (nothing done if already computed):
+    the states of the first events are not computed again.
+    """
+    for _ in range(len(states) - 1, max_events):
+        new_states = {}
+        for (dead, wounds), p in states[-1].items():
+            for damage, q in damage_pmf.items():
+                if wounds + damage >= enemy_hp:
+                    key = (dead + 1, 0)
+                else:
+                    key = (dead, wounds + damage)
+                new_states[key] = new_states.get(key, 0.) + p * q
+
+        pruned = 0.
+        if epsilon > 0:
+            for key in [key for key, p in new_states.items() if p < epsilon]:
+                pruned += new_states.pop(key)
+        states.append(new_states)
+        discarded.append(discarded[-1] + pruned)
+
+
+# Several numbers of figurines (see `curve.py` and `attrition.py`)
+# ----------------------------------------------------------------------------
+def figurine_event_counts(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet, max_figs: int,
+                          epsilon: float = DISTRIBUTION_EPSILON) -> List["Distribution"]:
+    """
+    Distributions of the number of damage events of 0 to `max_figs` figurines (`weapon.nb_figs` is ignored), each
+    from the previous one (one convolution with `figurine_event_pmf` per figurine).
+
+    :return: List (index: number of figurines) of `Distribution`
+    """
+    figurine = figurine_event_pmf(weapon, target, rules, epsilon)
+    counts = [Distribution({0: 1.})]
+    for _ in range(max_figs):
+        counts.append(convolve(counts[-1], figurine, epsilon))
+    return counts
+
+
+class AllocationSummary:
+    """
+    Allocation states (see `allocation_states`) summarized per number of events: PMF of the dead enemies and mean HP
+    lost. Shared by several distributions of the number of events (see `mix`), extended when one needs more events.
+    """
+
+    def __init__(self, damage_pmf: PMF, enemy_hp: int, max_events: int = 0, epsilon: float = DISTRIBUTION_EPSILON):
+        """
+        :param damage_pmf: PMF of the damage of one event (see `event_damage_pmf`)
+        :param enemy_hp: HP of a figurine of the target
+        :param max_events: Number of events to allocate now (see `extend`)
+        :param epsilon: States of probability below `epsilon` are dropped
+        """
+        self.damage_pmf, self.enemy_hp, self.epsilon = damage_pmf, enemy_hp, epsilon
+        self.states, self.discarded = allocation_states(damage_pmf, enemy_hp, max_events, epsilon)
+        # Index: number of events
+        self.dead_pmf: List[PMF] = []
+        self.mean_hp_lost: List[float] = []
+        self._summarize()
+
+    def extend(self, max_events: int) -> None:
+        """
+        Allocate up to `max_events` events (only the events not allocated yet).
+        """
+        extend_allocation(self.states, self.discarded, self.damage_pmf, self.enemy_hp, max_events, self.epsilon)
+        self._summarize()
+
+    def _summarize(self) -> None:
+        for states in self.states[len(self.dead_pmf):]:
+            dead_pmf = {}
+            for (dead, _), p in states.items():
+                dead_pmf[dead] = dead_pmf.get(dead, 0.) + p
+            self.dead_pmf.append(dead_pmf)
+            self.mean_hp_lost.append(sum((dead * self.enemy_hp + wounds) * p for (dead, wounds), p in states.items()))
+
+    def mix(self, count: "Distribution") -> Tuple["Distribution", float]:
+        """
+        Results for a distribution of the number of events (extended up to its largest value if needed).
+
+        :return: Tuple (`Distribution` of the dead enemies, with the mass discarded by `count` and by the allocation,
+        mean HP lost)
+        """
+        self.extend(count.max_value)
+        dead_pmf = {}
+        mean_hp_lost = 0.
+        error = count.discarded
+        for nb_events, p_events in count.items():
+            error += p_events * self.discarded[nb_events]
+            mean_hp_lost += p_events * self.mean_hp_lost[nb_events]
+            for dead, p in self.dead_pmf[nb_events].items():
+                dead_pmf[dead] = dead_pmf.get(dead, 0.) + p_events * p
+        return Distribution(dead_pmf, discarded=error), mean_hp_lost
+
+
+# Distributions
+# ----------------------------------------------------------------------------
+class Distribution:
+    """
+    Probability mass function on integers, pruned: probabilities below `epsilon` are dropped, and the total mass
+    dropped is tracked in `discarded`. It is a rigorous bound of the error on any probability computed from it (the
+    true distribution is the stored one plus a mass of `discarded` somewhere).
+
+    Storage depends on the support:
+    * dense: list of probabilities from `offset`, if the support is compact (see `DISTRIBUTION_DENSE_FILL`),
+    * sparse: dict {<value>: <probability>} otherwise.
+    """
+    __slots__ = ("offset", "dense", "sparse", "discarded")
+
+    def __init__(self, pmf: PMF = None, discarded: float = 0., epsilon: float = 0.):
+        """
+        :param pmf: Dict {<value>: <probability>}
+        :param discarded: Mass already discarded
+        :param epsilon: Probabilities below `epsilon` are dropped
+        """
+        pmf = {} if pmf is None else pmf
+        kept = {}
+        for x, p in pmf.items():
+            if p < epsilon:
+                discarded += p
+            elif p > 0:
+                kept[x] = p
+        self._pack(kept, discarded)
+
+    @classmethod
+    def from_dense(cls, offset: int, values: List[float], discarded: float = 0., epsilon: float = 0.) -> "Distribution":
+        """
+        Build from a dense list of probabilities (`values[i]`: probability of `offset + i`).
+        """
+        result = cls.__new__(cls)
+        if epsilon > 0:
+            values = list(values)
+            for i, p in enumerate(values):
+                if 0 < p < epsilon:
+                    discarded += p
+                    values[i] = 0.
+        # Trim the zeros of the tails
+        first = next((i for i, p in enumerate(values) if p > 0), len(values))
+        last = next((i for i in range(len(values) - 1, -1, -1) if values[i] > 0), -1)
+        values = values[first:last + 1]
+        non_zero = sum(1 for p in values if p > 0)
+        if values and non_zero < DISTRIBUTION_DENSE_FILL * len(values):
+            result._pack({offset + first + i: p for i, p in enumerate(values) if p > 0}, discarded)
+        else:
+            result.offset, result.dense, result.sparse, result.discarded = offset + first, values, None, discarded
+        return result
+
+    def _pack(self, pmf: PMF, discarded: float) -> None:
+        """
+        Store `pmf` (without zeros) as dense or sparse.
+        """
+        self.discarded = discarded
+        if pmf and len(pmf) >= DISTRIBUTION_DENSE_FILL * (max(pmf) - min(pmf) + 1):
+            self.offset = min(pmf)
+            self.dense = [0.] * (max(pmf) - self.offset + 1)
+            for x, p in pmf.items():
+                self.dense[x - self.offset] = p
+            self.sparse = None
+        else:
+            self.offset, self.dense, self.sparse = 0, None, pmf
+
+    @property
+    def is_dense(self) -> bool:
+        return self.dense is not None
+
+    @property
+    def min_value(self) -> int:
+        return self.offset if self.is_dense else min(self.sparse, default=0)
+
+    @property
+    def max_value(self) -> int:
+        return self.offset + len(self.dense) - 1 if self.is_dense else max(self.sparse, default=0)
+
+    def __len__(self) -> int:
+        return len(self.dense) if self.is_dense else len(self.sparse)
+
+    def items(self) -> Iterator[Tuple[int, float]]:
+        """
+        Iterate over the (value, probability) of the support (probabilities > 0).
+        """
+        if self.is_dense:
+            return ((self.offset + i, p) for i, p in enumerate(self.dense) if p > 0)
+        return iter(self.sparse.items())
+
+    def get(self, x: int) -> float:
+        if self.is_dense:
+            return self.dense[x - self.offset] if 0 <= x - self.offset < len(self.dense) else 0.
+        return self.sparse.get(x, 0.)
+
+    def to_pmf(self) -> PMF:
+        return dict(self.items())
+
+    @property
+    def mean(self) -> float:
+        return mean(self.to_pmf())
+
+
+def as_distribution(pmf: Union[PMF, Distribution]) -> Distribution:
+    return pmf if type(pmf).__name__ == "Distribution" else Distribution(pmf)
+
+
+# Operations on distributions (PMF given as dict or `Distribution`, result as `Distribution`)
+# ----------------------------------------------------------------------------
+def bernoulli(p: float) -> PMF:
+    return {0: 1 - p, 1: p}
+
+
+def mean(pmf: PMF) -> float:
+    return sum(x * p for x, p in pmf.items())
+
+
+def convolve(a: Union[PMF, Distribution], b: Union[PMF, Distribution], epsilon: float = 0.) -> Distribution:
+    """
+    Distribution of the sum of 2 independent variables.
+
+    Discarded mass: 1 - (1 - discarded(a)) * (1 - discarded(b)), plus the probabilities pruned.
+    """
+    a, b = as_distribution(a), as_distribution(b)
+    discarded = a.discarded + b.discarded - a.discarded * b.discarded
+
+    if a.is_dense and b.is_dense:
+        values = [0.] * (len(a) + len(b) - 1) if len(a) and len(b) else []
+        size = len(b)
+        for i, p in enumerate(a.dense):
+            if p > 0:
+                values[i:i + size] = [v + p * q for v, q in zip(values[i:i + size], b.dense)]
+        return Distribution.from_dense(a.offset + b.offset, values, discarded, epsilon)
+
+    result = {}
+    for x, p in a.items():
+        for y, q in b.items():
+            result[x + y] = result.get(x + y, 0.) + p * q
+    return Distribution(result, discarded, epsilon)
+
+
+def power(pmf: Union[PMF, Distribution], n: int, epsilon: float = 0.) -> Distribution:
+    """
+    Distribution of the sum of `n` independent copies of a variable (exponentiation by squaring).
+    """
+    result = Distribution({0: 1.})
+    pmf = as_distribution(pmf)
+    while n > 0:
+        if n % 2:
+            result = convolve(result, pmf, epsilon)
+        n //= 2
+        if n:
+            pmf = convolve(pmf, pmf, epsilon)
+    return result
+
+
+def mixture(weighted: Iterable[Tuple[float, Union[PMF, Distribution]]], epsilon: float = 0.,
+            discarded: float = 0.) -> Distribution:
+    """
+    Distribution of a mixture: list of (<weight>, <PMF>).
+
+    :param discarded: Mass already discarded (e.g. by the weights)
+    """
+    result = {}
+    for weight, pmf in weighted:
+        pmf = as_distribution(pmf)
+        discarded += weight * pmf.discarded
+        for x, p in pmf.items():
+            result[x] = result.get(x, 0.) + weight * p
+    return Distribution(result, discarded, epsilon)
+
+
+def compound(count_pmf: Union[PMF, Distribution], item_pmf: Union[PMF, Distribution],
+             epsilon: float = 0.) -> Distribution:
+    """
+    Distribution of the sum of N independent copies of a variable, N being random (PMF `count_pmf`).
+    """
+    count, item = as_distribution(count_pmf), as_distribution(item_pmf)
+    weighted = []
+    current = Distribution({0: 1.})
+    for n in range(count.max_value + 1):
+        if count.get(n) > 0:
+            weighted.append((count.get(n), current))
+        if n < count.max_value:
+            current = convolve(current, item, epsilon)
+    return mixture(weighted, epsilon, discarded=count.discarded)
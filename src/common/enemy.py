@@ -8,7 +8,7 @@ opponent_datasheets = {
 },
     'sororita': {
     'svg': 3,
-    'svg invul': 6.0,
+    'svg invul': 6,
     'feel no pain': None,
     'toughness': 3,
     'w': 1
@@ -22,30 +22,74 @@ opponent_datasheets = {
 },
     'terminator': {
     'svg': 2,
-    'svg invul': 5.0,
+    'svg invul': 5,
     'feel no pain': None,
     'toughness': 5,
     'w': 3
 },
     'captain_terminator': {
     'svg': 2,
-    'svg invul': 4.0,
+    'svg invul': 4,
     'feel no pain': None,
     'toughness': 5,
     'w': 6
 },
     'monster': {
     'svg': 2,
-    'svg invul': 4.0,
+    'svg invul': 4,
     'feel no pain': None,
     'toughness': 9,
     'w': 10
 },
     'heavy imperial knight': {
     'svg': 3,
-    'svg invul': 5.0,
+    'svg invul': 5,
     'feel no pain': None,
     'toughness': 12,
     'w': 22
 }
 }
+opponent_tables = {
+    'marine': {
+    'save': [3, 4, 5, 6, 7, 7, 7],
+    'failed save': [0.3333333333333333, 0.5, 0.6666666666666666, 0.8333333333333334, 1.0, 1.0, 1.0],
+    'fnp failed': 1.0,
+    'wound threshold': [6, 5, 5, 4, 3, 3, 3, 2]
+},
+    'sororita': {
+    'save': [3, 4, 5, 6, 6, 6, 6],
+    'failed save': [0.3333333333333333, 0.5, 0.6666666666666666, 0.8333333333333334, 0.8333333333333334, 0.8333333333333334, 0.8333333333333334],
+    'fnp failed': 1.0,
+    'wound threshold': [6, 5, 4, 3, 3, 2]
+},
+    'astra militarum': {
+    'save': [5, 6, 7, 7, 7, 7, 7],
+    'failed save': [0.6666666666666666, 0.8333333333333334, 1.0, 1.0, 1.0, 1.0, 1.0],
+    'fnp failed': 1.0,
+    'wound threshold': [6, 5, 4, 3, 3, 2]
+},
+    'terminator': {
+    'save': [2, 3, 4, 5, 5, 5, 5],
+    'failed save': [0.16666666666666666, 0.3333333333333333, 0.5, 0.6666666666666666, 0.6666666666666666, 0.6666666666666666, 0.6666666666666666],
+    'fnp failed': 1.0,
+    'wound threshold': [6, 6, 5, 5, 4, 3, 3, 3, 3, 2]
+},
+    'captain_terminator': {
+    'save': [2, 3, 4, 4, 4, 4, 4],
+    'failed save': [0.16666666666666666, 0.3333333333333333, 0.5, 0.5, 0.5, 0.5, 0.5],
+    'fnp failed': 1.0,
+    'wound threshold': [6, 6, 5, 5, 4, 3, 3, 3, 3, 2]
+},
+    'monster': {
+    'save': [2, 3, 4, 4, 4, 4, 4],
+    'failed save': [0.16666666666666666, 0.3333333333333333, 0.5, 0.5, 0.5, 0.5, 0.5],
+    'fnp failed': 1.0,
+    'wound threshold': [6, 6, 6, 6, 5, 5, 5, 5, 4, 3, 3, 3, 3, 3, 3, 3, 3, 2]
+},
+    'heavy imperial knight': {
+    'save': [3, 4, 5, 5, 5, 5, 5],
+    'failed save': [0.3333333333333333, 0.5, 0.6666666666666666, 0.6666666666666666, 0.6666666666666666, 0.6666666666666666, 0.6666666666666666],
+    'fnp failed': 1.0,
+    'wound threshold': [6, 6, 6, 6, 6, 5, 5, 5, 5, 5, 5, 4, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 2]
+}
+}
@@ -0,0 +1,365 @@
+"""
+Single entry point to evaluate an attack: pick the cheapest engine meeting an accuracy target within a latency budget.
+
+Engines:
+* "average": averages of `launch_workflow` (compiled kernel, see `kernel.py`). Reference of the app, no probability.
+* "approx": cumulants and normal law (see `approx.py`), error given by the Berry-Esseen bound.
+* "exact": exact distribution (see `distribution.py`), no error.
+* "montecarlo": simulation (see `montecarlo.py`), error = half width of the 95% confidence interval.
+
+Cost model: predicted time (s) = overhead + coefficient * work, the work of each engine being estimated from the size
+of the pool, the supports of the dice expressions (A, D, sustain) and the HP of the target (see `estimate_work`).
+Each call records its decision and the time taken in `DECISIONS`: `recalibrate()` fits the cost model on them (e.g.
+after `benchmark()`).
+
+Usage:
+```
+evaluate(weapon, target, rules).mean_dead  # Averages only: "average" engine
+evaluate(weapon, target, rules, min_dead=3, accuracy=0.01, latency=0.1).kill_probability
+# Anytime evaluation: increasingly accurate results
+for result, final in iter_refinements(weapon, target, rules):
+    ...
+```
+"""
+import math
+import sys
+from collections import deque
+from dataclasses import dataclass
+from os.path import dirname, abspath
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.approx import approximate
+from common.dice import average_dice_expression, dice_expression_pmf
+from common.distribution import exact_distribution
+from common.kernel import evaluate as evaluate_kernel
+from common.montecarlo import UniformStream, simulate_trial
+from common.profile import WeaponProfile, TargetProfile, RuleSet
+from common.utils import (ENGINE_ACCURACY, ENGINE_LATENCY, ENGINE_LOG_SIZE, MONTE_CARLO_SEED, REFINE_BATCH_TRIALS,
+                          REFINE_MAX_TRIALS)
+
+ENGINES = ("average", "approx", "exact", "montecarlo")
+
+# Cost model: {<engine>: (overhead in s, s per unit of work)}. Default values measured on a laptop, see `recalibrate`.
+COST_MODEL: Dict[str, Tuple[float, float]] = {"average": (5e-5, 0.),
+                                              "approx": (1e-4, 1e-6),
+                                              "exact": (1e-4, 2e-7),
+                                              "montecarlo": (1e-3, 4e-7)}
+
+# Quantile of the normal law for the 95% confidence interval (Monte Carlo)
+Z_95 = 1.96
+
+# Minimum number of Monte Carlo trials
+MIN_TRIALS = 100
+
+
+@dataclass(frozen=True)
+class EngineResult:
+    """
+    Result of `evaluate`.
+    """
+    engine: str
+    mean_dead: float
+    mean_hp_lost: float
+    # Probability to kill at least `min_dead` enemies (None if not asked)
+    kill_probability: Optional[float]
+    # Estimated error on `kill_probability` (0: exact)
+    error: float
+    # Time taken (s)
+    elapsed: float
+    # Outputs of `launch_workflow` ("average" engine only)
+    enemy_dead: Optional[float] = None
+    remaining_hp: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class Decision:
+    """
+    Decision recorded by `evaluate` (one per call).
+    """
+    engine: str
+    work: float
+    predicted: float
+    elapsed: float
+    error: float
+    # If False, no engine could reach the accuracy within the latency budget (best effort)
+    met: bool
+
+
+# Log of the decisions (bounded)
+DECISIONS: deque = deque(maxlen=ENGINE_LOG_SIZE)
+
+
+def evaluate(weapon: WeaponProfile,
+             target: TargetProfile,
+             rules: RuleSet,
+             min_dead: int = None,
+             accuracy: float = ENGINE_ACCURACY,
+             latency: float = ENGINE_LATENCY,
+             engine: str = None,
+             verbose: bool = False) -> EngineResult:
+    """
+    Evaluate an attack with the cheapest engine meeting `accuracy` within `latency`.
+
+    Without `min_dead` (averages only), the "average" engine is used. Else, the approximation is tried first (cheap,
+    error known once computed), then the cheapest of the exact distribution and Monte Carlo (enough trials to reach
+    `accuracy`) fitting in the remaining budget. If none fits, the most accurate affordable result is returned.
+
+    :param weapon: Attacking unit
+    :param target: Target
+    :param rules: Criticals, re-rolls and weapon abilities
+    :param min_dead: If given, compute the probability to kill at least `min_dead` enemies
+    :param accuracy: Maximal error on the probability
+    :param latency: Time budget (s)
+    :param engine: Force an engine (one of `ENGINES`)
+    :param verbose: If True, print the decision
+
+    :return: `EngineResult`
+    """
+    if engine is not None and engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine}, expected one of {ENGINES}")
+    if engine is None and min_dead is None:
+        engine = "average"
+
+    start = perf_counter()
+    if engine is not None:
+        nb_trials = _nb_trials(accuracy)
+        result = _run(engine, weapon, target, rules, min_dead, nb_trials)
+        met = result.error <= accuracy
+    else:
+        result, met, nb_trials = _dispatch(weapon, target, rules, min_dead, accuracy, latency, start)
+
+    elapsed = perf_counter() - start
+    result = EngineResult(**{**result.__dict__, "elapsed": elapsed})
+
+    work = estimate_work(result.engine, weapon, target, rules, nb_trials)
+    DECISIONS.append(Decision(engine=result.engine, work=work, predicted=predict_time(result.engine, work),
+                              elapsed=elapsed, error=result.error, met=met))
+    if verbose:
+        print(f"[DEBUG] engine: {result.engine} (work: {work:.0f}, predicted: {DECISIONS[-1].predicted:.2e}s, "
+              f"elapsed: {elapsed:.2e}s, error: {result.error:.2e}, accuracy met: {met})")
+    return result
+
+
+def _dispatch(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet, min_dead: int, accuracy: float,
+              latency: float, start: float) -> Tuple[EngineResult, bool, int]:
+    """
+    Choose and run the engines (see `evaluate`).
+
+    :return: Tuple (result, accuracy met, number of Monte Carlo trials)
+    """
+    # 1/ Approximation: O(1)
+    # ------------------------------------------------------------------------------
+    approx = _run("approx", weapon, target, rules, min_dead)
+    if approx.error <= accuracy:
+        return approx, True, 0
+
+    # 2/ Cheapest engine meeting the accuracy, if it fits in the remaining budget
+    # ------------------------------------------------------------------------------
+    remaining = latency - (perf_counter() - start)
+    nb_trials = _nb_trials(accuracy)
+    candidates = sorted((predict_time(e, estimate_work(e, weapon, target, rules, nb_trials)), e)
+                        for e in ("exact", "montecarlo"))
+    predicted, engine = candidates[0]
+    if predicted <= remaining:
+        return _run(engine, weapon, target, rules, min_dead, nb_trials), True, nb_trials
+
+    # 3/ Best effort: as many Monte Carlo trials as the budget allows, if more accurate than the approximation
+    # ------------------------------------------------------------------------------
+    overhead, per_work = COST_MODEL["montecarlo"]
+    per_trial = per_work * estimate_work("montecarlo", weapon, target, rules, 1)
+    nb_trials = max(MIN_TRIALS, int((remaining - overhead) / per_trial)) if per_trial > 0 else MIN_TRIALS
+    if Z_95 / (2 * math.sqrt(nb_trials)) < approx.error:
+        return _run("montecarlo", weapon, target, rules, min_dead, nb_trials), False, nb_trials
+    return approx, False, 0
+
+
+def _run(engine: str, weapon: WeaponProfile, target: TargetProfile, rules: RuleSet, min_dead: Optional[int],
+         nb_trials: int = None) -> EngineResult:
+    """
+    Run one engine (`elapsed` is filled by `evaluate`).
+    """
+    if engine == "average":
+        enemy_dead, remaining_hp = evaluate_kernel(weapon, target, rules)
+        return EngineResult(engine=engine,
+                            mean_dead=enemy_dead + (target.enemy_hp - remaining_hp) / target.enemy_hp,
+                            mean_hp_lost=enemy_dead * target.enemy_hp + target.enemy_hp - remaining_hp,
+                            kill_probability=None, error=0., elapsed=0.,
+                            enemy_dead=enemy_dead, remaining_hp=remaining_hp)
+
+    if engine == "montecarlo":
+        return _simulate(weapon, target, rules, min_dead, nb_trials)
+
+    if engine == "approx":
+        result = approximate(weapon, target, rules, min_attacks=0)
+    else:
+        result = exact_distribution(weapon, target, rules)
+    return EngineResult(engine=engine, mean_dead=result.mean_dead, mean_hp_lost=result.mean_hp_lost,
+                        kill_probability=None if min_dead is None else result.kill_probability(min_dead),
+                        error=result.error, elapsed=0.)
+
+
+def _simulate(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet, min_dead: Optional[int],
+              nb_trials: int) -> EngineResult:
+    """
+    Monte Carlo engine (the same uniforms for each call, see `solver.kill_probability`).
+    """
+    total_dead = total_hp_lost = success = 0
+    for k in range(nb_trials):
+        enemy_dead, hp_lost = simulate_trial(weapon, target, rules, UniformStream(f"{MONTE_CARLO_SEED}-{k}"))
+        total_dead += enemy_dead
+        total_hp_lost += hp_lost
+        success += min_dead is not None and enemy_dead >= min_dead
+
+    if min_dead is None:
+        probability, error = None, 0.
+    else:
+        probability = success / nb_trials
+        # Half width of the 95% confidence interval (worst case p = 1/2)
+        error = Z_95 / (2 * math.sqrt(nb_trials))
+    return EngineResult(engine="montecarlo", mean_dead=total_dead / nb_trials, mean_hp_lost=total_hp_lost / nb_trials,
+                        kill_probability=probability, error=error, elapsed=0.)
+
+
+def iter_refinements(weapon: WeaponProfile,
+                     target: TargetProfile,
+                     rules: RuleSet,
+                     exact_budget: float = ENGINE_LATENCY,
+                     batch_trials: int = REFINE_BATCH_TRIALS,
+                     max_trials: int = REFINE_MAX_TRIALS,
+                     accuracy: float = ENGINE_ACCURACY) -> Iterator[Tuple[EngineResult, bool]]:
+    """
+    Anytime evaluation: yield increasingly accurate results, to display the first ones while the next are computed.
+
+    If the exact distribution is predicted under `exact_budget`, it is the only result. Else, Monte Carlo batches of
+    `batch_trials` trials (same uniforms as `evaluate`): each result is the running mean of all the trials so far.
+    It stops after `max_trials` trials, or when the half width of the 95% confidence interval of the HP lost (in
+    figurines) is below `accuracy`.
+
+    :return: Iterator over (result, final). `error`: half width of the confidence interval of `mean_hp_lost` / HP.
+    """
+    if predict_time("exact", estimate_work("exact", weapon, target, rules)) <= exact_budget:
+        yield evaluate(weapon, target, rules, engine="exact"), True
+        return
+
+    total_dead = total_hp_lost = total_squares = 0.
+    nb_trials = 0
+    while True:
+        start = perf_counter()
+        # The last batch is cut at `max_trials`
+        first, nb_trials = nb_trials, min(nb_trials + batch_trials, max_trials)
+        for k in range(first, nb_trials):
+            enemy_dead, hp_lost = simulate_trial(weapon, target, rules, UniformStream(f"{MONTE_CARLO_SEED}-{k}"))
+            total_dead += enemy_dead
+            total_hp_lost += hp_lost / target.enemy_hp
+            total_squares += (hp_lost / target.enemy_hp) ** 2
+
+        mean_hp_lost = total_hp_lost / nb_trials
+        variance = max(total_squares / nb_trials - mean_hp_lost ** 2, 0.) * nb_trials / (nb_trials - 1)
+        error = Z_95 * math.sqrt(variance / nb_trials)
+        final = nb_trials >= max_trials or error < accuracy
+        yield EngineResult(engine="montecarlo", mean_dead=total_dead / nb_trials,
+                           mean_hp_lost=mean_hp_lost * target.enemy_hp, kill_probability=None, error=error,
+                           elapsed=perf_counter() - start), final
+        if final:
+            return
+
+
+# Cost model
+# ----------------------------------------------------------------------------
+def estimate_work(engine: str, weapon: WeaponProfile, target: TargetProfile, rules: RuleSet,
+                  nb_trials: int = None) -> float:
+    """
+    Estimate the work of an engine (number of elementary operations, up to a constant).
+
+    * "average": constant,
+    * "approx": allocation over the HP of the target (+ supports of A and sustain),
+    * "exact": allocation DP: (max number of events)^2 / 2 * HP * (support of the damage),
+    * "montecarlo": trials * dice rolled per trial.
+
+    :param nb_trials: Number of Monte Carlo trials
+    """
+    if engine == "average":
+        return 1.
+
+    support_a = len(dice_expression_pmf(weapon.weapon_a))
+    support_d = len(dice_expression_pmf(weapon.weapon_d)) + (target.fnp_enemy < 7)
+    support_sustain = len(dice_expression_pmf(rules.sustain_hit))
+    if engine == "approx":
+        return support_a + support_sustain + target.enemy_hp * support_d
+    if engine == "exact":
+        max_events = weapon.nb_figs * max(dice_expression_pmf(weapon.weapon_a)) * \
+            (1 + max(dice_expression_pmf(rules.sustain_hit)))
+        return max_events ** 2 / 2 * target.enemy_hp * support_d
+    if engine == "montecarlo":
+        nb_attack = weapon.nb_figs * average_dice_expression(weapon.weapon_a)
+        dice_per_attack = 3 + average_dice_expression(rules.sustain_hit) + \
+            average_dice_expression(weapon.weapon_d) * (target.fnp_enemy < 7)
+        return nb_trials * (1 + nb_attack * dice_per_attack)
+    raise ValueError(f"Unknown engine: {engine}, expected one of {ENGINES}")
+
+
+def predict_time(engine: str, work: float) -> float:
+    """
+    Predicted time (s) of an engine for a given work.
+    """
+    overhead, per_work = COST_MODEL[engine]
+    return overhead + per_work * work
+
+
+def recalibrate(decisions: Iterable[Decision] = None) -> Dict[str, Tuple[float, float]]:
+    """
+    Fit the cost model (least squares, per engine) on recorded decisions, and update `COST_MODEL`.
+
+    :param decisions: Decisions to fit on (default: `DECISIONS`)
+    :return: The updated `COST_MODEL`
+    """
+    by_engine: Dict[str, List[Tuple[float, float]]] = {}
+    for d in DECISIONS if decisions is None else decisions:
+        by_engine.setdefault(d.engine, []).append((d.work, d.elapsed))
+
+    for engine, points in by_engine.items():
+        n = len(points)
+        mean_work = sum(w for w, _ in points) / n
+        mean_time = sum(t for _, t in points) / n
+        var_work = sum((w - mean_work) ** 2 for w, _ in points)
+        if var_work > 0:
+            per_work = max(sum((w - mean_work) * (t - mean_time) for w, t in points) / var_work, 0.)
+            overhead = max(mean_time - per_work * mean_work, 0.)
+        else:
+            # Single amount of work: keep the coefficient, fit the overhead
+            per_work = COST_MODEL[engine][1]
+            overhead = max(mean_time - per_work * mean_work, 0.)
+        COST_MODEL[engine] = (overhead, per_work)
+    return COST_MODEL
+
+
+def benchmark(profiles: Sequence[Tuple[WeaponProfile, TargetProfile, RuleSet]], min_dead: int = 1,
+              accuracy: float = ENGINE_ACCURACY) -> List[Decision]:
+    """
+    Run every engine on `profiles` (decisions recorded in `DECISIONS`), to recalibrate the cost model.
+
+    :return: Decisions of the benchmark
+    """
+    decisions = []
+    for weapon, target, rules in profiles:
+        for engine in ENGINES:
+            evaluate(weapon, target, rules, min_dead=min_dead, accuracy=accuracy, engine=engine)
+            decisions.append(DECISIONS[-1])
+    return decisions
+
+
+def _nb_trials(accuracy: float) -> int:
+    """
+    Number of Monte Carlo trials for a 95% confidence interval of half width `accuracy` (worst case p = 1/2).
+    """
+    return max(MIN_TRIALS, math.ceil((Z_95 / (2 * accuracy)) ** 2)) if accuracy > 0 else MIN_TRIALS
@@ -0,0 +1,260 @@
+"""
+Differential fuzzing: random valid inputs (all the flags, thresholds, criticals and dice expressions) are evaluated by
+an analytic engine and by a reference, and the cases where they disagree are reported, shrunk to minimal reproducers.
+
+References:
+* "montecarlo": simulation (`montecarlo.simulate`, `FUZZ_TRIALS` trials, draws seeded by the seed of the run and the
+index of the case: another seed is an independent check). A discrepancy is a difference
+of the mean HP lost above `FUZZ_Z_THRESHOLD` standard errors (statistically significant),
+* "workflow": `launch_workflow` (reference implementation of the averages), up to rounding errors.
+
+Analytic engines: "exact" (exact distribution, same dice model as the simulation: no discrepancy expected), "average"
+(`launch_workflow` kernels: expected to differ from the simulation, as damage is allocated on averages, but not from
+"workflow"), or any function `f(weapon, target, rules) -> mean HP lost` (picklable, to be run in processes).
+
+Cases are spread over a process pool. Each case is generated from (seed, index): a run is reproducible.
+
+Usage: On a terminal (before merging an optimization):
+```
+python fuzz.py --cases 2000 --analytic exact --reference montecarlo
+python fuzz.py --cases 20000 --analytic average --reference workflow
+```
+"""
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from os.path import dirname, abspath
+from typing import Callable, List, Optional, Tuple, Union
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.dice import DiceExpression
+from common.engine import evaluate
+from common.kernel import FLAGS
+from common.montecarlo import simulate
+from common.profile import WeaponProfile, TargetProfile, RuleSet
+from common.workflow import launch_workflow_profiles
+from common.utils import FUZZ_CASES, FUZZ_TRIALS, FUZZ_Z_THRESHOLD, FUZZ_SEED
+
+Case = Tuple[WeaponProfile, TargetProfile, RuleSet]
+Analytic = Union[str, Callable[[WeaponProfile, TargetProfile, RuleSet], float]]
+
+ANALYTIC_ENGINES = ("exact", "average")
+REFERENCES = ("montecarlo", "workflow")
+# Differences below this are rounding errors
+ABS_TOLERANCE = 1e-9
+
+# Values drawn by `random_case`
+DICE_EXPRESSIONS = (1, 2, 3, "D3", "D6", "D3+1", "2D3", "D6+1")
+SUSTAIN_HITS = (0, 0, 1, 2, "D3")
+
+
+@dataclass(frozen=True)
+class Discrepancy:
+    weapon: WeaponProfile
+    target: TargetProfile
+    rules: RuleSet
+    # Mean HP lost of the analytic engine and of the reference
+    analytic: float
+    reference: float
+    # Maximal difference accepted
+    tolerance: float
+    # Index of the case in the run and seed of the run (see `random_case`)
+    index: int
+    seed: int = FUZZ_SEED
+
+    def reproducer(self) -> str:
+        """
+        Python arguments reproducing the case, e.g. `evaluate(<reproducer>)`.
+        """
+        return f"{self.weapon!r}, {self.target!r}, {self.rules!r}"
+
+
+def random_case(rng: random.Random) -> Case:
+    """
+    Draw valid profiles (small pools, so that the exact engine stays fast).
+    """
+    weapon = WeaponProfile(nb_figs=rng.randint(1, 4),
+                           weapon_a=rng.choice(DICE_EXPRESSIONS[:6]),
+                           hit_threshold=rng.randint(2, 6),
+                           weapon_s=rng.randint(1, 14),
+                           weapon_ap=rng.randint(0, 4),
+                           weapon_d=rng.choice(DICE_EXPRESSIONS))
+    target = TargetProfile(enemy_toughness=rng.randint(1, 12),
+                           svg_enemy=rng.randint(2, 7),
+                           svg_invul_enemy=rng.choice([3, 4, 5, 6, 7, 7]),
+                           fnp_enemy=rng.choice([4, 5, 6, 7, 7, 7]),
+                           enemy_hp=rng.randint(1, 6))
+    rules = RuleSet(crit=rng.choice([4, 5, 6, 6]),
+                    crit_wounds=rng.choice([4, 5, 6, 6]),
+                    bonus_wound=rng.choice([-1, 0, 0, 1]),
+                    sustain_hit=rng.choice(SUSTAIN_HITS),
+                    **{flag: rng.random() < 0.35 for flag in FLAGS})
+    return weapon, target, rules
+
+
+def check_case(case: Case, analytic: Analytic = "exact", reference: str = "montecarlo", nb_trials: int = FUZZ_TRIALS,
+               z_threshold: float = FUZZ_Z_THRESHOLD, index: int = -1, seed: int = FUZZ_SEED) -> Optional[Discrepancy]:
+    """
+    Evaluate one case with `analytic` and `reference` (see module docstring).
+
+    :param index: Index of the case in the run
+    :param seed: Seed of the run (with `index`: seed of the Monte Carlo draws)
+
+    :return: `Discrepancy`, or None if they agree
+    """
+    weapon, target, rules = case
+    value = analytic(*case) if callable(analytic) else evaluate(*case, engine=analytic).mean_hp_lost
+    if reference == "montecarlo":
+        result = simulate(weapon, target, rules, nb_trials=nb_trials, seed=f"{seed}-{index}")
+        expected, tolerance = result.mean_hp_lost, z_threshold * result.std_error + ABS_TOLERANCE
+    elif reference == "workflow":
+        enemy_dead, remaining_hp = launch_workflow_profiles(*case)
+        expected = enemy_dead * target.enemy_hp + target.enemy_hp - remaining_hp
+        tolerance = ABS_TOLERANCE * max(1., abs(expected))
+    else:
+        raise ValueError(f"Unknown reference '{reference}', expected one of {REFERENCES}")
+
+    if abs(value - expected) <= tolerance:
+        return None
+    return Discrepancy(weapon, target, rules, analytic=value, reference=expected, tolerance=tolerance, index=index,
+                       seed=seed)
+
+
+def fuzz(nb_cases: int = FUZZ_CASES,
+         analytic: Analytic = "exact",
+         reference: str = "montecarlo",
+         nb_trials: int = FUZZ_TRIALS,
+         z_threshold: float = FUZZ_Z_THRESHOLD,
+         seed: int = FUZZ_SEED,
+         processes: Optional[int] = None,
+         shrink: bool = True,
+         verbose: bool = False) -> List[Discrepancy]:
+    """
+    Check `nb_cases` random cases (see module docstring).
+
+    :param processes: Number of processes (None: number of CPUs, 1: no pool)
+    :param shrink: If True, shrink each discrepancy to a minimal reproducer (see `shrink_case`)
+
+    :return: Discrepancies (shrunk), in the order of the cases
+    """
+    if not callable(analytic) and analytic not in ANALYTIC_ENGINES:
+        raise ValueError(f"Unknown analytic engine '{analytic}', expected one of {ANALYTIC_ENGINES} or a function")
+    check = partial(_check_index, seed=seed, analytic=analytic, reference=reference, nb_trials=nb_trials,
+                    z_threshold=z_threshold)
+    processes = processes or os.cpu_count()
+    if processes == 1:
+        found = [d for d in map(check, range(nb_cases)) if d is not None]
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            found = [d for d in pool.map(check, range(nb_cases), chunksize=max(1, nb_cases // (4 * processes)))
+                     if d is not None]
+    if verbose: print(f"[DEBUG] {len(found)} discrepancies in {nb_cases} cases")
+
+    if not shrink:
+        return found
+    shrunk = []
+    for discrepancy in found:
+        case = shrink_case((discrepancy.weapon, discrepancy.target, discrepancy.rules),
+                           partial(check_case, analytic=analytic, reference=reference, nb_trials=nb_trials,
+                                   z_threshold=z_threshold, index=discrepancy.index, seed=seed))
+        shrunk.append(check_case(case, analytic, reference, nb_trials, z_threshold, discrepancy.index, seed))
+        if verbose: print(f"[DEBUG] Case {discrepancy.index} shrunk to: {shrunk[-1].reproducer()}")
+    return shrunk
+
+
+def shrink_case(case: Case, check: Callable[[Case], Optional[Discrepancy]], max_steps: int = 1000) -> Case:
+    """
+    Greedy shrinking: simplify one field at a time (flag disabled, default value, smaller number or dice expression)
+    as long as `check` still finds a discrepancy.
+
+    :return: Case where no single simplification keeps the discrepancy
+    """
+    for _ in range(max_steps):
+        for candidate in _simplifications(case):
+            if check(candidate) is not None:
+                case = candidate
+                break
+        else:
+            return case
+    return case
+
+
+# Utils
+# ----------------------------------------------------------------------------
+def _check_index(index: int, seed: int, **kwargs) -> Optional[Discrepancy]:
+    """
+    Check the case `index` of the run `seed` (in a worker process).
+    """
+    return check_case(random_case(random.Random(f"{seed}-{index}")), index=index, seed=seed, **kwargs)
+
+
+def _simplifications(case: Case):
+    """
+    Cases one step simpler than `case` (one field changed each).
+    """
+    for position, profile in enumerate(case):
+        default = type(profile)()
+        for name in profile._FIELDS:
+            value = getattr(profile, name)
+            for simpler in _simpler_values(value, getattr(default, name)):
+                try:
+                    candidate = profile.replace(**{name: simpler})
+                except ValueError:
+                    continue
+                if candidate != profile:
+                    yield case[:position] + (candidate,) + case[position + 1:]
+
+
+def _simpler_values(value, default) -> list:
+    """
+    Values one step closer to `default` (each step strictly decreases the distance to the default: no cycle).
+    Distance of a dice expression: (number of dice, distance of the bonus).
+    """
+    if isinstance(value, bool):
+        return [False] if value else []
+    values = [default] if value != default else []
+    if isinstance(value, DiceExpression):
+        if value.nb_dice > 1:
+            values.append(_format_expression(value.nb_dice - 1, value.dice_face, value.bonus))
+        if value.nb_dice:
+            values.append(value.bonus)
+        elif value.bonus != default.bonus:
+            values.append(value.bonus + (1 if value.bonus < default.bonus else -1))
+    elif value != default:
+        values.append(value + (1 if value < default else -1))
+    return values
+
+
+def _format_expression(nb_dice: int, dice_face: int, bonus: int) -> str:
+    return f"{nb_dice if nb_dice > 1 else ''}D{dice_face}{f'+{bonus}' if bonus else ''}"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Differential fuzzing of the analytic engines")
+    parser.add_argument("--cases", type=int, default=FUZZ_CASES)
+    parser.add_argument("--analytic", default="exact", choices=ANALYTIC_ENGINES)
+    parser.add_argument("--reference", default="montecarlo", choices=REFERENCES)
+    parser.add_argument("--trials", type=int, default=FUZZ_TRIALS)
+    parser.add_argument("--seed", type=int, default=FUZZ_SEED)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    discrepancies = fuzz(args.cases, args.analytic, args.reference, args.trials, seed=args.seed,
+                         processes=args.processes, verbose=True)
+    for d in discrepancies:
+        print(f"Case {d.index}: {args.analytic} = {d.analytic:.4f}, {args.reference} = {d.reference:.4f} "
+              f"(tolerance {d.tolerance:.4f})\n    {d.reproducer()}")
+    sys.exit(1 if discrepancies else 0)
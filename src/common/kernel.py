@@ -0,0 +1,225 @@
+"""
+Specialized kernels of `launch_workflow`, one per combination of rule flags.
+
+`launch_workflow` checks a long chain of flags (torrent, re-rolls, fish, lethal, devastating wounds, verbose...) at
+each call. Here, the source of a straight-line function (no branch on flags) is generated for each combination of
+flags, compiled once with `compile()` and cached.
+
+The generated source only contains arithmetic: the same code object is evaluated on floats (one row) or on NumPy
+arrays (a whole group of rows sharing the same flags, if NumPy is installed).
+
+Usage:
+```
+evaluate(weapon, target, rules)  # same result as `launch_workflow_profiles`
+evaluate_batch([(weapon, target, rules), ...])  # rows grouped by flags, one kernel call per group if NumPy
+```
+"""
+import sys
+from os.path import dirname, abspath
+from typing import Dict, List, Sequence, Tuple
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.dice import proba_dice, proba_rr_ones, proba_rr_all, proba_crit
+from common.profile import WeaponProfile, TargetProfile, RuleSet
+from common.target_table import target_table
+from common.workflow import allocate_damage
+
+# NumPy is optional (not shipped in the app): without it, groups are evaluated row by row
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Minimal size of a group to use the NumPy kernel (below, the overhead of arrays is not worth it)
+VECTORIZE_MIN_ROWS = 32
+
+# Flags defining a kernel (attributes of `RuleSet`, already normalized)
+FLAGS = ("torrent", "rr_hit_ones", "rr_hit_all", "fish_hit", "lethal_hit", "rr_wounds_ones", "twin", "fish_wound",
+         "devastating_wounds")
+
+# Numerical arguments of a kernel (see `kernel_arguments`)
+ARGUMENTS = ("nb_figs", "weapon_a", "hit_threshold", "weapon_d", "crit", "crit_wounds", "bonus_wound", "sustain_hit",
+             "wound_threshold", "proba_failed_save", "proba_fnp_failed", "enemy_hp")
+
+# Cache of the kernels: {(flags, vectorized): function}
+_KERNELS: Dict[Tuple[Tuple[bool, ...], bool], callable] = {}
+
+
+def flags_key(rules: RuleSet) -> Tuple[bool, ...]:
+    """
+    Get the combination of flags of `rules` (key of the kernel cache).
+    """
+    return tuple(getattr(rules, flag) for flag in FLAGS)
+
+
+def kernel_arguments(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet) -> tuple:
+    """
+    Numerical arguments of a kernel, in the order of `ARGUMENTS` (dice expressions replaced by their average, wound
+    threshold, save and FNP looked up in the table of the target, see `target_table.py`).
+    """
+    table = target_table(target)
+    return (weapon.nb_figs, weapon.average_a, weapon.hit_threshold, weapon.average_d, rules.crit, rules.crit_wounds,
+            rules.bonus_wound, rules.average_sustain_hit, table.wound(weapon.weapon_s),
+            table.failed_save(weapon.weapon_ap), table.proba_fnp_failed, target.enemy_hp)
+
+
+def generate_source(flags: Tuple[bool, ...]) -> str:
+    """
+    Generate the source of the kernel specialized for `flags` (see `FLAGS`). Follows step by step
+    `workflow._launch_workflow`, with the branches on flags resolved at generation time.
+
+    :param flags: Combination of flags (see `flags_key`)
+    :return: Source code defining a function `kernel(<ARGUMENTS>)` returning (enemy_dead, remaining_hp)
+    """
+    f = dict(zip(FLAGS, flags))
+    fish_hit = f["rr_hit_all"] and f["fish_hit"]
+    fish_wound_effective = f["twin"] and f["fish_wound"] and f["devastating_wounds"]
+
+    lines = [f"def kernel({', '.join(ARGUMENTS)}):",
+             # 0.2/ Init: thresholds (wound threshold and saves of the target: from its table)
+             "    wounds_threshold = _min(crit_wounds, wound_threshold - bonus_wound)",
+             "    hit_threshold = _min(crit, hit_threshold)",
+             # 1/ Number of attacks
+             "    nb_attack = weapon_a * nb_figs"]
+
+    # 2/ Hits
+    if f["torrent"]:
+        lines.append("    proba_hit = 1")
+    elif f["rr_hit_ones"]:
+        lines.append("    proba_hit = proba_rr_ones(hit_threshold)")
+    elif f["rr_hit_all"] and not f["fish_hit"]:
+        lines.append("    proba_hit = proba_rr_all(hit_threshold)")
+    else:
+        lines.append("    proba_hit = proba_dice(hit_threshold)")
+
+    lines.append("    nb_crit = proba_crit(crit) * nb_attack")
+    if fish_hit:
+        lines += ["    nb_crit = nb_crit + proba_crit(crit) * (nb_attack - nb_crit)",
+                  "    average_hit = proba_dice(hit_threshold) * (nb_attack - nb_crit)"]
+    else:
+        lines.append("    average_hit = proba_hit * nb_attack")
+    lines.append("    average_hit = average_hit + sustain_hit * nb_crit")
+
+    if f["lethal_hit"]:
+        lines.append("    nb_lethal_hits = nb_crit")
+        if not f["fish_hit"]:
+            lines.append("    average_hit = average_hit - nb_lethal_hits")
+
+    # 3/ Wounds
+    if f["rr_wounds_ones"]:
+        lines.append("    proba_w = proba_rr_ones(wounds_threshold)")
+    elif f["twin"] and not f["fish_wound"]:
+        lines.append("    proba_w = proba_rr_all(wounds_threshold)")
+    else:
+        lines.append("    proba_w = proba_dice(wounds_threshold)")
+
+    lines.append("    nb_crit = proba_crit(crit_wounds) * average_hit")
+    lethal = "nb_lethal_hits + " if f["lethal_hit"] else ""
+    if fish_wound_effective:
+        lines += ["    nb_crit = nb_crit + proba_crit(crit_wounds) * (average_hit - nb_crit)",
+                  f"    average_wounds = {lethal}(average_hit - nb_crit) * proba_w"]
+    else:
+        lines.append(f"    average_wounds = {lethal}average_hit * proba_w")
+
+    if f["devastating_wounds"] and not f["fish_wound"]:
+        lines.append("    average_wounds = average_wounds - nb_crit")
+
+    # 4/ Saves
+    deva = " + nb_crit" if f["devastating_wounds"] else ""
+    lines.append(f"    failed_svg = average_wounds * proba_failed_save{deva}")
+
+    # 5/ Feel no pain and deads
+    lines += ["    return _allocate(failed_svg, weapon_d * proba_fnp_failed, proba_fnp_failed, enemy_hp)",
+              ""]
+    return "\n".join(lines)
+
+
+def get_kernel(flags: Tuple[bool, ...], vectorized: bool = False) -> callable:
+    """
+    Get the kernel specialized for `flags` (generated and compiled at the first call, then cached).
+
+    :param flags: Combination of flags (see `flags_key`)
+    :param vectorized: If True, get the kernel evaluated on NumPy arrays (one value per row)
+    :return: Function `kernel(<ARGUMENTS>)` returning (enemy_dead, remaining_hp)
+    """
+    key = (flags, vectorized)
+    if key not in _KERNELS:
+        code = compile(generate_source(flags), f"<kernel {flags}>", "exec")
+        namespace = {"proba_dice": proba_dice, "proba_rr_ones": proba_rr_ones, "proba_rr_all": proba_rr_all,
+                     "proba_crit": proba_crit}
+        if vectorized:
+            namespace.update(_min=np.minimum, _allocate=_allocate_array)
+        else:
+            namespace.update(_min=min, _allocate=allocate_damage)
+        exec(code, namespace)
+        _KERNELS[key] = namespace["kernel"]
+    return _KERNELS[key]
+
+
+def evaluate(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet) -> Tuple[float, float]:
+    """
+    Same as `launch_workflow_profiles` (without verbose), using the kernel specialized for `rules`.
+
+    :return: Tuple (enemy_dead, remaining_hp)
+    """
+    return get_kernel(flags_key(rules))(*kernel_arguments(weapon, target, rules))
+
+
+def evaluate_batch(rows: Sequence[Tuple[WeaponProfile, TargetProfile, RuleSet]]) -> List[Tuple[float, float]]:
+    """
+    Evaluate many (weapon, target, rules) at once. Rows are grouped by flags: each group is evaluated by a single call
+    of its vectorized kernel (if NumPy is installed and the group is large enough), else row by row.
+
+    :param rows: Sequence of (weapon, target, rules)
+    :return: List of (enemy_dead, remaining_hp), in the order of `rows`
+    """
+    groups: Dict[Tuple[bool, ...], List[int]] = {}
+    for index, (_, _, rules) in enumerate(rows):
+        groups.setdefault(flags_key(rules), []).append(index)
+
+    results = [None] * len(rows)
+    for flags, indices in groups.items():
+        if np is not None and len(indices) >= VECTORIZE_MIN_ROWS:
+            columns = zip(*[kernel_arguments(*rows[i]) for i in indices])
+            enemy_dead, remaining_hp = get_kernel(flags, vectorized=True)(*[np.array(c, dtype=float) for c in columns])
+            for i, dead, hp in zip(indices, enemy_dead.tolist(), remaining_hp.tolist()):
+                results[i] = (int(dead), hp)
+        else:
+            kernel = get_kernel(flags)
+            for i in indices:
+                results[i] = kernel(*kernel_arguments(*rows[i]))
+
+    return results
+
+
+# Vectorized helpers (NumPy)
+# ----------------------------------------------------------------------------
+def _allocate_array(failed_svg, damage, proba_fnp_failed, enemy_hp):
+    """
+    Vectorized `allocate_damage`: as damage is the same for each failed save, the loop is replaced by a closed form
+    (`ceil(enemy_hp / damage)` failed saves to kill one figurine).
+    """
+    failed_saved_int = np.floor(failed_svg)
+    remaining_failed_saves = failed_svg - failed_saved_int
+
+    with np.errstate(divide="ignore"):
+        per_kill = np.where(damage > 0, np.maximum(np.ceil(enemy_hp / np.where(damage > 0, damage, 1)), 1), np.inf)
+    killing = np.isfinite(per_kill)
+    enemy_dead = np.where(killing, np.floor_divide(failed_saved_int, np.where(killing, per_kill, 1)), 0)
+    # Failed saves applied on the last (non dead) figurine
+    last = failed_saved_int - enemy_dead * np.where(killing, per_kill, 0)
+
+    remaining_hp = enemy_hp - last * damage - remaining_failed_saves * proba_fnp_failed
+
+    overkill = remaining_hp < 0
+    remaining_hp = np.where(overkill, 0, remaining_hp)
+    enemy_dead = enemy_dead + overkill
+    return enemy_dead, remaining_hp
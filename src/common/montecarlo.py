@@ -0,0 +1,316 @@
+"""
+Monte Carlo evaluation of an attack: every dice of the workflow (attacks, hits, wounds, saves, damage, feel no pain)
+is rolled, die by die, and damage is allocated figurine by figurine.
+
+Contrary to `launch_workflow` (averages only), a simulation gives the spread of the results (standard error, ...).
+
+Variance reduction:
+* Common random numbers (CRN, `compare`): the profiles compared consume the same underlying uniforms. Their
+differences are then much less noisy than with independent streams.
+* Antithetic variates (`antithetic=True`): each trial is paired with a mirrored trial, using `1 - u` instead of `u`
+(i.e. a 6 becomes a 1 and vice versa).
+
+The achieved variance reduction factor (variance with independent streams / variance with the technique) is reported in
+the results.
+
+Dice rules (per die):
+* Hit: critical if dice >= `crit`. Re-roll the ones (`rr_hit_ones`), the failed hits (`rr_hit_all`) or every non
+critical (`fish_hit`). Torrent weapons hit automatically (no hit dice, so no critical hit).
+* A critical hit gives `sustain_hit` additional hits and, if `lethal_hit`, is automatically wounded.
+* Wound: critical if dice >= `crit_wounds`. Re-roll the ones (`rr_wounds_ones`), the failed wounds (`twin`) or every
+non critical (`fish_wound`, with `devastating_wounds` only). A critical wound with `devastating_wounds` ignores saves.
+* Save: failed if dice < best of (save + AP, invulnerable save). Feel no pain: one dice per point of damage.
+"""
+import math
+import random
+import sys
+from dataclasses import dataclass, field
+from os.path import dirname, abspath
+from typing import Callable, List, Sequence, Tuple
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.dice import DiceExpression, get_wound_threshold
+from common.profile import WeaponProfile, TargetProfile, RuleSet
+from common.utils import MONTE_CARLO_TRIALS, MONTE_CARLO_SEED
+
+
+class UniformStream:
+    """
+    Source of uniform numbers in [0, 1), reproducible from a seed.
+
+    All draws are recorded: `mirror()` gives the antithetic stream, replaying the same draws as `1 - u` (then
+    continuing with fresh draws if the mirrored trial needs more numbers).
+    """
+    # Largest float < 1 (keep the mirrored draws in [0, 1))
+    _ALMOST_ONE = 1 - 2 ** -53
+
+    def __init__(self, seed, replay: List[float] = None):
+        """
+        :param seed: Seed of the stream (int or str)
+        :param replay: Draws to mirror (internal, see `mirror`)
+        """
+        self._random = random.Random(seed)
+        self._replay = replay
+        self._draws = []
+
+    def __call__(self) -> float:
+        if self._replay is not None and len(self._draws) < len(self._replay):
+            u = min(1 - self._replay[len(self._draws)], self._ALMOST_ONE)
+        else:
+            u = self._random.random()
+        self._draws.append(u)
+        return u
+
+    def mirror(self, seed) -> "UniformStream":
+        """
+        Antithetic stream of this one (to call once the trial is over).
+
+        :param seed: Seed of the fresh draws, once all the draws are mirrored
+        """
+        return UniformStream(seed, replay=self._draws)
+
+
+@dataclass
+class MonteCarloResult:
+    """
+    Result of a simulation (see `simulate`). Statistics are computed on the HP lost by the enemy.
+    """
+    mean_dead: float
+    mean_hp_lost: float
+    # Standard error of `mean_hp_lost`
+    std_error: float
+    nb_trials: int
+    # Variance with independent draws / variance achieved (1 if no variance reduction)
+    variance_reduction: float = 1.
+
+
+@dataclass
+class ComparisonResult:
+    """
+    Result of a comparison of profiles (see `compare`). Differences are computed versus the first profile (reference),
+    on the HP lost by the enemy.
+    """
+    results: List[MonteCarloResult]
+    # mean_hp_lost[i] - mean_hp_lost[0] (0 for the reference)
+    differences: List[float] = field(default_factory=list)
+    # Standard error of each difference
+    std_errors: List[float] = field(default_factory=list)
+    # Variance of the difference with independent streams / variance achieved, per profile
+    variance_reductions: List[float] = field(default_factory=list)
+
+
+# Dice
+# ----------------------------------------------------------------------------
+def roll(u: Callable[[], float], faces: int = 6) -> int:
+    """
+    Roll one dice of `faces` faces from the uniform source `u`.
+    """
+    return int(u() * faces) + 1
+
+
+def roll_expression(d: DiceExpression, u: Callable[[], float]) -> int:
+    """
+    Roll a dice expression (ex: DiceExpression(nb_dice=2, dice_face=6, bonus=1) is "2D6+1").
+    """
+    return sum(int(u() * d.dice_face) + 1 for _ in range(d.nb_dice)) + d.bonus
+
+
+def simulate_trial(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet,
+                   u: Callable[[], float]) -> Tuple[int, int]:
+    """
+    Simulate one attack, die by die (see the rules in the docstring of the module).
+
+    :param weapon: Attacking unit
+    :param target: Target (a squad large enough to absorb all the damage)
+    :param rules: Criticals, re-rolls and weapon abilities
+    :param u: Source of uniform numbers in [0, 1)
+
+    :return: Tuple (enemy dead, HP lost)
+    """
+    # Thresholds (a critical is always a success)
+    hit_threshold = min(rules.crit, weapon.hit_threshold)
+    wounds_threshold = min(rules.crit_wounds,
+                           get_wound_threshold(weapon_s=weapon.weapon_s, enemy_toughness=target.enemy_toughness)
+                           - rules.bonus_wound)
+    svg = min(target.svg_enemy + weapon.weapon_ap, 7, target.svg_invul_enemy)
+    fish_wound = rules.fish_wound and rules.devastating_wounds
+
+    # 1/ Attacks
+    nb_attack = sum(roll_expression(weapon.weapon_a, u) for _ in range(weapon.nb_figs))
+
+    # 2/ Hits
+    nb_hits = 0
+    nb_lethal_hits = 0
+    if rules.torrent:
+        nb_hits = nb_attack
+    else:
+        for _ in range(nb_attack):
+            dice = roll(u)
+            if (rules.rr_hit_ones and dice == 1) or (rules.fish_hit and dice < rules.crit) or \
+                    (rules.rr_hit_all and dice < hit_threshold):
+                dice = roll(u)
+
+            if dice >= rules.crit:
+                nb_hits += roll_expression(rules.sustain_hit, u)
+                if rules.lethal_hit:
+                    nb_lethal_hits += 1
+                else:
+                    nb_hits += 1
+            elif dice >= hit_threshold:
+                nb_hits += 1
+
+    # 3/ Wounds
+    nb_wounds = nb_lethal_hits
+    nb_deva_wounds = 0
+    for _ in range(nb_hits):
+        dice = roll(u)
+        if (rules.rr_wounds_ones and dice == 1) or (fish_wound and dice < rules.crit_wounds) or \
+                (rules.twin and dice < wounds_threshold):
+            dice = roll(u)
+
+        if rules.devastating_wounds and dice >= rules.crit_wounds:
+            nb_deva_wounds += 1
+        elif dice >= wounds_threshold:
+            nb_wounds += 1
+
+    # 4/ Saves
+    nb_failed_saves = sum(1 for _ in range(nb_wounds) if roll(u) < svg) + nb_deva_wounds
+
+    # 5/ Damage, feel no pain and allocation
+    enemy_dead = 0
+    hp_lost = 0
+    remaining_hp = target.enemy_hp
+    for _ in range(nb_failed_saves):
+        damage = roll_expression(weapon.weapon_d, u)
+        if target.fnp_enemy < 7:
+            damage = sum(1 for _ in range(damage) if roll(u) < target.fnp_enemy)
+
+        # Damage exceeding the HP of the figurine is lost
+        damage = min(damage, remaining_hp)
+        hp_lost += damage
+        remaining_hp -= damage
+        if remaining_hp == 0:
+            enemy_dead += 1
+            remaining_hp = target.enemy_hp
+
+    return enemy_dead, hp_lost
+
+
+# Simulations
+# ----------------------------------------------------------------------------
+def simulate(weapon: WeaponProfile,
+             target: TargetProfile,
+             rules: RuleSet,
+             nb_trials: int = MONTE_CARLO_TRIALS,
+             seed: int = MONTE_CARLO_SEED,
+             antithetic: bool = False) -> MonteCarloResult:
+    """
+    Simulate `nb_trials` attacks.
+
+    :param weapon: Attacking unit
+    :param target: Target
+    :param rules: Criticals, re-rolls and weapon abilities
+    :param nb_trials: Number of simulated attacks (if `antithetic`, rounded to an even number: pairs of trials)
+    :param seed: Seed (results are reproducible)
+    :param antithetic: If True, each trial is paired with its mirrored (antithetic) trial
+
+    :return: `MonteCarloResult`
+    """
+    return compare([(weapon, target, rules)], nb_trials=nb_trials, seed=seed, antithetic=antithetic).results[0]
+
+
+def compare(profiles: Sequence[Tuple[WeaponProfile, TargetProfile, RuleSet]],
+            nb_trials: int = MONTE_CARLO_TRIALS,
+            seed: int = MONTE_CARLO_SEED,
+            common_random_numbers: bool = True,
+            antithetic: bool = False) -> ComparisonResult:
+    """
+    Simulate `nb_trials` attacks for each profile, and compare each of them to the first one.
+
+    With `common_random_numbers`, trial k of each profile starts from the same uniforms: the differences between
+    similar profiles converge with far fewer trials.
+
+    :param profiles: Sequence of (weapon, target, rules). The first one is the reference.
+    :param nb_trials: Number of simulated attacks per profile
+    :param seed: Seed (results are reproducible)
+    :param common_random_numbers: If True, share the uniforms between profiles (else independent streams)
+    :param antithetic: If True, each trial is paired with its mirrored (antithetic) trial
+
+    :return: `ComparisonResult`
+    """
+    if nb_trials < 2:
+        raise ValueError(f"At least 2 trials are needed to estimate a variance, get {nb_trials}")
+
+    nb_profiles = len(profiles)
+    trials_per_sample = 2 if antithetic else 1
+    nb_samples = nb_trials // trials_per_sample
+
+    # Per sample (a pair of trials if antithetic), per profile: HP lost, dead, and variance of single trials
+    hp_lost = [[0.] * nb_samples for _ in range(nb_profiles)]
+    dead = [[0.] * nb_samples for _ in range(nb_profiles)]
+    single_trials = [[] for _ in range(nb_profiles)]
+
+    for k in range(nb_samples):
+        for i, (weapon, target, rules) in enumerate(profiles):
+            stream_seed = f"{seed}-{k}" if common_random_numbers else f"{seed}-{i}-{k}"
+            u = UniformStream(stream_seed)
+            d, h = simulate_trial(weapon, target, rules, u)
+            single_trials[i].append(h)
+
+            if antithetic:
+                d2, h2 = simulate_trial(weapon, target, rules, u.mirror(f"{stream_seed}-mirror"))
+                single_trials[i].append(h2)
+                d, h = (d + d2) / 2, (h + h2) / 2
+
+            hp_lost[i][k] = h
+            dead[i][k] = d
+
+    results = []
+    for i in range(nb_profiles):
+        variance = _variance(hp_lost[i])
+        # Variance of the mean with independent trials / variance achieved (same number of trials)
+        reduction = _ratio(_variance(single_trials[i]) / trials_per_sample, variance)
+        results.append(MonteCarloResult(mean_dead=sum(dead[i]) / nb_samples,
+                                        mean_hp_lost=sum(hp_lost[i]) / nb_samples,
+                                        std_error=math.sqrt(variance / nb_samples),
+                                        nb_trials=nb_samples * trials_per_sample,
+                                        variance_reduction=reduction))
+
+    comparison = ComparisonResult(results=results)
+    for i in range(nb_profiles):
+        differences = [h - h0 for h, h0 in zip(hp_lost[i], hp_lost[0])]
+        variance = _variance(differences)
+        comparison.differences.append(sum(differences) / nb_samples)
+        comparison.std_errors.append(math.sqrt(variance / nb_samples))
+        # Independent streams: variances of both estimators add up
+        independent = _variance(single_trials[i]) / trials_per_sample + \
+            _variance(single_trials[0]) / trials_per_sample
+        comparison.variance_reductions.append(_ratio(independent, variance) if i > 0 else 1.)
+
+    return comparison
+
+
+def _variance(values: Sequence[float]) -> float:
+    """
+    Unbiased variance of `values`.
+    """
+    n = len(values)
+    mean = sum(values) / n
+    return sum((x - mean) ** 2 for x in values) / (n - 1)
+
+
+def _ratio(numerator: float, denominator: float) -> float:
+    """
+    `numerator / denominator`, infinite if the denominator is 0 (perfect variance reduction), 1 if both are 0.
+    """
+    if denominator == 0:
+        return 1. if numerator == 0 else math.inf
+    return numerator / denominator
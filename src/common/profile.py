@@ -0,0 +1,333 @@
+"""
+Profiles: the arguments of `launch_workflow` grouped into three frozen value objects.
+
+* `WeaponProfile`: the attacking unit and its weapon (nb figs, A, BS, S, AP, D)
+* `TargetProfile`: the enemy (T, save, invulnerable save, feel no pain, W)
+* `RuleSet`: criticals, re-rolls and weapon abilities (sustain, lethal, devastating wounds, ...)
+
+Profiles are:
+* validated at construction (raise `ValueError` on wrong values),
+* immutable and hashable (hash computed once): usable directly as dict keys (e.g. result caches),
+* light: attributes are stored in `__slots__` (no `__dict__`),
+* pre-parsed: dice expressions (e.g. "D6+1") are parsed once into `DiceExpression` (and their average).
+
+Usage:
+```
+weapon = WeaponProfile(nb_figs=10, weapon_a="D3", hit_threshold=3, weapon_s=4, weapon_ap=1, weapon_d=1)
+target = TargetProfile.from_datasheet(opponent_datasheets["marine"])
+launch_workflow_profiles(weapon, target, RuleSet(lethal_hit=True))
+```
+"""
+import sys
+from os.path import dirname, abspath
+from typing import Tuple, Union
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.dice import DiceExpression, parse_expression, _parse_str_expression, average_dice_expression
+from common.utils import (nb_figs, crit, crit_wounds, weapon_a, hit_threshold, weapon_s, weapon_ap, weapon_d,
+                          bonus_wound, torrent, rr_hit_ones, rr_hit_all, sustain_hit, lethal_hit, rr_wounds_ones,
+                          twin, devastating_wounds, enemy_toughness, svg_enemy, svg_invul_enemy, fnp_enemy, enemy_hp,
+                          fish_hit, fish_wound)
+
+
+class _Profile:
+    """
+    Base class of the profiles: frozen, hashable (hash cached), compared on the values of `_FIELDS`.
+
+    NB: sub-classes define `__slots__` and `_FIELDS` (the public attributes defining the profile).
+    """
+    __slots__ = ("_key", "_hash")
+    _FIELDS = ()
+
+    def _freeze(self) -> None:
+        """
+        To call at the end of `__init__`: compute the key (values of `_FIELDS`) and its hash once for all.
+        """
+        key = tuple(_hashable(getattr(self, name)) for name in self._FIELDS)
+        object.__setattr__(self, "_key", key)
+        object.__setattr__(self, "_hash", hash((type(self).__name__, key)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is frozen: use `replace({name}=...)` to get a modified copy")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is frozen")
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __eq__(self, other) -> bool:
+        # NB: compare class names (and not classes) as modules may be imported as `common.*` and `src.common.*`
+        return (type(other).__name__ == type(self).__name__) and (self._hash == other._hash) and \
+            (self._key == other._key)
+
+    def __repr__(self) -> str:
+        content = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._FIELDS)
+        return f"{type(self).__name__}({content})"
+
+    def __reduce__(self):
+        # Pickle (e.g. multiprocessing) with the constructor: re-validate and re-compute the cached attributes
+        return _rebuild, (type(self), self.as_kwargs())
+
+    def as_kwargs(self) -> dict:
+        """
+        Arguments of the profile, as given to `launch_workflow` (dice expressions formatted as str, e.g. "D6+1").
+        """
+        return {name: _format_value(getattr(self, name)) for name in self._FIELDS}
+
+    def replace(self, **changes):
+        """
+        Get a copy of the profile with some fields modified (ex: `weapon.replace(weapon_s=5)`).
+        """
+        kwargs = self.as_kwargs()
+        kwargs.update(changes)
+        return type(self)(**kwargs)
+
+
+class WeaponProfile(_Profile):
+    """
+    The attacking unit: number of figurines and the characteristics of their weapon.
+    """
+    __slots__ = ("nb_figs", "weapon_a", "hit_threshold", "weapon_s", "weapon_ap", "weapon_d",
+                 "average_a", "average_d")
+    _FIELDS = ("nb_figs", "weapon_a", "hit_threshold", "weapon_s", "weapon_ap", "weapon_d")
+
+    def __init__(self,
+                 nb_figs: int = nb_figs,
+                 weapon_a: Union[str, int] = weapon_a,
+                 hit_threshold: int = hit_threshold,
+                 weapon_s: int = weapon_s,
+                 weapon_ap: int = weapon_ap,
+                 weapon_d: Union[str, int] = weapon_d):
+        """
+        :param nb_figs: Number of figurines attacking
+        :param weapon_a: Number of attack of the weapon (ex: "2D6+1" or 3)
+        :param hit_threshold: Hit capacity (3 means 3+)
+        :param weapon_s: Weapon strength
+        :param weapon_ap: Armour piercing of the weapon (1 mean PA-1, 0 means no AP)
+        :param weapon_d: Damage of the weapon (e.g. "D3+1" or 3)
+
+        :raises: ValueError if one value is out of bounds or not parsable
+        """
+        set_ = object.__setattr__
+        set_(self, "nb_figs", _check_int("nb_figs", nb_figs, minimum=0))
+        set_(self, "weapon_a", _check_dice_expression("weapon_a", weapon_a))
+        set_(self, "hit_threshold", _check_int("hit_threshold", hit_threshold, minimum=1, maximum=7))
+        set_(self, "weapon_s", _check_int("weapon_s", weapon_s, minimum=1))
+        set_(self, "weapon_ap", _check_int("weapon_ap", weapon_ap, minimum=0))
+        set_(self, "weapon_d", _check_dice_expression("weapon_d", weapon_d))
+
+        # Pre-computed averages (used by `launch_workflow_profiles`)
+        set_(self, "average_a", average_dice_expression(self.weapon_a))
+        set_(self, "average_d", average_dice_expression(self.weapon_d))
+        self._freeze()
+
+
+class TargetProfile(_Profile):
+    """
+    The enemy: toughness, saves, feel no pain and health points.
+
+    NB: missing saves / FNP (`None`) are stored as 7 (no save).
+    """
+    __slots__ = ("enemy_toughness", "svg_enemy", "svg_invul_enemy", "fnp_enemy", "enemy_hp")
+    _FIELDS = __slots__
+
+    def __init__(self,
+                 enemy_toughness: int = enemy_toughness,
+                 svg_enemy: int = svg_enemy,
+                 svg_invul_enemy: int = svg_invul_enemy,
+                 fnp_enemy: int = fnp_enemy,
+                 enemy_hp: int = enemy_hp):
+        """
+        :param enemy_toughness: Endurance of the enemy
+        :param svg_enemy: Save of the enemy (4 means 4+, 7 or None means no save)
+        :param svg_invul_enemy: Invulnerable save of the enemy (4 means 4+, 7 or None means no save)
+        :param fnp_enemy: Feel no Pain (FNP) (4 means 4+, 7 or None means no FNP)
+        :param enemy_hp: Health Point (hp) of the enemy
+
+        :raises: ValueError if one value is out of bounds
+        """
+        set_ = object.__setattr__
+        set_(self, "enemy_toughness", _check_int("enemy_toughness", enemy_toughness, minimum=1))
+        set_(self, "svg_enemy", _check_int("svg_enemy", _none_to_7(svg_enemy), minimum=1, maximum=7))
+        set_(self, "svg_invul_enemy", _check_int("svg_invul_enemy", _none_to_7(svg_invul_enemy), minimum=1, maximum=7))
+        set_(self, "fnp_enemy", _check_int("fnp_enemy", _none_to_7(fnp_enemy), minimum=1, maximum=7))
+        set_(self, "enemy_hp", _check_int("enemy_hp", enemy_hp, minimum=1))
+        self._freeze()
+
+    @classmethod
+    def from_datasheet(cls, carac: dict) -> "TargetProfile":
+        """
+        Build a target from one row of `opponent_datasheets` (see `enemy.py`).
+
+        :param carac: ex: {'svg': 3, 'svg invul': None, 'feel no pain': None, 'toughness': 4, 'w': 2}
+        """
+        return cls(enemy_toughness=carac["toughness"],
+                   svg_enemy=carac["svg"],
+                   svg_invul_enemy=carac["svg invul"],
+                   fnp_enemy=carac["feel no pain"],
+                   enemy_hp=carac["w"])
+
+
+class RuleSet(_Profile):
+    """
+    Criticals, re-rolls and abilities of the weapon.
+
+    Incompatible options are resolved at construction, the same way `launch_workflow` does:
+    * `rr_hit_all` disables `rr_hit_ones` (avoid double reroll), idem `twin` disables `rr_wounds_ones`,
+    * `torrent` disables all hit re-rolls,
+    * `fish_hit` (resp. `fish_wound`) is disabled if hits (resp. wounds) cannot be re-rolled.
+    """
+    __slots__ = ("crit", "crit_wounds", "bonus_wound", "torrent", "rr_hit_ones", "rr_hit_all", "sustain_hit",
+                 "lethal_hit", "rr_wounds_ones", "twin", "devastating_wounds", "fish_hit", "fish_wound",
+                 "average_sustain_hit")
+    _FIELDS = __slots__[:-1]
+
+    def __init__(self,
+                 crit: int = crit,
+                 crit_wounds: int = crit_wounds,
+                 bonus_wound: int = bonus_wound,
+                 torrent: bool = torrent,
+                 rr_hit_ones: bool = rr_hit_ones,
+                 rr_hit_all: bool = rr_hit_all,
+                 sustain_hit: Union[str, int] = sustain_hit,
+                 lethal_hit: bool = lethal_hit,
+                 rr_wounds_ones: bool = rr_wounds_ones,
+                 twin: bool = twin,
+                 devastating_wounds: bool = devastating_wounds,
+                 fish_hit: bool = fish_hit,
+                 fish_wound: bool = fish_wound):
+        """
+        See `launch_workflow` for the description of each argument.
+
+        :raises: ValueError if one value is out of bounds or not parsable
+        """
+        torrent, rr_hit_ones, rr_hit_all, lethal_hit, rr_wounds_ones, twin, devastating_wounds, fish_hit, \
+            fish_wound = [bool(x) for x in (torrent, rr_hit_ones, rr_hit_all, lethal_hit, rr_wounds_ones, twin,
+                                            devastating_wounds, fish_hit, fish_wound)]
+
+        # Incompatible bonuses (see `launch_workflow`)
+        if rr_hit_all:
+            rr_hit_ones = False
+        if torrent:
+            rr_hit_all = False
+            rr_hit_ones = False
+        if twin:
+            rr_wounds_ones = False
+        if not rr_hit_all:
+            fish_hit = False
+        if not twin:
+            fish_wound = False
+
+        set_ = object.__setattr__
+        set_(self, "crit", _check_int("crit", crit, minimum=1, maximum=7))
+        set_(self, "crit_wounds", _check_int("crit_wounds", crit_wounds, minimum=1, maximum=7))
+        set_(self, "bonus_wound", _check_int("bonus_wound", bonus_wound, minimum=-1, maximum=1))
+        set_(self, "torrent", torrent)
+        set_(self, "rr_hit_ones", rr_hit_ones)
+        set_(self, "rr_hit_all", rr_hit_all)
+        set_(self, "sustain_hit", _check_dice_expression("sustain_hit", sustain_hit))
+        set_(self, "lethal_hit", lethal_hit)
+        set_(self, "rr_wounds_ones", rr_wounds_ones)
+        set_(self, "twin", twin)
+        set_(self, "devastating_wounds", devastating_wounds)
+        set_(self, "fish_hit", fish_hit)
+        set_(self, "fish_wound", fish_wound)
+
+        set_(self, "average_sustain_hit", average_dice_expression(self.sustain_hit))
+        self._freeze()
+
+
+def profiles_from_kwargs(**kwargs) -> Tuple[WeaponProfile, TargetProfile, RuleSet]:
+    """
+    Split arguments of `launch_workflow` (e.g. a row of a sweep) into profiles. Missing arguments take the default
+    values.
+
+    :return: Tuple (weapon, target, rules)
+    """
+    unknown = set(kwargs) - set(WeaponProfile._FIELDS + TargetProfile._FIELDS + RuleSet._FIELDS)
+    if unknown:
+        raise TypeError(f"Unknown arguments of launch_workflow: {sorted(unknown)}")
+    return tuple(cls(**{k: v for k, v in kwargs.items() if k in cls._FIELDS})
+                 for cls in (WeaponProfile, TargetProfile, RuleSet))
+
+
+# Utils
+# ----------------------------------------------------------------------------
+def _rebuild(cls, kwargs: dict):
+    """
+    Rebuild a profile from its arguments (used by pickle).
+    """
+    return cls(**kwargs)
+
+
+def _none_to_7(value):
+    """
+    None (no save / no FNP) is stored as 7.
+    """
+    return 7 if value is None else value
+
+
+def _check_int(name: str, value, minimum: int = None, maximum: int = None) -> int:
+    """
+    Check `value` is an int (or a float without decimals, e.g. 6.0 read in a CSV) in [`minimum`, `maximum`].
+
+    :raises: ValueError if not
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or int(value) != value:
+        raise ValueError(f"Value have wrong format: {name}={value!r}, expected int")
+    value = int(value)
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise ValueError(f"Value out of bounds: {name}={value}, expected in [{minimum}, {maximum}]")
+    return value
+
+
+def _check_dice_expression(name: str, value: Union[str, int, DiceExpression]) -> DiceExpression:
+    """
+    Parse `value` into a `DiceExpression` (ex: "2D6+1" --> DiceExpression(nb_dice=2, dice_face=6, bonus=1)).
+
+    :raises: ValueError if `value` is not parsable
+    """
+    if type(value).__name__ == "DiceExpression":
+        return value
+    try:
+        # Checkers of `parse_expression`
+        parse_expression(value)
+        d = _parse_str_expression(value)
+    except (ValueError, IndexError) as e:
+        raise ValueError(f"Value have wrong format: {name}={value!r}, expected int or <some number>D<3 or 6> "
+                         f"(e.g. 1D6)") from e
+    if d.nb_dice < 0 or d.bonus < 0 or d.dice_face < 1:
+        raise ValueError(f"Value out of bounds: {name}={value!r}")
+    return d
+
+
+def _hashable(value):
+    """
+    Value used in the key of a profile. `DiceExpression` are transformed into tuples (class-independent).
+    """
+    if type(value).__name__ == "DiceExpression":
+        return value.nb_dice, value.dice_face, value.bonus
+    return value
+
+
+def _format_value(value):
+    """
+    Format a value of a profile as accepted by `launch_workflow` (e.g. DiceExpression(1, 6, 1) --> "D6+1").
+    """
+    if type(value).__name__ != "DiceExpression":
+        return value
+    if value.nb_dice == 0:
+        return value.bonus
+    expression = f"{value.nb_dice if value.nb_dice > 1 else ''}D{value.dice_face}"
+    if value.bonus:
+        expression += f"+{value.bonus}"
+    return expression
@@ -0,0 +1,259 @@
+"""
+Optimal re-roll policy, by backward dynamic programming through the stages of the workflow.
+
+`launch_workflow` only supports fixed policies: re-roll the ones, every failure (`rr_hit_all`, `twin`), or every non
+critical (`fish_hit`, `fish_wound`). Whether a re-roll actually helps depends on sustain / lethal / devastating wounds
+and on the save of the target. Here, each face of each dice gets a value (expected final damage, once the next stages
+are played optimally), computed backward:
+1. damage of a failed save (damage after feel no pain, capped by the HP of the target). NB: damage lost on a
+figurine already wounded by a previous failed save is not modeled (the expected damage is then an upper bound),
+2. wound dice: value of each face (0, damage * proba to fail the save, or damage if devastating wound),
+3. hit dice: value of each face (0, value of a wound dice, or critical: sustain hits and lethal wound).
+
+A face is worth re-rolling if its value is lower than the average value of a new dice.
+
+Limited re-rolls (e.g. a single dice re-roll for the whole attack) are handled too: the re-roll is used on the worst
+dice, of the stage where it is expected to bring the most damage.
+
+Tables are cached per (weapon, target, rules) (profiles are hashable, see `profile.py`).
+
+Usage:
+```
+policy = optimal_reroll_policy(weapon, target, rules)
+policy.hit_rerolls  # ex: (1, 2, 3, 4, 5): fish critical hits (re-roll everything but the 6)
+```
+"""
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+from os.path import dirname, abspath
+from typing import Callable, FrozenSet, Optional, Tuple
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.dice import (DiceExpression, proba_dice, get_wound_threshold, average_dice_expression,
+                         dice_expression_pmf, fnp_damage_pmf)
+from common.profile import WeaponProfile, TargetProfile, RuleSet
+
+FACES = (1, 2, 3, 4, 5, 6)
+
+# Size of the cache of policies
+CACHE_SIZE = 4096
+
+
+@dataclass(frozen=True)
+class RerollPolicy:
+    """
+    Optimal re-roll policy of an attack (see `optimal_reroll_policy`).
+    """
+    # Faces to re-roll (within the re-rolls allowed by the rules)
+    hit_rerolls: Tuple[int, ...]
+    wound_rerolls: Tuple[int, ...]
+    # Expected damage (HP lost) with the optimal policy
+    expected_damage: float
+    # Expected damage with the fixed policy of the rules (re-roll ones / failures / non criticals)
+    expected_damage_rules: float
+    # Value (expected final damage) of each face of the hit dice and the wound dice (index 0: face 1)
+    hit_face_values: Tuple[float, ...]
+    wound_face_values: Tuple[float, ...]
+    # Single dice re-roll: stage where to use it ("hit", "wound" or None if useless) and expected damage gained
+    single_reroll_stage: Optional[str]
+    single_reroll_gain: float
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def optimal_reroll_policy(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet) -> RerollPolicy:
+    """
+    Compute the optimal re-roll policy of an attack, cached per (weapon, target, rules).
+
+    Re-rolls allowed by `rules`:
+    * hit: any dice if `rr_hit_all`, the ones if `rr_hit_ones`, none if `torrent` or no hit re-roll,
+    * wound: any dice if `twin`, the ones if `rr_wounds_ones`, else none.
+
+    :param weapon: Attacking unit
+    :param target: Target
+    :param rules: Criticals, re-rolls and weapon abilities
+
+    :return: `RerollPolicy`
+    """
+    hit_threshold = min(rules.crit, weapon.hit_threshold)
+    wounds_threshold = min(rules.crit_wounds,
+                           get_wound_threshold(weapon_s=weapon.weapon_s, enemy_toughness=target.enemy_toughness)
+                           - rules.bonus_wound)
+    svg = min(target.svg_enemy + weapon.weapon_ap, 7, target.svg_invul_enemy)
+
+    # 1/ Damage of a failed save (after FNP, damage exceeding the HP of a figurine is lost)
+    # ------------------------------------------------------------------------------
+    damage_pmf = fnp_damage_pmf(dice_expression_pmf(weapon.weapon_d), proba_dice(target.fnp_enemy, succeed=False))
+    damage = sum(min(d, target.enemy_hp) * p for d, p in damage_pmf.items())
+    saved_damage = damage * proba_dice(svg, succeed=False)
+
+    # 2/ Wound dice
+    # ------------------------------------------------------------------------------
+    def wound_value(face: int) -> float:
+        if rules.devastating_wounds and face >= rules.crit_wounds:
+            return damage
+        if face >= wounds_threshold:
+            return saved_damage
+        return 0.
+
+    wound_values = tuple(wound_value(f) for f in FACES)
+    wound_allowed = _allowed_rerolls(rules.twin, rules.rr_wounds_ones)
+    wound_optimal = _optimal_rerolls(wound_values, wound_allowed)
+    wound_rules = _fixed_rerolls(wounds_threshold, rules.crit_wounds, rules.twin, rules.rr_wounds_ones,
+                                 rules.fish_wound and rules.devastating_wounds)
+
+    # 3/ Hit dice (a hit is worth a wound dice played with the policy of the stage 2)
+    # ------------------------------------------------------------------------------
+    sustain = average_dice_expression(rules.sustain_hit)
+
+    def hit_values(wound_dice: float) -> Tuple[float, ...]:
+        def value(face: int) -> float:
+            if face >= rules.crit:
+                return (saved_damage if rules.lethal_hit else wound_dice) + sustain * wound_dice
+            if face >= hit_threshold:
+                return wound_dice
+            return 0.
+        return tuple(value(f) for f in FACES)
+
+    nb_attack = weapon.nb_figs * average_dice_expression(weapon.weapon_a)
+
+    def expected_damage(hit_rerolls: FrozenSet[int], wound_rerolls: FrozenSet[int]) -> Tuple[float, tuple]:
+        wound_dice = _expected_value(wound_values, wound_rerolls)
+        if rules.torrent:
+            return nb_attack * wound_dice, (wound_dice,) * len(FACES)
+        values = hit_values(wound_dice)
+        return nb_attack * _expected_value(values, hit_rerolls), values
+
+    hit_allowed = frozenset() if rules.torrent else _allowed_rerolls(rules.rr_hit_all, rules.rr_hit_ones)
+    _, optimal_hit_values = expected_damage(frozenset(), wound_optimal)
+    hit_optimal = _optimal_rerolls(optimal_hit_values, hit_allowed)
+    optimal, _ = expected_damage(hit_optimal, wound_optimal)
+
+    hit_rules = frozenset() if rules.torrent else _fixed_rerolls(hit_threshold, rules.crit, rules.rr_hit_all,
+                                                                 rules.rr_hit_ones, rules.fish_hit)
+    with_rules, _ = expected_damage(hit_rules, wound_rules)
+
+    # 4/ Single dice re-roll (on top of the optimal policy)
+    # ------------------------------------------------------------------------------
+    stage, gain = None, 0.
+    attack_pgf = _dice_expression_pgf(weapon.weapon_a)
+
+    # Hit stage: one dice per attack
+    if not rules.torrent:
+        hit_gain = _single_reroll_gain(optimal_hit_values, hit_optimal,
+                                       lambda s: attack_pgf(s) ** weapon.nb_figs)
+        if hit_gain > gain:
+            stage, gain = "hit", hit_gain
+
+    # Wound stage: number of wound dice per attack depends on the hit dice (sustain, lethal)
+    sustain_pgf = _dice_expression_pgf(rules.sustain_hit)
+    hit_probas = _face_probas(hit_optimal)
+
+    def wound_dice_pgf(s: float) -> float:
+        if rules.torrent:
+            per_attack = s
+        else:
+            per_attack = sum(p * (s ** (0 if rules.lethal_hit else 1) * sustain_pgf(s) if f >= rules.crit
+                                  else s if f >= hit_threshold else 1.)
+                             for f, p in zip(FACES, hit_probas))
+        return attack_pgf(per_attack) ** weapon.nb_figs
+
+    wound_gain = _single_reroll_gain(wound_values, wound_optimal, wound_dice_pgf)
+    if wound_gain > gain:
+        stage, gain = "wound", wound_gain
+
+    return RerollPolicy(hit_rerolls=tuple(sorted(hit_optimal)),
+                        wound_rerolls=tuple(sorted(wound_optimal)),
+                        expected_damage=optimal,
+                        expected_damage_rules=with_rules,
+                        hit_face_values=optimal_hit_values,
+                        wound_face_values=wound_values,
+                        single_reroll_stage=stage,
+                        single_reroll_gain=gain)
+
+
+# Utils
+# ----------------------------------------------------------------------------
+def _allowed_rerolls(reroll_all: bool, reroll_ones: bool) -> FrozenSet[int]:
+    """
+    Faces that may be re-rolled.
+    """
+    if reroll_all:
+        return frozenset(FACES)
+    if reroll_ones:
+        return frozenset({1})
+    return frozenset()
+
+
+def _fixed_rerolls(threshold: int, crit: int, reroll_all: bool, reroll_ones: bool, fish: bool) -> FrozenSet[int]:
+    """
+    Faces re-rolled by the fixed policies of `launch_workflow` (fish non criticals, re-roll failures or ones).
+    """
+    if reroll_all and fish:
+        return frozenset(f for f in FACES if f < crit)
+    if reroll_all:
+        return frozenset(f for f in FACES if f < threshold)
+    if reroll_ones:
+        return frozenset({1})
+    return frozenset()
+
+
+def _optimal_rerolls(values: Tuple[float, ...], allowed: FrozenSet[int]) -> FrozenSet[int]:
+    """
+    Re-roll the allowed faces whose value is lower than the average value of a new dice.
+    """
+    average = sum(values) / len(values)
+    return frozenset(f for f, v in zip(FACES, values) if f in allowed and v < average)
+
+
+def _face_probas(rerolls: FrozenSet[int]) -> Tuple[float, ...]:
+    """
+    Probability of each final face of a dice, once the faces `rerolls` are re-rolled (once).
+    """
+    return tuple((0. if f in rerolls else 1 / 6) + len(rerolls) / 36 for f in FACES)
+
+
+def _expected_value(values: Tuple[float, ...], rerolls: FrozenSet[int]) -> float:
+    """
+    Expected value of a dice whose faces `rerolls` are re-rolled.
+    """
+    return sum(p * v for p, v in zip(_face_probas(rerolls), values))
+
+
+def _dice_expression_pgf(d: DiceExpression) -> Callable[[float], float]:
+    """
+    Probability generating function of a dice expression: s -> E[s ** X].
+    """
+    pmf = dice_expression_pmf(d)
+    return lambda s: sum(p * s ** x for x, p in pmf.items())
+
+
+def _single_reroll_gain(values: Tuple[float, ...], rerolls: FrozenSet[int],
+                        nb_dice_pgf: Callable[[float], float]) -> float:
+    """
+    Expected damage gained by a single re-roll, used on the worst dice of a stage.
+
+    A dice not re-rolled by the policy showing face f gains `average - values[f]` if re-rolled. With N dice (random,
+    given by its generating function G): P(best gain >= g) = 1 - G(1 - q(g)), q(g) = P(one dice gains >= g).
+
+    :param values: Value of each face
+    :param rerolls: Faces already re-rolled by the policy (cannot be re-rolled twice)
+    :param nb_dice_pgf: Generating function of the number of dice of the stage
+    """
+    average = sum(values) / len(values)
+    gains = {f: average - v for f, v in zip(FACES, values) if f not in rerolls and average - v > 0}
+
+    levels = sorted(set(gains.values()), reverse=True) + [0.]
+    expected_gain = 0.
+    for g, next_g in zip(levels, levels[1:]):
+        q = sum(1 / 6 for gain in gains.values() if gain >= g)
+        expected_gain += (g - next_g) * (1 - nb_dice_pgf(1 - q))
+    return expected_gain
@@ -0,0 +1,262 @@
+"""
+Model of the results table of the app (no Kivy): rows computed lazily, in the order of the display.
+
+With thousands of targets, computing and displaying all the rows at each submit freezes the app. Here:
+* the view (a Kivy `RecycleView`, see `main.py`) only reports the rows visible (`set_visible`),
+* the visible rows, and the `margin` rows around them (about to be visible), are computed first (`wanted`),
+* the other rows are computed later, by chunks, in background (same `wanted`, called again after each chunk: a
+scroll in the meantime changes the priorities),
+* rows can be sorted by any column (rows not computed yet last),
+* the view is updated with the rows changed since its last update only (`changes`): rebuilding the content of all the
+rows at each chunk freezes the app,
+* rows are refined once each (see `claim_refinement`), when they become visible.
+
+Rows are identified by their index in `names`; positions are indices in the display order (`order`).
+
+Usage:
+```
+table = ResultsTable(names, opponent_datasheets)
+table.set_inputs(weapon, rules)
+table.set_visible(*visible_range(scroll_y, viewport_height, row_height, len(table)))
+table.compute(table.wanted(limit=...))  # Then again in background, until `wanted()` is empty
+recycle_view.data = table.data()
+for position, content in table.changes() or []:  # Later updates: changed rows only
+    recycle_view.data[position] = content
+```
+"""
+import sys
+import threading
+from math import ceil
+from os.path import dirname, abspath
+from typing import Dict, List, Optional, Tuple
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.dice import compute_average_enemy_dead
+from common.engine import evaluate
+from common.profile import WeaponProfile, TargetProfile, RuleSet
+from common.utils import RESULTS_TABLE_MARGIN
+
+# Columns of the table (sort keys)
+NAME_COLUMN = "Name"
+VALUE_COLUMN = "average dead enemy"
+COLUMNS = (NAME_COLUMN, VALUE_COLUMN)
+
+
+class ResultsTable:
+    """
+    Rows of the results table, computed lazily (see module docstring).
+    """
+
+    def __init__(self, names: List[str], datasheets: Dict[str, dict], margin: int = RESULTS_TABLE_MARGIN,
+                 refining_marker: str = " ..."):
+        """
+        :param names: Name of each row
+        :param datasheets: {<name>: <datasheet>} (read at each `set_inputs`: may be modified in the meantime)
+        :param margin: Number of rows computed before / after the visible ones
+        :param refining_marker: Added to the name of the rows still refining
+        """
+        self.names = list(names)
+        self.datasheets = datasheets
+        self.margin = margin
+        self.refining_marker = refining_marker
+        # Value of each row (None: not computed yet)
+        self.values: List[Optional[float]] = [None] * len(self.names)
+        # Rows still refining (see `set_value`)
+        self.refining = set()
+        # Display order: position -> row, and its inverse
+        self.order = list(range(len(self.names)))
+        self._positions = list(range(len(self.names)))
+        self.sort_column: Optional[str] = None
+        self.sort_reverse = False
+        # Visible positions [first, last)
+        self.visible: Tuple[int, int] = (0, 0)
+        self.weapon: Optional[WeaponProfile] = None
+        self.rules: Optional[RuleSet] = None
+        # Incremented at each `set_inputs` (results of older inputs are dropped)
+        self.generation = 0
+        self._targets: Dict[int, TargetProfile] = {}
+        # Rows changed since the last `changes` (all the rows if `_all_changed`)
+        self._changed = set()
+        self._all_changed = True
+        # Rows whose refinement was started (see `claim_refinement`)
+        self._claimed = set()
+        # Rows are computed by a background thread while the UI thread reads them
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def set_inputs(self, weapon: WeaponProfile, rules: RuleSet) -> int:
+        """
+        New inputs: all the rows have to be computed again.
+
+        :return: New generation
+        """
+        with self._lock:
+            self.weapon, self.rules = weapon, rules
+            self.values = [None] * len(self.names)
+            self.refining = set()
+            self._targets = {}
+            self._all_changed = True
+            self._claimed = set()
+            self.generation += 1
+            return self.generation
+
+    def set_visible(self, first: int, last: int) -> None:
+        """
+        Positions [first, last) are visible.
+        """
+        with self._lock:
+            self.visible = (max(first, 0), min(last, len(self.names)))
+
+    def target(self, row: int) -> TargetProfile:
+        with self._lock:
+            if row not in self._targets:
+                self._targets[row] = TargetProfile.from_datasheet(self.datasheets[self.names[row]])
+            return self._targets[row]
+
+    def visible_rows(self) -> List[int]:
+        with self._lock:
+            return self.order[self.visible[0]:self.visible[1]]
+
+    def wanted(self, limit: Optional[int] = None, include_rest: bool = True) -> List[int]:
+        """
+        Rows not computed yet, by priority: visible, then about to be visible (`margin` rows around), then (if
+        `include_rest`) the others in the display order.
+
+        :param limit: Maximum number of rows returned
+        """
+        with self._lock:
+            first, last = self.visible
+            positions = [range(first, last),
+                         range(last, min(last + self.margin, len(self.order))),
+                         range(first - 1, max(first - self.margin, 0) - 1, -1)]
+            if include_rest:
+                positions += [range(last + self.margin, len(self.order)), range(0, max(first - self.margin, 0))]
+            rows = []
+            for block in positions:
+                for position in block:
+                    row = self.order[position]
+                    if self.values[row] is None:
+                        rows.append(row)
+                        if limit is not None and len(rows) >= limit:
+                            return rows
+            return rows
+
+    def compute(self, rows: List[int], generation: int = None) -> List[int]:
+        """
+        Compute the averages of `rows` (not computed yet), with the "average" engine.
+
+        :param generation: Generation of the caller (nothing is stored if the inputs changed since)
+        :return: Rows computed (none before the first `set_inputs`)
+        """
+        weapon, rules = self.weapon, self.rules
+        if weapon is None:
+            return []
+        generation = self.generation if generation is None else generation
+        computed = []
+        for row in rows:
+            if self.values[row] is not None:
+                continue
+            target = self.target(row)
+            result = evaluate(weapon, target, rules)
+            value = compute_average_enemy_dead(enemy_dead=result.enemy_dead, remaining_hp=result.remaining_hp,
+                                               enemy_hp=target.enemy_hp)
+            if not self.set_value(row, value, generation):
+                break
+            computed.append(row)
+        return computed
+
+    def set_value(self, row: int, value: float, generation: int, refining: bool = False) -> bool:
+        """
+        Set the value of a row (e.g. refined result), if the inputs did not change since `generation`.
+
+        :param refining: If True, the row is marked as still refining
+        :return: False if the value was dropped (inputs changed)
+        """
+        with self._lock:
+            if generation != self.generation:
+                return False
+            self.values[row] = value
+            if refining:
+                self.refining.add(row)
+            else:
+                self.refining.discard(row)
+            self._changed.add(row)
+            return True
+
+    def claim_refinement(self, rows: List[int], generation: int) -> List[int]:
+        """
+        Claim the refinement of `rows`: each row is refined once per generation.
+
+        :return: Rows of `rows` not claimed yet (none if the inputs changed since `generation`)
+        """
+        with self._lock:
+            if generation != self.generation:
+                return []
+            rows = [row for row in rows if row not in self._claimed]
+            self._claimed.update(rows)
+            return rows
+
+    def sort(self, column: str, reverse: bool = False) -> None:
+        """
+        Sort the rows by `column` (see `COLUMNS`). Rows not computed yet are last (in their previous order).
+        """
+        with self._lock:
+            if column == NAME_COLUMN:
+                self.order.sort(key=lambda row: self.names[row].casefold(), reverse=reverse)
+            elif column == VALUE_COLUMN:
+                done = [row for row in self.order if self.values[row] is not None]
+                done.sort(key=lambda row: self.values[row], reverse=reverse)
+                self.order = done + [row for row in self.order if self.values[row] is None]
+            else:
+                raise ValueError(f"Unknown column '{column}', expected one of {COLUMNS}")
+            self.sort_column, self.sort_reverse = column, reverse
+            for position, row in enumerate(self.order):
+                self._positions[row] = position
+            self._all_changed = True
+
+    def data(self) -> List[dict]:
+        """
+        Content of the rows, in the display order (`data` of the `RecycleView`): {"name": ..., "value": ...} (value
+        empty if not computed yet).
+        """
+        with self._lock:
+            return [self._content(row) for row in self.order]
+
+    def changes(self) -> Optional[List[Tuple[int, dict]]]:
+        """
+        Rows changed since the last call (values set, see `set_value`).
+
+        :return: List of (<position>, <content, see `data`>), or None if all the rows changed (new inputs, sort): the
+            whole `data` has to be reloaded
+        """
+        with self._lock:
+            all_changed, changed = self._all_changed, self._changed
+            self._all_changed, self._changed = False, set()
+            if all_changed:
+                return None
+            return sorted((self._positions[row], self._content(row)) for row in changed)
+
+    def _content(self, row: int) -> dict:
+        return {"name": self.names[row] + (self.refining_marker if row in self.refining else ""),
+                "value": "" if self.values[row] is None else f"{self.values[row]:.2f}"}
+
+
+def visible_range(scroll_y: float, viewport_height: float, row_height: float, nb_rows: int) -> Tuple[int, int]:
+    """
+    Positions [first, last) visible in a scrolled list of rows of the same height (Kivy convention: `scroll_y` is 1
+    at the top, 0 at the bottom).
+    """
+    hidden = max(nb_rows * row_height - viewport_height, 0)
+    top = (1 - min(max(scroll_y, 0), 1)) * hidden
+    first = int(top // row_height)
+    return first, min(nb_rows, first + ceil(viewport_height / row_height) + 1)
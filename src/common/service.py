@@ -0,0 +1,376 @@
+"""
+Local HTTP/JSON evaluation service (stdlib only), for web tools and bots.
+
+Endpoints:
+* `POST /evaluate`: `{"weapon": {...}, "target": {...}, "rules": {...}}` (arguments of `launch_workflow`, missing ones
+take the default values) --> `{"enemy_dead": ..., "remaining_hp": ...}`
+* `POST /evaluate_batch`: `{"rows": [<request of /evaluate>, ...]}` --> `{"results": [<result of /evaluate>, ...]}`
+* `GET /stats`: latency percentiles (p50 / p99, ms), throughput (requests/s), batches and cache counters
+
+Requests are served by a thread each, but not evaluated by it: rows are submitted to a micro-batcher, which merges all
+the rows received within `SERVICE_BATCH_WINDOW` seconds, drops the duplicates and the rows already in the (shared)
+result cache, evaluates the rest in one call of `kernel.evaluate_batch` (one vectorized kernel call per group of rule
+flags, if NumPy is installed), then wakes up the requests.
+
+Usage: On a terminal:
+```
+python service.py --port 8040
+curl -X POST localhost:8040/evaluate -d '{"weapon": {"nb_figs": 10, "weapon_s": 5}, "target": {"enemy_toughness": 4}}'
+```
+"""
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os.path import dirname, abspath
+from typing import Dict, List, Optional, Tuple
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.kernel import evaluate_batch
+from common.profile import WeaponProfile, TargetProfile, RuleSet
+from common.utils import (SERVICE_HOST, SERVICE_PORT, SERVICE_BATCH_WINDOW, SERVICE_MAX_BATCH, SERVICE_CACHE_SIZE,
+                          SERVICE_LATENCY_WINDOW)
+
+# Row to evaluate
+Row = Tuple[WeaponProfile, TargetProfile, RuleSet]
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache {<row>: (enemy_dead, remaining_hp)}.
+    """
+
+    def __init__(self, max_size: int = SERVICE_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, row: Row) -> Optional[Tuple[float, float]]:
+        with self._lock:
+            result = self._data.get(row)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(row)
+            return result
+
+    def put(self, row: Row, result: Tuple[float, float]) -> None:
+        with self._lock:
+            self._data[row] = result
+            self._data.move_to_end(row)
+            if len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class _Pending:
+    """
+    Rows of one request, waiting for the micro-batcher.
+    """
+    __slots__ = ("rows", "results", "done")
+
+    def __init__(self, rows: List[Row]):
+        self.rows = rows
+        self.results: List[Optional[Tuple[float, float]]] = [None] * len(rows)
+        self.done = threading.Event()
+
+
+class EvaluationError(RuntimeError):
+    """
+    A row could not be evaluated (the service answers 500), or the service was closed before evaluating it.
+    """
+
+
+class MicroBatcher:
+    """
+    Merge the rows submitted by concurrent requests and evaluate them together (see module docstring).
+    """
+
+    def __init__(self, cache: ResultCache, window: float = SERVICE_BATCH_WINDOW, max_batch: int = SERVICE_MAX_BATCH):
+        self.cache = cache
+        self.window = window
+        self.max_batch = max_batch
+        # Counters
+        self.nb_batches = 0
+        self.nb_rows = 0
+        self.nb_evaluated = 0
+        self._queue: deque = deque()
+        self._not_empty = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, rows: List[Row]) -> List[Tuple[float, float]]:
+        """
+        Evaluate `rows` (blocking until the batch containing them is evaluated).
+
+        :return: List of (enemy_dead, remaining_hp), or the exception of each row which could not be evaluated, in the
+            order of `rows`
+        :raises: EvaluationError if the batcher is closed
+        """
+        pending = _Pending(rows)
+        # Rows already in the cache do not wait for a batch
+        missing = False
+        for index, row in enumerate(rows):
+            pending.results[index] = self.cache.get(row)
+            missing = missing or pending.results[index] is None
+        if not missing:
+            return pending.results
+
+        with self._not_empty:
+            if not self._running:
+                raise EvaluationError("Service closed")
+            self._queue.append(pending)
+            self._not_empty.notify()
+        pending.done.wait()
+        return pending.results
+
+    def close(self) -> None:
+        """
+        Stop the batcher: the requests still queued are woken up with an error.
+        """
+        with self._not_empty:
+            self._running = False
+            self._not_empty.notify()
+        self._thread.join()
+        with self._not_empty:
+            queued = list(self._queue)
+            self._queue.clear()
+        for pending in queued:
+            pending.results = [EvaluationError("Service closed") if result is None else result
+                               for result in pending.results]
+            pending.done.set()
+
+    def _loop(self) -> None:
+        while True:
+            # 1/ Wait for a first request, then collect the requests arriving within the window
+            with self._not_empty:
+                while not self._queue and self._running:
+                    self._not_empty.wait()
+                if not self._running:
+                    return
+            deadline = time.perf_counter() + self.window
+            batch, size = [], 0
+            while size < self.max_batch:
+                with self._not_empty:
+                    if not self._queue:
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0:
+                            break
+                        self._not_empty.wait(remaining)
+                        continue
+                    pending = self._queue.popleft()
+                batch.append(pending)
+                size += len(pending.rows)
+
+            # 2/ Evaluate the rows missing in the cache, once each
+            self._evaluate(batch)
+
+    def _evaluate(self, batch: List[_Pending]) -> None:
+        unique: Dict[Row, None] = {}
+        for pending in batch:
+            for row, result in zip(pending.rows, pending.results):
+                if result is None:
+                    unique[row] = None
+        rows = list(unique)
+        try:
+            results = dict(zip(rows, evaluate_batch(rows)))
+        except Exception:
+            # One row failing must not fail the other requests of the batch: rows evaluated one by one, the error of
+            # a row returned to the requests containing it only
+            results = {}
+            for row in rows:
+                try:
+                    results[row] = evaluate_batch([row])[0]
+                except Exception as e:
+                    results[row] = e
+        for row, result in results.items():
+            if not isinstance(result, Exception):
+                self.cache.put(row, result)
+
+        self.nb_batches += 1
+        self.nb_rows += sum(len(pending.rows) for pending in batch)
+        self.nb_evaluated += len(rows)
+        for pending in batch:
+            pending.results = [results[row] if result is None else result
+                               for row, result in zip(pending.rows, pending.results)]
+            pending.done.set()
+
+
+class LatencyStats:
+    """
+    Latencies of the last requests (bounded) and throughput since the start.
+    """
+
+    def __init__(self, window: int = SERVICE_LATENCY_WINDOW):
+        self.start = time.perf_counter()
+        self.nb_requests = 0
+        self._latencies: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self.nb_requests += 1
+            self._latencies.append(latency)
+
+    def percentile(self, q: float) -> float:
+        """
+        Percentile `q` (in [0, 100]) of the latencies (s), 0 if no request.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return 0.
+        return latencies[min(int(q / 100 * len(latencies)), len(latencies) - 1)]
+
+    @property
+    def throughput(self) -> float:
+        return self.nb_requests / (time.perf_counter() - self.start)
+
+
+class EvaluationService:
+    """
+    State shared by the request handlers: micro-batcher, result cache and counters.
+    """
+
+    def __init__(self, window: float = SERVICE_BATCH_WINDOW, max_batch: int = SERVICE_MAX_BATCH,
+                 cache_size: int = SERVICE_CACHE_SIZE):
+        self.cache = ResultCache(cache_size)
+        self.batcher = MicroBatcher(self.cache, window, max_batch)
+        self.latency = LatencyStats()
+
+    def evaluate(self, requests: List[dict]) -> List[dict]:
+        """
+        Evaluate requests (JSON dicts with keys "weapon", "target", "rules").
+
+        :raises: ValueError / TypeError if a request is invalid, EvaluationError if a row could not be evaluated
+        """
+        results = self.batcher.submit([parse_row(request) for request in requests])
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                # A new exception per request: the error of a row may be shared by the requests of several threads
+                raise EvaluationError(f"Row {index}: {result!r}") from result
+        return [{"enemy_dead": enemy_dead, "remaining_hp": remaining_hp} for enemy_dead, remaining_hp in results]
+
+    def stats(self) -> dict:
+        return {"requests": self.latency.nb_requests,
+                "throughput": self.latency.throughput,
+                "latency_p50_ms": 1000 * self.latency.percentile(50),
+                "latency_p99_ms": 1000 * self.latency.percentile(99),
+                "batches": self.batcher.nb_batches,
+                "rows": self.batcher.nb_rows,
+                "rows_evaluated": self.batcher.nb_evaluated,
+                "cache_size": len(self.cache),
+                "cache_hits": self.cache.hits,
+                "cache_misses": self.cache.misses}
+
+    def close(self) -> None:
+        self.batcher.close()
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    Handler of the endpoints. The service is `self.server.service`.
+    """
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send(200, self.server.service.stats())
+        else:
+            self._send(404, {"error": f"Unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        service = self.server.service
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path == "/evaluate":
+                content = service.evaluate([body])[0]
+            elif self.path == "/evaluate_batch":
+                content = {"results": service.evaluate(body["rows"])}
+            else:
+                self._send(404, {"error": f"Unknown endpoint {self.path}"})
+                return
+        except (ValueError, TypeError, KeyError) as e:
+            self._send(400, {"error": str(e)})
+            return
+        except Exception as e:
+            # Always answer (else the connection is dropped without response)
+            self._send(500, {"error": f"Internal error: {e}"})
+            return
+        # Recorded before answering: the counters are up to date when the client gets the result
+        service.latency.record(time.perf_counter() - start)
+        self._send(200, content)
+
+    def _send(self, code: int, content: dict) -> None:
+        data = json.dumps(content).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Silent (the counters are in /stats)
+        pass
+
+
+def parse_row(request: dict) -> Row:
+    """
+    Profiles of a request: `{"weapon": {...}, "target": {...}, "rules": {...}}` (each one optional).
+
+    :raises: ValueError / TypeError if an argument is invalid or unknown
+    """
+    if not isinstance(request, dict):
+        raise ValueError(f"Expected a JSON object, got {request!r}")
+    unknown = set(request) - {"weapon", "target", "rules"}
+    if unknown:
+        raise ValueError(f"Unknown keys: {sorted(unknown)}, expected 'weapon', 'target' and 'rules'")
+    return (WeaponProfile(**request.get("weapon", {})),
+            TargetProfile(**request.get("target", {})),
+            RuleSet(**request.get("rules", {})))
+
+
+def make_server(host: str = SERVICE_HOST, port: int = SERVICE_PORT,
+                service: EvaluationService = None) -> ThreadingHTTPServer:
+    """
+    Create the HTTP server (port 0: any free port, see `server.server_address`). Run it with `serve_forever()`.
+    """
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.daemon_threads = True
+    server.service = service or EvaluationService()
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON evaluation service")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    args = parser.parse_args()
+
+    http_server = make_server(args.host, args.port)
+    print(f"Serving on http://{args.host}:{http_server.server_address[1]}")
+    try:
+        http_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        http_server.server_close()
+        http_server.service.close()
@@ -0,0 +1,173 @@
+"""
+Inverse solver of the workflow: find the minimum value of a parameter (nb figs, S, AP, D or BS) needed to reach a goal.
+
+Goals:
+* average based: kill at least `min_dead` enemies on average (with `launch_workflow`),
+* probability based: kill at least `min_dead` enemies with a probability >= `probability` (Monte Carlo, see
+`montecarlo.py`, with common random numbers: each evaluation consumes the same uniforms).
+
+Results are monotonic in each parameter (more figs, S, AP, D or a better BS never kill less): the solver runs an
+exponential search (1, 2, 4, 8... steps) then a binary search, instead of a brute-force loop.
+Evaluated points are cached (profiles are hashable, see `profile.py`), so solving against many targets or many goals
+re-uses the previous evaluations.
+
+Usage:
+```
+# How many figurines to kill 1 terminator with 80% probability ?
+solve(weapon, terminator, rules, parameter="nb_figs", min_dead=1, probability=0.8)
+# Minimum AP to kill at least 3 terminators on average ?
+solve(weapon, terminator, rules, parameter="weapon_ap", min_dead=3)
+```
+"""
+import sys
+from functools import lru_cache
+from os.path import dirname, abspath
+from typing import Callable, Dict, Optional
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.dice import compute_average_enemy_dead
+from common.kernel import evaluate
+from common.montecarlo import UniformStream, simulate_trial
+from common.profile import WeaponProfile, TargetProfile, RuleSet
+from common.utils import MONTE_CARLO_TRIALS, MONTE_CARLO_SEED
+
+# Parameters that can be solved (all of them are attributes of `WeaponProfile`)
+PARAMETERS = ("nb_figs", "weapon_s", "weapon_ap", "weapon_d", "hit_threshold")
+
+# Maximum number of figurines searched
+MAX_NB_FIGS = 1000
+
+# Size of the caches of evaluated points
+CACHE_SIZE = 65536
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def average_dead(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet) -> float:
+    """
+    Average number of dead enemies (including the HP lost by the last figurine), cached.
+    """
+    enemy_dead, remaining_hp = evaluate(weapon, target, rules)
+    return compute_average_enemy_dead(enemy_dead=enemy_dead, remaining_hp=remaining_hp, enemy_hp=target.enemy_hp)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def kill_probability(weapon: WeaponProfile, target: TargetProfile, rules: RuleSet, min_dead: int,
+                     nb_trials: int = MONTE_CARLO_TRIALS, seed: int = MONTE_CARLO_SEED) -> float:
+    """
+    Probability to kill at least `min_dead` enemies (Monte Carlo with common random numbers), cached.
+    """
+    success = 0
+    for k in range(nb_trials):
+        enemy_dead, _ = simulate_trial(weapon, target, rules, UniformStream(f"{seed}-{k}"))
+        success += enemy_dead >= min_dead
+    return success / nb_trials
+
+
+def solve(weapon: WeaponProfile,
+          target: TargetProfile,
+          rules: RuleSet,
+          parameter: str = "nb_figs",
+          min_dead: float = 1,
+          probability: float = None,
+          max_value: int = None,
+          nb_trials: int = MONTE_CARLO_TRIALS) -> Optional[int]:
+    """
+    Find the minimum value of `parameter` reaching the goal (for `hit_threshold`: the worst BS reaching the goal).
+
+    :param weapon: Attacking unit (`parameter` is modified, the other characteristics are kept)
+    :param target: Target
+    :param rules: Criticals, re-rolls and weapon abilities
+    :param parameter: One of `PARAMETERS`
+    :param min_dead: Number of dead enemies to reach
+    :param probability: If None, `min_dead` is an average. Else, probability to kill at least `min_dead` enemies.
+    :param max_value: Maximum value searched (default: value beyond which the parameter has no effect). Not for
+        `hit_threshold` (all the BS from 6+ to 2+ are searched)
+    :param nb_trials: Number of Monte Carlo trials (probability goals only)
+
+    :return: The value of `parameter`, or None if the goal cannot be reached
+    """
+    if parameter not in PARAMETERS:
+        raise ValueError(f"Unknown parameter: {parameter}, expected one of {PARAMETERS}")
+    if parameter == "hit_threshold" and max_value is not None:
+        raise ValueError("max_value is not supported for hit_threshold (the search covers all the BS, 6+ to 2+)")
+    if probability is not None and not 0 < probability <= 1:
+        raise ValueError(f"Probability shall be in ]0, 1], get {probability}")
+
+    def reached(value: int) -> bool:
+        w = weapon.replace(**{parameter: value})
+        if probability is None:
+            return average_dead(w, target, rules) >= min_dead
+        return kill_probability(w, target, rules, min_dead, nb_trials) >= probability
+
+    if parameter == "hit_threshold":
+        # Decreasing parameter: search x = 7 - BS, from BS 6+ (x=1) to BS 2+ (x=5)
+        x = _first_reached(lambda x: reached(7 - x), 1, 5)
+        return None if x is None else 7 - x
+
+    lowest, highest = {"nb_figs": (1, MAX_NB_FIGS),
+                       # S >= 2 * T: wound at 2+ (no effect beyond)
+                       "weapon_s": (1, 2 * target.enemy_toughness),
+                       # AP 6: no save (except invulnerable save)
+                       "weapon_ap": (0, 6),
+                       # Damage: each point goes through the FNP with a probability of at least 1/6 (FNP 2+). At
+                       # 6 * HP, a failed save deals at least HP on average (averages: one kill per failed save,
+                       # no effect beyond), probability goals only improve marginally beyond
+                       "weapon_d": (1, 6 * target.enemy_hp)}[parameter]
+    if max_value is not None:
+        highest = max_value
+
+    return _first_reached(reached, lowest, highest)
+
+
+def solve_batch(weapon: WeaponProfile,
+                targets: Dict[str, TargetProfile],
+                rules: RuleSet,
+                **kwargs) -> Dict[str, Optional[int]]:
+    """
+    Solve the same goal against many targets (see `solve` for the arguments).
+
+    :param targets: Dict {<name>: <target>} (ex: built from `opponent_datasheets`)
+    :return: Dict {<name>: <value of the parameter or None>}
+    """
+    return {name: solve(weapon, target, rules, **kwargs) for name, target in targets.items()}
+
+
+def _first_reached(reached: Callable[[int], bool], lowest: int, highest: int) -> Optional[int]:
+    """
+    Find the first int in [`lowest`, `highest`] verifying `reached` (monotonic: False, ..., False, True, ... True).
+
+    Exponential search (lowest, lowest + 1, lowest + 3, lowest + 7...) then binary search.
+
+    :return: The first value verifying `reached`, or None if `reached(highest)` is False
+    """
+    if reached(lowest):
+        return lowest
+
+    # Exponential search: find an upper bound
+    failed = lowest  # Highest value known as not reached
+    step = 1
+    while True:
+        value = min(lowest + step, highest)
+        if reached(value):
+            break
+        if value == highest:
+            return None
+        failed = value
+        step *= 2
+
+    # Binary search in ]failed, value]
+    while value - failed > 1:
+        middle = (failed + value) // 2
+        if reached(middle):
+            value = middle
+        else:
+            failed = middle
+    return value
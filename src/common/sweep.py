@@ -0,0 +1,333 @@
+"""
+Parameter sweeps over `launch_workflow`, streamed to disk.
+
+A sweep is defined by a grid: a dict `{<launch_workflow argument>: [<values>]}`. Every combination of the grid is
+evaluated, and results are written incrementally as fixed-size record batches:
+* Arrow IPC (`.arrow`) or Parquet (`.parquet`) if `pyarrow` is installed (optional, not shipped in the app),
+* CSV (`.csv`) otherwise.
+
+Memory is bounded by one batch: rows are never collected in a list nor a DataFrame.
+
+Input parameters are dictionary-encoded: each input column only stores the index of the value in the grid
+(the dictionary being the list of values of the grid). Results are stored as float32 or float64.
+
+Usage: On a terminal:
+```
+python sweep.py grid.json output.arrow
+```
+With `grid.json` containing for instance `{"weapon_s": [3, 4, 5], "weapon_ap": [0, 1, 2], "enemy_toughness": [4]}`.
+"""
+import csv
+import json
+import sys
+from abc import ABC, abstractmethod
+from array import array
+from itertools import product
+from os.path import dirname, abspath, splitext
+from typing import Dict, Iterator, List, Tuple
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.engine import evaluate
+from common.profile import profiles_from_kwargs
+from common.utils import SWEEP_BATCH_SIZE, SWEEP_RESULT_DTYPE
+
+# pyarrow is optional (heavy lib): CSV is used as fallback
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Name of the result columns (outputs of `launch_workflow`)
+RESULT_COLUMNS = ("enemy_dead", "remaining_hp")
+
+# `array` typecode for each result dtype
+_TYPECODES = {"float32": "f", "float64": "d"}
+
+
+def iter_grid_indices(grid: Dict[str, list]) -> Iterator[Tuple[int, ...]]:
+    """
+    Iterate over all the combinations of `grid`, as indices of the values (one index per key of `grid`).
+
+    Exemple: grid = {"weapon_s": [3, 4], "weapon_ap": [0, 1]} --> (0, 0), (0, 1), (1, 0), (1, 1)
+
+    :param grid: Dict {<launch_workflow argument>: [<values>]}
+    :return: Iterator over tuples of indices
+    """
+    return product(*[range(len(values)) for values in grid.values()])
+
+
+def iter_record_batches(grid: Dict[str, list],
+                        batch_size: int = SWEEP_BATCH_SIZE,
+                        result_dtype: str = SWEEP_RESULT_DTYPE) -> Iterator[Dict[str, array]]:
+    """
+    Evaluate `launch_workflow` (through `engine.evaluate`) on each combination of `grid`, and yield the results by
+    batch of `batch_size` rows.
+
+    Each batch is a dict of columns:
+    * one column per key of `grid`, containing the index of the value in the grid (dictionary encoding, int32)
+    * one column per result (see `RESULT_COLUMNS`), typed as `result_dtype`
+
+    Pay attention: the batch yielded is re-used for the next one (memory bounded by one batch). Write it before
+    asking the next one.
+
+    :param grid: Dict {<launch_workflow argument>: [<values>]}
+    :param batch_size: Number of rows per batch
+    :param result_dtype: "float32" or "float64"
+    :return: Iterator over batches
+    """
+    if result_dtype not in _TYPECODES:
+        raise ValueError(f"Unknown result dtype: {result_dtype}, expected one of {list(_TYPECODES)}")
+    if batch_size < 1:
+        raise ValueError(f"Batch size shall be strictly positive, get {batch_size}")
+
+    keys = list(grid.keys())
+    values = [list(v) for v in grid.values()]
+
+    batch = {k: array("i") for k in keys}
+    batch.update({k: array(_TYPECODES[result_dtype]) for k in RESULT_COLUMNS})
+
+    for indices in iter_grid_indices(grid):
+        params = {k: values[i][index] for i, (k, index) in enumerate(zip(keys, indices))}
+
+        result = evaluate(*profiles_from_kwargs(**params))
+
+        for k, index in zip(keys, indices):
+            batch[k].append(index)
+        batch["enemy_dead"].append(result.enemy_dead)
+        batch["remaining_hp"].append(result.remaining_hp)
+
+        if len(batch["enemy_dead"]) == batch_size:
+            yield batch
+            # Reset the buffers (keep the same objects)
+            for column in batch.values():
+                del column[:]
+
+    if len(batch["enemy_dead"]) > 0:
+        yield batch
+
+
+# Writers
+# ----------------------------------------------------------------------------
+class SweepWriter(ABC):
+    """
+    Base class of the sweep writers (abstract: `write_batch` and `close`). Write record batches (see
+    `iter_record_batches`) one by one.
+
+    Usage:
+    ```
+    with CSVWriter(path, grid) as writer:
+        for batch in iter_record_batches(grid):
+            writer.write_batch(batch)
+    ```
+    """
+    def __init__(self, path: str, grid: Dict[str, list], result_dtype: str = SWEEP_RESULT_DTYPE):
+        """
+        :param path: Path of the file to write
+        :param grid: Dict {<launch_workflow argument>: [<values>]} (used as dictionary of the input columns)
+        :param result_dtype: "float32" or "float64"
+        """
+        self.path = path
+        self.grid = {k: list(v) for k, v in grid.items()}
+        self.result_dtype = result_dtype
+        self.nb_rows = 0
+
+    @abstractmethod
+    def write_batch(self, batch: Dict[str, array]) -> None:
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CSVWriter(SweepWriter):
+    """
+    Write a sweep as a `;`-separated CSV (same separator as `data/enemy.csv`). Fallback when `pyarrow` is missing.
+
+    NB: CSV cannot store dictionaries: the values of the grid are written in plain text.
+    """
+    def __init__(self, path: str, grid: Dict[str, list], result_dtype: str = SWEEP_RESULT_DTYPE):
+        super().__init__(path, grid, result_dtype)
+        self._file = open(path, "w", newline="")
+        self._writer = csv.writer(self._file, delimiter=";")
+        self._writer.writerow(list(self.grid.keys()) + list(RESULT_COLUMNS))
+
+    def write_batch(self, batch: Dict[str, array]) -> None:
+        columns = [[values[i] for i in batch[k]] for k, values in self.grid.items()]
+        columns += [batch[k] for k in RESULT_COLUMNS]
+        self._writer.writerows(zip(*columns))
+        self.nb_rows += len(batch[RESULT_COLUMNS[0]])
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ArrowWriter(SweepWriter):
+    """
+    Common part of Arrow IPC and Parquet writers: convert a batch into a `pyarrow.RecordBatch` (without copy of the
+    buffers).
+    """
+    def __init__(self, path: str, grid: Dict[str, list], result_dtype: str = SWEEP_RESULT_DTYPE):
+        if pa is None:
+            raise ImportError("pyarrow is required to write Arrow IPC / Parquet files (or use a `.csv` output)")
+        super().__init__(path, grid, result_dtype)
+
+        # Dictionaries: one per input column. Mixed values (ex: 3 and "D6") are stored as str.
+        self._dictionaries = {k: _to_arrow_dictionary(values) for k, values in self.grid.items()}
+        self._result_type = pa.float32() if result_dtype == "float32" else pa.float64()
+
+        fields = [pa.field(k, pa.dictionary(pa.int32(), d.type)) for k, d in self._dictionaries.items()]
+        fields += [pa.field(k, self._result_type) for k in RESULT_COLUMNS]
+        self.schema = pa.schema(fields)
+
+    def _to_record_batch(self, batch: Dict[str, array]):
+        n = len(batch[RESULT_COLUMNS[0]])
+        columns = []
+        for k, dictionary in self._dictionaries.items():
+            indices = pa.Array.from_buffers(pa.int32(), n, [None, pa.py_buffer(batch[k])])
+            columns.append(pa.DictionaryArray.from_arrays(indices, dictionary))
+        for k in RESULT_COLUMNS:
+            columns.append(pa.Array.from_buffers(self._result_type, n, [None, pa.py_buffer(batch[k])]))
+
+        self.nb_rows += n
+        return pa.RecordBatch.from_arrays(columns, schema=self.schema)
+
+
+class ArrowIPCWriter(_ArrowWriter):
+    """
+    Write a sweep as an Arrow IPC file (one record batch per batch, read lazily by `open_sweep`).
+    """
+    def __init__(self, path: str, grid: Dict[str, list], result_dtype: str = SWEEP_RESULT_DTYPE):
+        super().__init__(path, grid, result_dtype)
+        self._writer = pa.ipc.new_file(path, self.schema)
+
+    def write_batch(self, batch: Dict[str, array]) -> None:
+        self._writer.write_batch(self._to_record_batch(batch))
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+class ParquetWriter(_ArrowWriter):
+    """
+    Write a sweep as a Parquet file (one row group per batch).
+    """
+    def __init__(self, path: str, grid: Dict[str, list], result_dtype: str = SWEEP_RESULT_DTYPE):
+        super().__init__(path, grid, result_dtype)
+        self._writer = pq.ParquetWriter(path, self.schema)
+
+    def write_batch(self, batch: Dict[str, array]) -> None:
+        self._writer.write_batch(self._to_record_batch(batch))
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+# File extension -> writer
+WRITERS = {".csv": CSVWriter, ".arrow": ArrowIPCWriter, ".ipc": ArrowIPCWriter, ".parquet": ParquetWriter}
+
+
+def _to_arrow_dictionary(values: list):
+    """
+    Build the arrow dictionary of an input column. If all the values have the same type, keep it, else use str.
+    """
+    types = {type(v) for v in values if v is not None}
+    if len(types) > 1:
+        values = [None if v is None else str(v) for v in values]
+    return pa.array(values)
+
+
+# Main functions
+# ----------------------------------------------------------------------------
+def run_sweep(grid: Dict[str, list],
+              path: str,
+              batch_size: int = SWEEP_BATCH_SIZE,
+              result_dtype: str = SWEEP_RESULT_DTYPE,
+              verbose: bool = False) -> int:
+    """
+    Evaluate `launch_workflow` on each combination of `grid` and stream results into `path`.
+
+    The format is defined by the extension of `path` (see `WRITERS`): ".arrow"/".ipc", ".parquet" or ".csv".
+
+    :param grid: Dict {<launch_workflow argument>: [<values>]}
+    :param path: Path of the output file
+    :param batch_size: Number of rows per batch
+    :param result_dtype: "float32" or "float64"
+    :param verbose: Set to True to print progression
+
+    :return: Number of rows written
+    """
+    extension = splitext(path)[1].lower()
+    if extension not in WRITERS:
+        raise ValueError(f"Unknown sweep format: '{extension}', expected one of {list(WRITERS)}")
+
+    with WRITERS[extension](path, grid, result_dtype) as writer:
+        for batch in iter_record_batches(grid, batch_size=batch_size, result_dtype=result_dtype):
+            writer.write_batch(batch)
+            if verbose: print(f"[DEBUG] {writer.nb_rows} rows written into {path}")
+
+    return writer.nb_rows
+
+
+def open_sweep(path: str):
+    """
+    Open a sweep written by `run_sweep` as a lazy `pyarrow.dataset.Dataset`: nothing is loaded until scanned.
+
+    Filters and column projections are pushed down to the file (only the needed Parquet row groups / Arrow IPC
+    record batches are read), ex:
+    ```
+    import pyarrow.dataset as ds
+    dataset = open_sweep("sweep.parquet")
+    dataset.to_table(columns=["weapon_s", "enemy_dead"], filter=ds.field("enemy_dead") > 3)
+    ```
+
+    :param path: Path of an Arrow IPC or Parquet file
+    :return: A `pyarrow.dataset.Dataset`
+    """
+    if pa is None:
+        raise ImportError("pyarrow is required to read Arrow IPC / Parquet files")
+
+    file_format = "parquet" if splitext(path)[1].lower() == ".parquet" else "ipc"
+    return ds.dataset(path, format=file_format)
+
+
+def load_grid(path: str) -> Dict[str, List]:
+    """
+    Load a grid from a JSON file: `{<launch_workflow argument>: [<values>]}`. A single value is accepted instead of a
+    list (ex: `{"enemy_toughness": 4}`).
+    """
+    with open(path) as file:
+        grid = json.load(file)
+    return {k: v if isinstance(v, list) else [v] for k, v in grid.items()}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stream a sweep of `launch_workflow` into a file")
+    parser.add_argument("grid", help="JSON file containing the grid {<argument>: [<values>]}")
+    parser.add_argument("output", help="Output file (.arrow, .parquet or .csv)")
+    parser.add_argument("--batch-size", type=int, default=SWEEP_BATCH_SIZE)
+    parser.add_argument("--dtype", default=SWEEP_RESULT_DTYPE, choices=list(_TYPECODES))
+    args = parser.parse_args()
+
+    nb_rows = run_sweep(load_grid(args.grid), args.output, batch_size=args.batch_size, result_dtype=args.dtype,
+                        verbose=True)
+    print(f"Successfuly written {nb_rows} rows into '{args.output}'")
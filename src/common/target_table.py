@@ -0,0 +1,118 @@
+"""
+Per-target constants of `launch_workflow`, computed once per target instead of at each call:
+* effective save after AP 0 to `MAX_AP` (AP applied, then invulnerable save if better),
+* probability to fail this save,
+* probability to fail the feel no pain,
+* wound threshold for each strength (from 1 to 2 * toughness, above: always 2+).
+
+The tables of the datasheets of `data/enemy.csv` are built with the datasheets (see `build_enemy.py`) and shipped in
+`enemy.py` (`opponent_tables`). Other targets (custom ones) are computed at their first use, then cached.
+
+Usage:
+```
+table = target_table(TargetProfile.from_datasheet(opponent_datasheets["marine"]))
+table.failed_save(weapon_ap)  # Probability to fail the save against AP `weapon_ap`
+table.wound(weapon_s)  # Wound threshold (4 means 4+)
+```
+"""
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+from os.path import dirname, abspath
+from typing import Dict, Tuple
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.dice import proba_dice, get_wound_threshold
+from common.profile import TargetProfile
+
+# Above, the save is always failed (7+)
+MAX_AP = 6
+
+
+@dataclass(frozen=True)
+class TargetTable:
+    # Index: AP (0 to `MAX_AP`)
+    save: Tuple[int, ...]
+    proba_failed_save: Tuple[float, ...]
+    proba_fnp_failed: float
+    # Index: strength - 1 (strength from 1 to 2 * toughness)
+    wound_threshold: Tuple[int, ...]
+
+    def failed_save(self, weapon_ap: int) -> float:
+        return self.proba_failed_save[min(weapon_ap, MAX_AP)]
+
+    def wound(self, weapon_s: int) -> int:
+        return self.wound_threshold[weapon_s - 1] if weapon_s <= len(self.wound_threshold) else 2
+
+    def as_dict(self) -> dict:
+        """
+        Content written into `enemy.py` (see `build_enemy.py`).
+        """
+        return {"save": list(self.save),
+                "failed save": list(self.proba_failed_save),
+                "fnp failed": self.proba_fnp_failed,
+                "wound threshold": list(self.wound_threshold)}
+
+    @classmethod
+    def from_dict(cls, content: dict) -> "TargetTable":
+        return cls(save=tuple(content["save"]),
+                   proba_failed_save=tuple(content["failed save"]),
+                   proba_fnp_failed=content["fnp failed"],
+                   wound_threshold=tuple(content["wound threshold"]))
+
+
+def compute_target_table(target: TargetProfile) -> TargetTable:
+    """
+    Compute the constants of `target` (same steps as `workflow._launch_workflow`).
+    """
+    save = tuple(min(min(target.svg_enemy + weapon_ap, 7), target.svg_invul_enemy) for weapon_ap in range(MAX_AP + 1))
+    return TargetTable(save=save,
+                       proba_failed_save=tuple(proba_dice(svg, False) for svg in save),
+                       proba_fnp_failed=proba_dice(target.fnp_enemy, False),
+                       wound_threshold=tuple(get_wound_threshold(weapon_s, target.enemy_toughness)
+                                             for weapon_s in range(1, 2 * target.enemy_toughness + 1)))
+
+
+@lru_cache(maxsize=None)
+def target_table(target: TargetProfile) -> TargetTable:
+    """
+    Constants of `target`: the shipped table if `target` is a datasheet of `enemy.py`, else computed.
+    """
+    shipped = _shipped_tables().get(_key(target))
+    if shipped is not None:
+        return TargetTable.from_dict(shipped)
+    return compute_target_table(target)
+
+
+# Utils
+# ----------------------------------------------------------------------------
+def _key(target: TargetProfile) -> tuple:
+    """
+    Characteristics the table depends on (not the health points).
+    """
+    return target.enemy_toughness, target.svg_enemy, target.svg_invul_enemy, target.fnp_enemy
+
+
+@lru_cache(maxsize=1)
+def _shipped_tables() -> Dict[tuple, dict]:
+    """
+    {<characteristics of a datasheet>: <shipped table>}, for the datasheets having a shipped table.
+
+    `enemy.py` is imported here, not at the top of the module: `build_enemy.py` (which writes `enemy.py`) uses this
+    module, and must run without it.
+    """
+    # `enemy.py` not built yet, or built by an older version of `build_enemy.py` (no tables)
+    try:
+        from common.enemy import opponent_datasheets, opponent_tables
+    except ImportError:
+        return {}
+    return {_key(TargetProfile.from_datasheet(carac)): opponent_tables[name]
+            for name, carac in opponent_datasheets.items() if name in opponent_tables}
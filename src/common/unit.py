@@ -0,0 +1,278 @@
+"""
+Target units mixing several groups of models (e.g. a captain attached to terminators, a sergeant with more wounds).
+
+Each group has its own profile (W, save, invulnerable save, FNP). The toughness of the unit is the one of the majority
+of its models (ties: the highest). Wounds are allocated group after group, in the order of the unit (bodyguards
+first, leader last): a group takes all the wounds until it is wiped out. Damage exceeding the HP of a model is lost.
+
+Computation:
+1. distribution of the number of wounds (majority toughness), each wound being a devastating wound with probability q
+(NB: wounds are considered exchangeable, i.e. devastating wounds are spread uniformly among the wounds),
+2. per group, dynamic programming over its allocation state (dead models, damage on the current model), wound after
+wound: distribution of the wound that wipes the group out, and of the states while it is alive. These tables only
+depend on the group (and the weapon): they are cached, so changing the leader does not recompute the bodyguards,
+3. unit: the wounds left when a group is wiped out go to the next group.
+
+Usage:
+```
+unit = TargetUnit((ModelGroup(terminator, nb_models=5, name="terminator"), ModelGroup(captain, 1, "captain")))
+result = unit_distribution(weapon, unit, rules)
+result.mean_dead, result.wipe_probabilities  # [P(terminators wiped out), P(captain dead)]
+```
+"""
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+from os.path import dirname, abspath
+from typing import Dict, List, Tuple
+
+# Go into root dir to enable imports
+# ENV PATH
+SRC_PATH = dirname(abspath(__file__))
+# <absolute_path>/40k-dice-stats-computing/src/common/
+ROOT_PATH = dirname(SRC_PATH)
+# <absolute_path>/40k-dice-stats-computing/src/
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_PATH)
+from common.dice import DiceExpression, proba_dice, dice_expression_pmf, fnp_damage_pmf, average_dice_expression
+from common.distribution import attack_event_pmf, stage_probas, compound, power, mean
+from common.profile import WeaponProfile, TargetProfile, RuleSet
+from common.utils import DISTRIBUTION_EPSILON
+
+# Size of the cache of group tables
+CACHE_SIZE = 4096
+
+# Allocation state of a unit: (index of the current group, dead models in the group, damage on the current model)
+State = Tuple[int, int, int]
+
+
+@dataclass(frozen=True)
+class ModelGroup:
+    """
+    Group of identical models of a unit.
+    """
+    # Profile of the models (`enemy_hp`: W of one model)
+    target: TargetProfile
+    nb_models: int
+    name: str = ""
+
+
+@dataclass(frozen=True)
+class TargetUnit:
+    """
+    Unit made of several groups of models, in the order of allocation.
+    """
+    groups: Tuple[ModelGroup, ...]
+
+    @classmethod
+    def from_datasheets(cls, groups: List[Tuple[str, dict, int]]) -> "TargetUnit":
+        """
+        Build a unit from rows of `opponent_datasheets`.
+
+        :param groups: List of (<name>, <datasheet>, <nb models>), in the order of allocation
+        """
+        return cls(tuple(ModelGroup(TargetProfile.from_datasheet(carac), nb_models, name)
+                         for name, carac, nb_models in groups))
+
+    @property
+    def toughness(self) -> int:
+        """
+        Toughness of the majority of the models (ties: the highest).
+        """
+        count = {}
+        for group in self.groups:
+            count[group.target.enemy_toughness] = count.get(group.target.enemy_toughness, 0) + group.nb_models
+        return max(count, key=lambda t: (count[t], t))
+
+    @property
+    def nb_models(self) -> int:
+        return sum(group.nb_models for group in self.groups)
+
+
+@dataclass(frozen=True)
+class UnitResult:
+    """
+    Distribution of the result of an attack on a unit.
+    """
+    # PMF of the number of dead models and of the HP lost
+    dead_pmf: Dict[int, float]
+    hp_lost_pmf: Dict[int, float]
+    # Per group: expected dead models and probability to be wiped out
+    expected_dead: Tuple[float, ...]
+    wipe_probabilities: Tuple[float, ...]
+    # Probability mass discarded (pruning): bound of the error on any probability (see `ExactResult.error`)
+    error: float = 0.
+
+    @property
+    def mean_dead(self) -> float:
+        return mean(self.dead_pmf)
+
+    @property
+    def mean_hp_lost(self) -> float:
+        return mean(self.hp_lost_pmf)
+
+    def kill_probability(self, min_dead: int) -> float:
+        """
+        Probability to kill at least `min_dead` models.
+        """
+        return sum(p for dead, p in self.dead_pmf.items() if dead >= min_dead)
+
+
+def unit_distribution(weapon: WeaponProfile, unit: TargetUnit, rules: RuleSet,
+                      epsilon: float = DISTRIBUTION_EPSILON) -> UnitResult:
+    """
+    Compute the distribution of the dead models of a mixed unit.
+
+    :param weapon: Attacking unit
+    :param unit: Target unit
+    :param rules: Criticals, re-rolls and weapon abilities
+    :param epsilon: Probabilities below `epsilon` are dropped
+
+    :return: `UnitResult`
+    """
+    # 1/ Wounds (majority toughness, no save: every wound is an event) and share of devastating wounds
+    # ------------------------------------------------------------------------------
+    no_save = TargetProfile(enemy_toughness=unit.toughness, svg_enemy=7, svg_invul_enemy=7, fnp_enemy=7, enemy_hp=1)
+    per_figurine = compound(dice_expression_pmf(weapon.weapon_a), attack_event_pmf(weapon, no_save, rules), epsilon)
+    wounds = power(per_figurine, weapon.nb_figs, epsilon)
+    deva_share = _devastating_share(weapon, no_save, rules)
+
+    # 2/ Tables of the groups (cached)
+    # ------------------------------------------------------------------------------
+    max_wounds = wounds.max_value
+    tables = [group_table(group.target, group.nb_models, weapon.weapon_d, weapon.weapon_ap, deva_share, max_wounds,
+                          epsilon)
+              for group in unit.groups]
+
+    # 3/ Allocation, group after group: final state for each number of wounds
+    # ------------------------------------------------------------------------------
+    final, discarded = _final_states(tables, max_wounds)
+
+    dead_pmf, hp_lost_pmf = {}, {}
+    expected_dead = [0.] * len(unit.groups)
+    wipe = [0.] * len(unit.groups)
+    error = wounds.discarded
+    for nb_wounds, p_wounds in wounds.items():
+        error += p_wounds * discarded[nb_wounds]
+        for (g, dead, damage), p in final[0][nb_wounds].items():
+            p *= p_wounds
+            # Groups before `g` are wiped out
+            total_dead = sum(group.nb_models for group in unit.groups[:g]) + dead
+            hp_lost = sum(group.nb_models * group.target.enemy_hp for group in unit.groups[:g])
+            if g < len(unit.groups):
+                hp_lost += dead * unit.groups[g].target.enemy_hp + damage
+                expected_dead[g] += dead * p
+            for i in range(g):
+                expected_dead[i] += unit.groups[i].nb_models * p
+                wipe[i] += p
+            dead_pmf[total_dead] = dead_pmf.get(total_dead, 0.) + p
+            hp_lost_pmf[hp_lost] = hp_lost_pmf.get(hp_lost, 0.) + p
+
+    return UnitResult(dead_pmf=dead_pmf, hp_lost_pmf=hp_lost_pmf, expected_dead=tuple(expected_dead),
+                      wipe_probabilities=tuple(wipe), error=error)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def group_table(target: TargetProfile, nb_models: int, weapon_d: DiceExpression, weapon_ap: int, deva_share: float,
+                max_wounds: int, epsilon: float = DISTRIBUTION_EPSILON
+                ) -> Tuple[List[float], List[Dict[Tuple[int, int], float]], List[float]]:
+    """
+    Allocate up to `max_wounds` wounds to a group (fresh), cached.
+
+    Each wound: devastating (probability `deva_share`, no save) or saved with the save of the group. Then damage and
+    feel no pain of the group.
+
+    :param target: Profile of the models of the group
+    :param nb_models: Number of models of the group
+    :param weapon_d: Damage of the weapon
+    :param weapon_ap: AP of the weapon
+    :param deva_share: Probability that a wound is a devastating wound
+    :param max_wounds: Maximum number of wounds
+
+    :return: Tuple:
+        * list (index: number of wounds) of the probability that the group is wiped out by exactly this wound,
+        * list (index: number of wounds) of the states {(<dead>, <damage on the current model>): <probability>}
+        while the group is alive (states of probability below `epsilon` dropped),
+        * list (index: number of wounds) of the probability mass discarded (as `allocation_states`)
+    """
+    svg = min(target.svg_enemy + weapon_ap, 7, target.svg_invul_enemy)
+    damage_pmf = fnp_damage_pmf(dice_expression_pmf(weapon_d), proba_dice(target.fnp_enemy, succeed=False))
+    failed = deva_share + (1 - deva_share) * proba_dice(svg, succeed=False)
+    wound_pmf = {d: failed * p for d, p in damage_pmf.items()}
+    wound_pmf[0] = wound_pmf.get(0, 0.) + 1 - failed
+
+    wipe = [0.]
+    alive = [{(0, 0): 1.}]
+    discarded = [0.]
+    for _ in range(max_wounds):
+        new_states = {}
+        wiped = 0.
+        for (dead, wounds), p in alive[-1].items():
+            for damage, q in wound_pmf.items():
+                if wounds + damage >= target.enemy_hp:
+                    if dead + 1 == nb_models:
+                        wiped += p * q
+                        continue
+                    key = (dead + 1, 0)
+                else:
+                    key = (dead, wounds + damage)
+                new_states[key] = new_states.get(key, 0.) + p * q
+        wipe.append(wiped)
+        alive.append({key: p for key, p in new_states.items() if p >= epsilon})
+        discarded.append(discarded[-1] + sum(p for p in new_states.values() if p < epsilon))
+    return wipe, alive, discarded
+
+
+# Utils
+# ----------------------------------------------------------------------------
+def _devastating_share(weapon: WeaponProfile, no_save: TargetProfile, rules: RuleSet) -> float:
+    """
+    Share of the wounds that are devastating wounds (lethal hits are never devastating).
+    """
+    if not rules.devastating_wounds:
+        return 0.
+    probas = stage_probas(weapon, no_save, rules)
+    if rules.torrent:
+        wound_dice, lethal = 1., 0.
+    else:
+        sustain = average_dice_expression(rules.sustain_hit)
+        wound_dice = probas["hit"] + probas["crit_hit"] * (sustain + (0 if rules.lethal_hit else 1))
+        lethal = probas["crit_hit"] if rules.lethal_hit else 0.
+    wounds = wound_dice * (probas["wound"] + probas["crit_wound"]) + lethal
+    return wound_dice * probas["crit_wound"] / wounds if wounds > 0 else 0.
+
+
+def _final_states(tables: List[Tuple[List[float], List[dict], List[float]]],
+                  max_wounds: int) -> Tuple[List[List[Dict[State, float]]], List[float]]:
+    """
+    Final allocation state of the unit for each number of wounds, starting from each group.
+
+    f(g, r) = alive states of g after r wounds + sum over t <= r of P(g wiped out by the wound t) * f(g + 1, r - t)
+
+    The mass discarded follows the same recursion (from the mass discarded by each group table).
+
+    :return: Tuple:
+        * list (index: group) of lists (index: number of wounds) of {<state>: <probability>},
+        * list (index: number of wounds) of the probability mass discarded, starting from the first group
+    """
+    nb_groups = len(tables)
+    # All the groups wiped out: the remaining wounds are lost
+    final = [[{(nb_groups, 0, 0): 1.} for _ in range(max_wounds + 1)]]
+    final_discarded = [0.] * (max_wounds + 1)
+    for g in range(nb_groups - 1, -1, -1):
+        wipe, alive, discarded = tables[g]
+        following, following_discarded = final[0], final_discarded
+        current, final_discarded = [], []
+        for r in range(max_wounds + 1):
+            states = {(g, dead, damage): p for (dead, damage), p in alive[r].items()}
+            lost = discarded[r]
+            for t in range(1, r + 1):
+                if wipe[t] > 0:
+                    for key, p in following[r - t].items():
+                        states[key] = states.get(key, 0.) + wipe[t] * p
+                    lost += wipe[t] * following_discarded[r - t]
+            current.append(states)
+            final_discarded.append(lost)
+        final.insert(0, current)
+    return final, final_discarded
@@ -95,3 +95,124 @@ OPPONENT_DATA_PATH = join(ROOT_PATH, "data", "enemy.csv")
 # 0                 marine    3        7           7          4   2
 
 
+
+# Sweeps (see `sweep.py`)
+# ------------------------------------------
+# Number of rows per record batch written on disk (memory is bounded by one batch)
+SWEEP_BATCH_SIZE = 65536
+# Type of the result columns: "float32" or "float64"
+SWEEP_RESULT_DTYPE = "float64"
+
+# Monte Carlo (see `montecarlo.py`)
+# ------------------------------------------
+# Default number of simulated attacks
+MONTE_CARLO_TRIALS = 2000
+# Default seed (results are reproducible)
+MONTE_CARLO_SEED = 0
+
+# Approximation of large dice pools (see `approx.py`)
+# ------------------------------------------
+# Below this average number of attacks, the exact distribution is computed instead
+APPROX_MIN_ATTACKS = 60
+
+# Engine dispatcher (see `engine.py`)
+# ------------------------------------------
+# Default maximal error on the probabilities (absolute)
+ENGINE_ACCURACY = 0.01
+# Default latency budget of one evaluation (seconds)
+ENGINE_LATENCY = 0.2
+# Number of decisions kept in the log (used to recalibrate the cost model)
+ENGINE_LOG_SIZE = 10000
+
+# Distributions (see `distribution.py`)
+# ------------------------------------------
+# Probabilities below this threshold are dropped (the dropped mass is tracked as an error bound)
+DISTRIBUTION_EPSILON = 1e-12
+# Minimal fill rate (non zero probabilities / span of the support) to store a distribution as a dense array
+DISTRIBUTION_DENSE_FILL = 0.5
+
+# Progressive refinement (see `engine.iter_refinements`)
+# ------------------------------------------
+# Number of Monte Carlo trials per refinement step
+REFINE_BATCH_TRIALS = 250
+# Maximum number of Monte Carlo trials per row
+REFINE_MAX_TRIALS = 4000
+
+# Target assignment (see `assignment.py`)
+# ------------------------------------------
+# Above this number of attackers, the exact search over the subsets of attackers is replaced by a local search
+ASSIGNMENT_MAX_DP_ATTACKERS = 10
+
+# Weapon catalogs (see `catalog.py`)
+# ------------------------------------------
+# Default number of profiles of a ranking
+CATALOG_TOP_K = 10
+
+# Army builder (see `army.py`)
+# ------------------------------------------
+# Default number of solutions returned
+ARMY_TOP_SOLUTIONS = 5
+# Maximum number of non-dominated solutions kept per DP cell (multi-objective)
+ARMY_MAX_FRONT = 50
+
+# Evaluation service (see `service.py`)
+# ------------------------------------------
+# Address of the service (local only)
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8040
+# Requests received within this window (s) are evaluated together
+SERVICE_BATCH_WINDOW = 0.002
+# Maximum number of rows of a micro-batch
+SERVICE_MAX_BATCH = 1024
+# Number of results kept in the cache
+SERVICE_CACHE_SIZE = 65536
+# Number of latencies kept to compute the percentiles
+SERVICE_LATENCY_WINDOW = 10000
+
+# asyncio API (see `aio.py`)
+# ------------------------------------------
+# Maximum number of evaluations running at the same time
+AIO_MAX_CONCURRENCY = 8
+# Maximum number of requests pulled ahead of the consumer when streaming
+AIO_MAX_PENDING = 256
+
+# Distributed sweeps (see `cluster.py`)
+# ------------------------------------------
+# Address of the coordinator
+CLUSTER_HOST = "127.0.0.1"
+CLUSTER_PORT = 8041
+# Environment variable containing the shared secret of the coordinator and the workers (no default: see `cluster.py`)
+CLUSTER_AUTHKEY_ENV = "CLUSTER_AUTHKEY"
+# A chunk not returned within this time (s) is given to another worker
+CLUSTER_LEASE_TIMEOUT = 300.
+# Time (s) between 2 requests of an idle worker, or between 2 checks of the coordinator
+CLUSTER_POLL = 0.1
+# A chunk failing this number of times is abandoned
+CLUSTER_MAX_ATTEMPTS = 3
+
+# Datasheet index (see `datasheet_index.py`)
+# ------------------------------------------
+# Number of names proposed by the autocomplete
+DATASHEET_AUTOCOMPLETE_LIMIT = 10
+
+# Results table of the app (see `results_table.py`)
+# ------------------------------------------
+# Number of rows computed before / after the visible ones
+RESULTS_TABLE_MARGIN = 20
+# Number of rows computed by the background thread between 2 refreshes of the table
+RESULTS_TABLE_CHUNK = 50
+
+# Differential fuzzing (see `fuzz.py`)
+# ------------------------------------------
+# Number of random cases of a run
+FUZZ_CASES = 200
+# Monte Carlo trials per case
+FUZZ_TRIALS = 4000
+# A difference above this number of standard errors is a discrepancy (5: ~1 false alarm per 1.7M cases)
+FUZZ_Z_THRESHOLD = 5.
+FUZZ_SEED = 0
+
+# Response curves (see `curve.py`)
+# ------------------------------------------
+# Default largest number of figurines of a curve
+CURVE_MAX_FIGS = 20
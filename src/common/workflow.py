@@ -27,6 +27,7 @@ from common.dice import proba_dice, proba_rr_ones, proba_rr_all, add_sustain_hit
 from common.utils import (nb_figs, crit, crit_wounds, weapon_a, hit_threshold, weapon_s, weapon_ap, weapon_d, bonus_wound, torrent,
                        rr_hit_ones, rr_hit_all, sustain_hit, lethal_hit, rr_wounds_ones, twin, devastating_wounds,
                        enemy_toughness, svg_enemy, svg_invul_enemy, fnp_enemy, enemy_hp, VERBOSE, fish_hit, fish_wound)
+from common.profile import WeaponProfile, TargetProfile, RuleSet
 
 
 def launch_workflow(nb_figs: int = nb_figs,
@@ -91,6 +92,108 @@ def launch_workflow(nb_figs: int = nb_figs,
         * enemy_dead: number of enemy dead
         * remaining_hp: remaining HP of a non dead enemy figurine
     """
+    return _launch_workflow(nb_figs=nb_figs,
+                            crit=crit,
+                            crit_wounds=crit_wounds,
+                            weapon_a=parse_expression(dice_expression=weapon_a),
+                            hit_threshold=hit_threshold,
+                            weapon_s=weapon_s,
+                            weapon_ap=weapon_ap,
+                            weapon_d=parse_expression(dice_expression=weapon_d),
+                            bonus_wound=bonus_wound,
+                            torrent=torrent,
+                            rr_hit_ones=rr_hit_ones,
+                            rr_hit_all=rr_hit_all,
+                            sustain_hit=parse_expression(sustain_hit) if sustain_hit != 0 else 0,
+                            lethal_hit=lethal_hit,
+                            rr_wounds_ones=rr_wounds_ones,
+                            twin=twin,
+                            devastating_wounds=devastating_wounds,
+                            fish_hit=fish_hit,
+                            fish_wound=fish_wound,
+                            enemy_toughness=enemy_toughness,
+                            svg_enemy=svg_enemy,
+                            svg_invul_enemy=svg_invul_enemy,
+                            fnp_enemy=fnp_enemy,
+                            enemy_hp=enemy_hp,
+                            verbose=verbose)
+
+
+def launch_workflow_profiles(weapon: WeaponProfile,
+                             target: TargetProfile,
+                             rules: RuleSet,
+                             verbose: bool = False) -> Tuple[float, float]:
+    """
+    Same as `launch_workflow`, with arguments grouped into profiles (see `profile.py`).
+
+    Profiles are validated and their dice expressions are parsed once (at construction): prefer this function in hot
+    loops.
+
+    :param weapon: Attacking unit (nb figs, A, BS, S, AP, D)
+    :param target: Target (T, saves, FNP, W)
+    :param rules: Criticals, re-rolls and weapon abilities
+    :param verbose: Set to True to print debug elements
+
+    :return: Tuple composed by:
+        * enemy_dead: number of enemy dead
+        * remaining_hp: remaining HP of a non dead enemy figurine
+    """
+    return _launch_workflow(nb_figs=weapon.nb_figs,
+                            crit=rules.crit,
+                            crit_wounds=rules.crit_wounds,
+                            weapon_a=weapon.average_a,
+                            hit_threshold=weapon.hit_threshold,
+                            weapon_s=weapon.weapon_s,
+                            weapon_ap=weapon.weapon_ap,
+                            weapon_d=weapon.average_d,
+                            bonus_wound=rules.bonus_wound,
+                            torrent=rules.torrent,
+                            rr_hit_ones=rules.rr_hit_ones,
+                            rr_hit_all=rules.rr_hit_all,
+                            sustain_hit=rules.average_sustain_hit,
+                            lethal_hit=rules.lethal_hit,
+                            rr_wounds_ones=rules.rr_wounds_ones,
+                            twin=rules.twin,
+                            devastating_wounds=rules.devastating_wounds,
+                            fish_hit=rules.fish_hit,
+                            fish_wound=rules.fish_wound,
+                            enemy_toughness=target.enemy_toughness,
+                            svg_enemy=target.svg_enemy,
+                            svg_invul_enemy=target.svg_invul_enemy,
+                            fnp_enemy=target.fnp_enemy,
+                            enemy_hp=target.enemy_hp,
+                            verbose=verbose)
+
+
+def _launch_workflow(nb_figs: int,
+                     crit: int,
+                     crit_wounds: int,
+                     weapon_a: float,
+                     hit_threshold: int,
+                     weapon_s: int,
+                     weapon_ap: int,
+                     weapon_d: float,
+                     bonus_wound: int,
+                     torrent: bool,
+                     rr_hit_ones: bool,
+                     rr_hit_all: bool,
+                     sustain_hit: float,
+                     lethal_hit: bool,
+                     rr_wounds_ones: bool,
+                     twin: bool,
+                     devastating_wounds: bool,
+                     fish_hit: bool,
+                     fish_wound: bool,
+                     enemy_toughness: int,
+                     svg_enemy: int,
+                     svg_invul_enemy: int,
+                     fnp_enemy: int,
+                     enemy_hp: int,
+                     verbose: bool) -> Tuple[float, float]:
+    """
+    Core of `launch_workflow`: dice expressions (`weapon_a`, `weapon_d`, `sustain_hit`) are already parsed into their
+    average value.
+    """
     # ------------------------------------------------------------------------------
     # 0/ Init
     # ------------------------------------------------------------------------------
@@ -172,8 +275,7 @@ def launch_workflow(nb_figs: int = nb_figs,
     # ------------------------------------------------------------------------------
     # 1/ Compute number of attack: nb figs * weapon_a
     # ------------------------------------------------------------------------------
-    w_a = parse_expression(dice_expression=weapon_a)
-    nb_attack = w_a * nb_figs
+    nb_attack = weapon_a * nb_figs
 
     # ------------------------------------------------------------------------------
     # 2/ hits
@@ -220,7 +322,7 @@ def launch_workflow(nb_figs: int = nb_figs,
     sustain_additional_hit = 0
     if sustain_hit != 0:
         # Get the (eventually fished) sustain hits
-        sustain_additional_hit = parse_expression(sustain_hit) * nb_crit
+        sustain_additional_hit = sustain_hit * nb_crit
 
     # Add average nb of sustain
     average_hit += sustain_additional_hit
@@ -301,20 +403,46 @@ def launch_workflow(nb_figs: int = nb_figs,
     # ------------------------------------------------------------------------------
     # 5/ Feel no pain and deads
     # ------------------------------------------------------------------------------
+    # Compute proba to fail feel no pain
+    proba_fnp_failed = proba_dice(dice_requested=fnp_enemy, succeed=False)  # 1 if fnp_enemy=7
+
+    # Apply damage (ex: 1D6) and average fnp
+    damage = weapon_d * proba_fnp_failed  # ex: 2
+    if verbose: print(f"Average damage: {damage} (including {fnp_enemy}+ feel no pain)")
+
+    enemy_dead, remaining_hp = allocate_damage(failed_svg=failed_svg,
+                                               damage=damage,
+                                               proba_fnp_failed=proba_fnp_failed,
+                                               enemy_hp=enemy_hp)
+
+    if verbose:
+        print(f"Nb dead (average): {enemy_dead}, 1 enemy remains with {remaining_hp}/{enemy_hp} HP")
+
+    return enemy_dead, remaining_hp
+
+
+def allocate_damage(failed_svg: float, damage: float, proba_fnp_failed: float, enemy_hp: int) -> Tuple[int, float]:
+    """
+    Apply `damage` for each failed save, one enemy figurine after the other (damage exceeding the HP of a figurine
+    is lost).
+
+    :param failed_svg: Average number of failed saves (including devastating wounds)
+    :param damage: Average damage of one failed save (including feel no pain)
+    :param proba_fnp_failed: Probability to fail the feel no pain
+    :param enemy_hp: Health Point (hp) of the enemy
+
+    :return: Tuple composed by:
+        * enemy_dead: number of enemy dead
+        * remaining_hp: remaining HP of a non dead enemy figurine
+    """
     # If failed_svg not int (e.g. 5.3), apply algo on int value
     failed_saved_int = int(failed_svg)  # ex: 5
     remaining_failed_saves = failed_svg - failed_saved_int  # ex: 0.3
 
-    # Compute proba to fail feel no pain
-    proba_fnp_failed = proba_dice(dice_requested=fnp_enemy, succeed=False)  # 1 if fnp_enemy=7
-
     # counter of deads
     enemy_dead = 0
     # Int changing during the loop. represent THE figurine with remaining hp
     remaining_hp = enemy_hp
-    # Apply damage (ex: 1D6) and average fnp
-    damage = parse_expression(weapon_d) * proba_fnp_failed  # ex: 2
-    if verbose: print(f"Average damage: {damage} (including {fnp_enemy}+ feel no pain)")
 
     # Apply damages on `failed_saved_int` (int)
     # -------------------------------------
@@ -339,9 +467,6 @@ def launch_workflow(nb_figs: int = nb_figs,
         remaining_hp = 0
         enemy_dead += 1
 
-    if verbose:
-        print(f"Nb dead (average): {enemy_dead}, 1 enemy remains with {remaining_hp}/{enemy_hp} HP")
-
     return enemy_dead, remaining_hp
 
 if __name__ == "__main__":
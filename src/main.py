@@ -8,11 +8,12 @@ It raise a more complex code but optimal.
 """
 from kivy.core.window import Window
 from kivy.metrics import dp
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.recycleview import RecycleView
 from kivy.uix.scrollview import ScrollView
 from kivymd.app import MDApp
 from kivymd.uix.boxlayout import MDBoxLayout
 from kivymd.uix.button import MDFlatButton, MDRectangleFlatButton, MDIconButton
-from kivymd.uix.datatables import MDDataTable
 from kivymd.uix.dialog import MDDialog
 from kivymd.uix.gridlayout import MDGridLayout
 from kivymd.uix.label import MDLabel
@@ -22,7 +23,11 @@ from time import time
 from os.path import dirname, abspath, realpath
 from sys import path
 from kivy.animation import Animation
-from kivy.properties import BooleanProperty
+from kivy.clock import Clock
+from kivy.properties import BooleanProperty, StringProperty
+from functools import partial
+from threading import Thread
+import traceback
 
 # Get the directory of the current file
 current_dir = dirname(abspath(__file__))
@@ -37,12 +42,47 @@ path.insert(0, current_dir)
 
 # Assuming app is already working on src (see `buildozer.spec[source.dir]`)
 from common.enemy import opponent_datasheets
-from common.workflow import launch_workflow
-from common.dice import compute_average_enemy_dead, compute_average_hp_lost, DiceExpression, _parse_str_expression
-from common.utils import ROOT_PATH
+from common.engine import iter_refinements
+from common.profile import WeaponProfile, RuleSet
+from common.dice import DiceExpression, _parse_str_expression
+from common.results_table import ResultsTable, COLUMNS, visible_range
+from common.utils import ROOT_PATH, RESULTS_TABLE_CHUNK
 from os.path import join
 
 
+class ResultRow(MDBoxLayout):
+    """
+    One row of the results table (instantiated only for the visible rows, then recycled by the `RecycleView`).
+    """
+    name = StringProperty("")
+    value = StringProperty("")
+
+    def __init__(self, **kwargs):
+        super().__init__(orientation="horizontal", **kwargs)
+        self.name_label = MDLabel()
+        self.value_label = MDLabel(halign="right")
+        self.add_widget(self.name_label)
+        self.add_widget(self.value_label)
+        self.bind(name=self.name_label.setter("text"), value=self.value_label.setter("text"))
+
+
+class ResultsView(RecycleView):
+    """
+    Virtualized list of the results: only the visible rows are widgets.
+    """
+
+    def __init__(self, row_height: float, **kwargs):
+        super().__init__(**kwargs)
+        self.row_height = row_height
+        self.viewclass = ResultRow
+        layout = RecycleBoxLayout(orientation="vertical",
+                                  size_hint_y=None,
+                                  default_size=(None, row_height),
+                                  default_size_hint=(1, None))
+        layout.bind(minimum_height=layout.setter("height"))
+        self.add_widget(layout)
+
+
 class Main(MDApp):
     # ICON PATH
     icon = join(ROOT_PATH, "data", "icon.ico")
@@ -57,6 +97,15 @@ class Main(MDApp):
     # Set to True if you want to print info during the computation
     LAUNCH_WORKFLOW_VERBOSE = False
 
+    # Progressive refinement: averages are displayed first, then refined row by row in background
+    REFINE = True
+    # Added to the name of the rows still refining
+    REFINING_MARKER = " ..."
+
+    # Results table: height of one row, and number of rows visible at the same time
+    TABLE_ROW_H = dp(40)
+    TABLE_VISIBLE_ROWS = 10
+
     # Set to True if you want to test app on a screen of 6.4'' (representative of a smartphone)
     TEST = False
     if TEST:
@@ -475,16 +524,19 @@ class Main(MDApp):
         self.enemy_names = [self.DEFAULT_CUSTOM_ENEMY_NAME] + list(opponent_datasheets.keys())
         # ["marine", "sororita", ...]
 
-        # Init result df full of 0
-        self.result_dict = {"Name": self.enemy_names,
-                            "average dead enemy": [0.] * len(self.enemy_names),  # [0, 0, ...]
-                            # "average HP lost": [0.] * len(self.enemy_names)  # [0, 0, ...]
-                            }
+        # Results computed lazily: visible rows first, the others in background (see `ResultsTable`)
+        self.results_table = ResultsTable(self.enemy_names, opponent_datasheets,
+                                          refining_marker=self.REFINING_MARKER)
+        # Refresh of the table (at most once per frame)
+        self.refresh_table = Clock.create_trigger(self.update_widget_table)
+        # Generation of the inputs whose rows are all computed (see `fill_table`)
+        self.filled_generation = 0
 
-        self.widget_table = self.init_data_table(result_dict=self.result_dict)
+        self.widget_table = self.init_data_table()
 
         # Create a BoxLayout with left and right padding
-        layout = MDBoxLayout(size_hint_y=None,
+        layout = MDBoxLayout(orientation="vertical",
+                             size_hint_y=None,
                              adaptive_height=True,
                              # padding=(self.TABLE_COL_W, Window.width/12, self.TABLE_COL_W, 0),  # (left, top, right, bottom)
                              padding=(Window.width / 15, Window.height / 24, Window.width / 15, 0),
@@ -492,6 +544,7 @@ class Main(MDApp):
 
         self.grid.add_widget(layout)
 
+        layout.add_widget(self.table_header)
         layout.add_widget(self.widget_table)
 
         # Init var containing Dialog box
@@ -583,7 +636,8 @@ class Main(MDApp):
     # ----------------------------------------------------------------------------
     def compute(self):
         """
-        Compute dice proba on all `opponent_datasheet`. Update `self.result_dict`
+        Compute dice proba on all `opponent_datasheet`. Update `self.results_table`: the visible rows are computed
+        now, the others in background (see `fill_table`).
         """
         try:
             start_process = time()
@@ -634,60 +688,42 @@ class Main(MDApp):
             rr_wounds_ones = self.rr_wounds_one.active
             twin = self.rr_wound_all.active
             devastating_wounds = self.field_deva_wound.active
-            fish_hit = self.field_fish_hit
-            fish_wound = self.field_fish_w
+            fish_hit = self.field_fish_hit.active
+            fish_wound = self.field_fish_w.active
 
             # 1.2/ Retrieve custom enemy datasheet
             self.add_custom_enemy()
 
-            # 2/ Compute
+            # Weapon and rules are the same for all the enemies: validated and parsed once
+            weapon = WeaponProfile(nb_figs=nb_figs,
+                                   weapon_a=weapon_a,
+                                   hit_threshold=hit_threshold,
+                                   weapon_s=weapon_s,
+                                   weapon_ap=weapon_ap,
+                                   weapon_d=weapon_d)
+            rules = RuleSet(crit=crit,
+                            sustain_hit=sustain_hit,
+                            bonus_wound=bonus_wound,
+                            torrent=torrent,
+                            rr_hit_ones=rr_hit_ones,
+                            rr_hit_all=rr_hit_all,
+                            lethal_hit=lethal_hit,
+                            rr_wounds_ones=rr_wounds_ones,
+                            twin=twin,
+                            devastating_wounds=devastating_wounds,
+                            fish_hit=fish_hit,
+                            fish_wound=fish_wound)
+
+            # 2/ Compute the visible rows (averages, instant). Inputs changed: older results are dropped
+            # ------------------------------------------
+            generation = self.results_table.set_inputs(weapon, rules)
+            self.update_visible_rows()
+            self.results_table.compute(self.results_table.wanted(include_rest=False), generation)
+            self.update_widget_table()
+
+            # 3/ Compute the other rows, then refine the visible ones, in background
             # ------------------------------------------
-            for index, name in enumerate(self.enemy_names):
-                # select one row
-                current_carac = opponent_datasheets[name]
-                # ex: {'svg': 3, 'svg invul': None, 'feel no pain': None, 'toughness': 4, 'w': 2}
-
-                # Compute the effect of the weapon on the current enemy
-                enemy_dead, remaining_hp = launch_workflow(nb_figs=nb_figs,
-                                                           crit=crit,
-                                                           weapon_a=weapon_a,
-                                                           hit_threshold=hit_threshold,
-                                                           weapon_s=weapon_s,
-                                                           weapon_ap=weapon_ap,
-                                                           weapon_d=weapon_d,
-                                                           sustain_hit=sustain_hit,
-                                                           bonus_wound=bonus_wound,
-                                                           torrent=torrent,
-                                                           rr_hit_ones=rr_hit_ones,
-                                                           rr_hit_all=rr_hit_all,
-                                                           lethal_hit=lethal_hit,
-                                                           rr_wounds_ones=rr_wounds_ones,
-                                                           twin=twin,
-                                                           devastating_wounds=devastating_wounds,
-                                                           fish_hit=fish_hit,
-                                                           fish_wound=fish_wound,
-                                                           enemy_toughness=current_carac["toughness"],
-                                                           svg_enemy=current_carac["svg"],
-                                                           svg_invul_enemy=current_carac["svg invul"],
-                                                           fnp_enemy=current_carac["feel no pain"],
-                                                           enemy_hp=current_carac["w"],
-                                                           verbose=self.LAUNCH_WORKFLOW_VERBOSE)
-                # Include `remaining_hp` in the average of deads
-                average_enemy_dead = compute_average_enemy_dead(enemy_dead=enemy_dead, remaining_hp=remaining_hp,
-                                                                enemy_hp=current_carac["w"])
-                average_hp_lost = compute_average_hp_lost(enemy_dead=enemy_dead, remaining_hp=remaining_hp,
-                                                          enemy_hp=current_carac["w"])
-
-                print(f"Average dead on {name}: {average_enemy_dead}")
-
-                # Fill `result_dict`
-                # ------------------------------------------
-                self.result_dict['average dead enemy'][index] = average_enemy_dead
-                # self.result_dict['average HP lost'][index] = average_hp_lost
-
-            # Optim: update dict one single time
-            self.update_widget_table(self.result_dict)
-            print(self.result_dict)
+            Thread(target=self.fill_table, args=(generation,), daemon=True).start()
 
             print(f"Time to compute: {time() - start_process}s.")
 
@@ -701,6 +737,67 @@ class Main(MDApp):
                                    )
             self.dialog.open()
 
+    # REFINE
+    # ----------------------------------------------------------------------------
+    def fill_table(self, generation: int) -> None:
+        """
+        Background thread: compute the rows not computed yet by chunks (visible rows first: priorities follow the
+        scroll), then refine the visible rows with increasingly accurate results (see `refine`). Stops as
+        soon as the inputs change (new `compute`).
+
+        :param generation: Generation of the inputs when the thread was started
+        """
+        table = self.results_table
+        try:
+            rows = table.wanted(limit=RESULTS_TABLE_CHUNK)
+            while rows and generation == table.generation:
+                table.compute(rows, generation)
+                self.refresh_table()
+                rows = table.wanted(limit=RESULTS_TABLE_CHUNK)
+        except Exception as e:
+            # Rows left empty: tell the user (widgets are only modified by the UI thread)
+            traceback.print_exc()
+            Clock.schedule_once(partial(self.open_error_dialog, f'Computation stopped: {e}'))
+            return
+
+        if generation == table.generation:
+            # From now, the rows becoming visible are refined as soon as they are scrolled to (see `on_table_scroll`)
+            self.filled_generation = generation
+            if self.REFINE:
+                self.refine(generation, table.claim_refinement(table.visible_rows(), generation))
+
+    def open_error_dialog(self, text: str, *args) -> None:
+        """
+        Error popup.
+        """
+        self.dialog = MDDialog(title='Error',
+                               text=text,
+                               size_hint=(0.8, 1),
+                               buttons=[MDFlatButton(text='Close', on_release=self.close_dialog)]
+                               )
+        self.dialog.open()
+
+    def refine(self, generation: int, rows: list) -> None:
+        """
+        Refine `rows` with increasingly accurate results (see `iter_refinements`), until the inputs change. Runs in
+        a background thread.
+
+        :param generation: Generation of the inputs when the refinement was started
+        :param rows: Rows to refine (claimed, see `ResultsTable.claim_refinement`)
+        """
+        table = self.results_table
+        try:
+            for row in rows:
+                target = table.target(row)
+                for result, final in iter_refinements(table.weapon, target, table.rules):
+                    if not table.set_value(row, round(result.mean_hp_lost / target.enemy_hp, 2), generation,
+                                           refining=not final):
+                        return
+                    self.refresh_table()
+        except Exception as e:
+            traceback.print_exc()
+            Clock.schedule_once(partial(self.open_error_dialog, f'Refinement stopped: {e}'))
+
     # Manage table
     # ------------------------------------------------
     def add_custom_enemy(self):
@@ -725,46 +822,62 @@ class Main(MDApp):
             'w': int(self.field_hp.text)
         }
 
-    @staticmethod
-    def __table_to_tuples(table: dict) -> list:
+    def init_data_table(self) -> ResultsView:
         """
-        Transform `result_dict` (nested dict) into list of tuples
-        Example:
-        input: {'Name': ['marine', 'sororita',...], 'average dead enemy': [0.0, 0.0,..], 'average HP lost': [0.0, 0.0..]
-        output: [('marine', 0.0, 0.0),  ('sororita', 0.0, 0.0),...]
+        Init the results table (virtualized: only the visible rows are widgets) and its header (sort buttons).
         """
-        return [(table["Name"][k],
-                 table['average dead enemy'][k],
-                 # table["average HP lost"][k]
-                 )
-                for k in range(len(table["Name"]))]
-
-    def init_data_table(self, result_dict: dict) -> MDDataTable:
-        """
-        Init a data result_dict with 0
-        """
-        column_data = list(result_dict.keys())
-        # ['Name', 'average dead enemy', 'average HP lost']
-
-        column_data = [(x, self.TABLE_COL_W) for x in column_data]
-
-        widget_table = MDDataTable(
-            column_data=column_data,
-            row_data=self.__table_to_tuples(result_dict),  # ex of line: ("marine", 0, 0)
-            use_pagination=False,
-            height=dp(65) * (Window.height / 10) * len(self.enemy_names),
-            size_hint_y=None,
-            rows_num=len(self.enemy_names),  # 1 line per enemy
-        )
+        # Header: one button per column, pressing it sorts the rows (pressing again reverses the order)
+        self.table_header = MDBoxLayout(orientation="horizontal", size_hint_y=None, height=self.TABLE_ROW_H)
+        for column in COLUMNS:
+            button = MDFlatButton(text=column)
+            button.bind(on_press=partial(self.sort_table, column))
+            self.table_header.add_widget(button)
 
+        widget_table = ResultsView(row_height=self.TABLE_ROW_H,
+                                   size_hint_y=None,
+                                   height=self.TABLE_ROW_H * min(self.TABLE_VISIBLE_ROWS, len(self.enemy_names)))
+        # Scrolled / resized: compute the rows becoming visible
+        widget_table.bind(scroll_y=self.on_table_scroll, height=self.on_table_scroll)
         return widget_table
 
-    def update_widget_table(self, updated_dict: dict) -> None:
-        """
-        Update `widget_table.row_data` with `updated_dict`content.
-        """
-        # Into correct format (list of tuples)
-        self.widget_table.row_data = self.__table_to_tuples(updated_dict)
+    def update_visible_rows(self) -> None:
+        self.results_table.set_visible(*visible_range(self.widget_table.scroll_y, self.widget_table.height,
+                                                      self.TABLE_ROW_H, len(self.results_table)))
+
+    def on_table_scroll(self, *args) -> None:
+        """
+        Compute the rows becoming visible (if not already done in background), then refine them (once the background
+        computation is over, see `fill_table`).
+        """
+        table = self.results_table
+        self.update_visible_rows()
+        if table.compute(table.wanted(include_rest=False)):
+            self.refresh_table()
+        if self.REFINE and self.filled_generation == table.generation:
+            rows = table.claim_refinement(table.visible_rows(), table.generation)
+            if rows:
+                Thread(target=self.refine, args=(table.generation, rows), daemon=True).start()
+
+    def sort_table(self, column: str, *args) -> None:
+        table = self.results_table
+        table.sort(column, reverse=not table.sort_reverse if table.sort_column == column else False)
+        self.update_visible_rows()
+        table.compute(table.wanted(include_rest=False))
+        self.update_widget_table()
+
+    def update_widget_table(self, *args) -> None:
+        """
+        Update `widget_table.data` with the rows of `self.results_table` changed since the last update (see
+        `ResultsTable.changes`). The whole data is reloaded only after new inputs or a sort.
+        """
+        changes = self.results_table.changes()
+        if changes is None:
+            self.widget_table.data = self.results_table.data()
+            return
+        for position, content in changes:
+            self.widget_table.data[position] = content
+        if changes:
+            self.widget_table.refresh_from_data()
 
     # Manage menu
     # ------------------------------------------------
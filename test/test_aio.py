@@ -0,0 +1,126 @@
+"""
+Test module aio.py
+"""
+import pytest
+import os, sys
+import asyncio
+import threading
+import time
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.aio import AsyncEvaluator
+from src.common.kernel import evaluate
+from src.common.profile import WeaponProfile, TargetProfile, RuleSet
+
+ROWS = [(WeaponProfile(weapon_s=s), TargetProfile(enemy_toughness=t), RuleSet()) for s in range(3, 9) for t in (3, 4)]
+
+
+class SlowFunction:
+    """
+    Slow evaluation counting its calls and the maximum number of calls running at the same time.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, weapon, target, rules):
+        with self.lock:
+            self.calls += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.01)
+        with self.lock:
+            self.running -= 1
+        return weapon.weapon_s
+
+
+def test_evaluate():
+    async def main():
+        async with AsyncEvaluator() as evaluator:
+            return await evaluator.evaluate(*ROWS[0])
+
+    assert asyncio.run(main()) == evaluate(*ROWS[0])
+
+
+def test_single_flight():
+    """
+    Identical requests in flight are computed once.
+    """
+    function = SlowFunction()
+
+    async def main():
+        async with AsyncEvaluator(function) as evaluator:
+            # Equal profiles, different objects
+            rows = [(WeaponProfile(weapon_s=5), TargetProfile(), RuleSet()) for _ in range(10)]
+            results = await asyncio.gather(*[evaluator.evaluate(*row) for row in rows])
+            return results, evaluator.nb_coalesced
+
+    results, nb_coalesced = asyncio.run(main())
+    assert results == [5] * 10
+    assert function.calls == 1
+    assert nb_coalesced == 9
+
+
+def test_bounded_concurrency():
+    function = SlowFunction()
+
+    async def main():
+        async with AsyncEvaluator(function, max_concurrency=3) as evaluator:
+            await asyncio.gather(*[evaluator.evaluate(*row) for row in ROWS])
+
+    asyncio.run(main())
+    assert function.calls == len(ROWS)
+    assert function.max_running <= 3
+
+
+def test_stream():
+    """
+    Results in the order of the requests, at most `max_pending` requests pulled ahead of the consumer.
+    """
+    pulled = []
+
+    def rows():
+        for row in ROWS:
+            pulled.append(row)
+            yield row
+
+    async def main():
+        results = []
+        async with AsyncEvaluator() as evaluator:
+            async for index, result in evaluator.stream(rows(), max_pending=4):
+                assert len(pulled) <= index + 4
+                results.append((index, result))
+        return results
+
+    results = asyncio.run(main())
+    assert [index for index, _ in results] == list(range(len(ROWS)))
+    assert [result for _, result in results] == [evaluate(*row) for row in ROWS]
+
+
+def test_stream_async_iterable():
+    async def rows():
+        for row in ROWS[:3]:
+            await asyncio.sleep(0)
+            yield row
+
+    async def main():
+        async with AsyncEvaluator() as evaluator:
+            return [result async for _, result in evaluator.stream(rows())]
+
+    assert asyncio.run(main()) == [evaluate(*row) for row in ROWS[:3]]
+
+
+def test_process_executor():
+    async def main():
+        async with AsyncEvaluator(executor="process", max_concurrency=2) as evaluator:
+            return await asyncio.gather(*[evaluator.evaluate(*row) for row in ROWS[:4]])
+
+    assert asyncio.run(main()) == [evaluate(*row) for row in ROWS[:4]]
@@ -0,0 +1,46 @@
+"""
+Test module approx.py
+"""
+import pytest
+import os, sys
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.approx import approximate
+from src.common.distribution import exact_distribution
+from src.common.profile import WeaponProfile, TargetProfile, RuleSet
+
+# 80 attacks on average
+WEAPON = WeaponProfile(nb_figs=40, weapon_a="D3", hit_threshold=3, weapon_s=4, weapon_ap=1, weapon_d="D3")
+TARGET = TargetProfile(enemy_toughness=4, svg_enemy=3, svg_invul_enemy=7, fnp_enemy=5, enemy_hp=2)
+
+
+@pytest.mark.parametrize("rules", [RuleSet(),
+                                   RuleSet(sustain_hit="D3", lethal_hit=True, crit=5),
+                                   RuleSet(devastating_wounds=True, twin=True, fish_wound=True,
+                                           rr_hit_all=True, fish_hit=True),
+                                   RuleSet(torrent=True)])
+def test_approx_vs_exact(rules):
+    approx = approximate(WEAPON, TARGET, rules)
+    exact = exact_distribution(WEAPON, TARGET, rules)
+    assert type(approx).__name__ == "ApproxResult"
+
+    # Averages: exact up to the renewal correction
+    assert approx.mean_dead == pytest.approx(exact.mean_dead, rel=1e-3)
+    assert approx.mean_hp_lost == pytest.approx(exact.mean_hp_lost, rel=1e-3)
+    # Probabilities: within the error estimate
+    for min_dead in range(0, 40, 3):
+        assert abs(approx.kill_probability(min_dead) - exact.kill_probability(min_dead)) <= approx.error
+
+
+def test_fallback_and_degenerate():
+    # Small pool: exact distribution
+    assert type(approximate(WEAPON.replace(nb_figs=2), TARGET, RuleSet())).__name__ == "ExactResult"
+
+    # Cannot wound (no damage event)
+    r = approximate(WEAPON.replace(weapon_a=0, nb_figs=1), TARGET, RuleSet(), min_attacks=0)
+    assert r.mean_dead == 0 and r.kill_probability(1) == 0
@@ -0,0 +1,67 @@
+"""
+Test module army.py
+"""
+import pytest
+import os, sys
+from itertools import product
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.army import ArmyUnit, optimize_army, value_table
+from src.common.profile import WeaponProfile, TargetProfile
+
+UNITS = [ArmyUnit(f"unit {k}", WeaponProfile(nb_figs=5 + k % 5, weapon_a=1 + k % 3, weapon_s=4 + k % 6, weapon_ap=k % 4,
+                                             weapon_d=1 + k % 3), points=60 + 15 * k, max_count=3)
+         for k in range(5)]
+TARGETS = {"marine": TargetProfile(enemy_toughness=4, svg_enemy=3, enemy_hp=2),
+           "knight": TargetProfile(enemy_toughness=12, svg_enemy=3, svg_invul_enemy=5, enemy_hp=22)}
+
+
+def _brute_force(budget, max_units, weights):
+    """
+    Weighted damage of all the armies within the limits, best first.
+    """
+    table = value_table(UNITS, TARGETS)
+    total = sum(weights.values())
+    values = []
+    for counts in product(*[range(unit.max_count + 1) for unit in UNITS]):
+        if sum(c * u.points for c, u in zip(counts, UNITS)) <= budget and sum(counts) <= max_units:
+            values.append(sum(c * sum(weights[name] / total * d for name, d in zip(TARGETS, damage))
+                              for c, damage in zip(counts, table)))
+    return sorted(values, reverse=True)
+
+
+def test_optimize_army():
+    """
+    The top solutions of the DP are the best armies.
+    """
+    weights = {"marine": 3., "knight": 1.}
+    solutions = optimize_army(UNITS, 500, TARGETS, weights, max_units=6, top=5)
+    assert [s.value for s in solutions] == pytest.approx(_brute_force(500, 6, weights)[:5])
+    for solution in solutions:
+        assert solution.points <= 500
+        assert sum(solution.counts.values()) <= 6
+        assert all(count <= 3 for count in solution.counts.values())
+
+
+def test_optimize_army_pareto():
+    """
+    Multi-objective: no solution dominates another one.
+    """
+    solutions = optimize_army(UNITS, 500, TARGETS, max_units=6, top=10, pareto=True)
+    assert solutions
+    for a in solutions:
+        for b in solutions:
+            assert a is b or not all(a.damage[name] >= b.damage[name] for name in TARGETS) or a.damage == b.damage
+    # The best weighted solution is on the frontier
+    assert solutions[0].value == pytest.approx(optimize_army(UNITS, 500, TARGETS, max_units=6, top=1)[0].value)
+
+
+def test_empty_budget():
+    solutions = optimize_army(UNITS, 10, TARGETS)
+    assert len(solutions) == 1
+    assert solutions[0].counts == {} and solutions[0].value == 0.
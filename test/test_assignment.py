@@ -0,0 +1,100 @@
+"""
+Test module assignment.py
+"""
+import pytest
+import os, sys
+from itertools import permutations, product
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.assignment import Attacker, EnemyUnit, assign, hungarian, split, kill_matrix
+from src.common.profile import WeaponProfile, TargetProfile, RuleSet
+
+ATTACKERS = [Attacker("bolter", WeaponProfile(nb_figs=10, weapon_a=2, weapon_s=4, weapon_ap=0, weapon_d=1)),
+             Attacker("lascannon", WeaponProfile(nb_figs=2, weapon_a=1, weapon_s=12, weapon_ap=3, weapon_d="D6+1")),
+             Attacker("plasma", WeaponProfile(nb_figs=5, weapon_a=1, weapon_s=8, weapon_ap=3, weapon_d=2)),
+             Attacker("flamer", WeaponProfile(nb_figs=5, weapon_a="D6", weapon_s=4, weapon_d=1), RuleSet(torrent=True))]
+ENEMIES = [EnemyUnit("marine", TargetProfile(enemy_toughness=4, svg_enemy=3, enemy_hp=2), 10, points=180),
+           EnemyUnit("terminator", TargetProfile(enemy_toughness=5, svg_enemy=2, svg_invul_enemy=5, enemy_hp=3), 5,
+                     points=200),
+           EnemyUnit("guard", TargetProfile(enemy_toughness=3, svg_enemy=5, enemy_hp=1), 10, points=60),
+           EnemyUnit("monster", TargetProfile(enemy_toughness=9, svg_enemy=2, svg_invul_enemy=4, enemy_hp=10), 1,
+                     points=250)]
+
+
+def _brute_force(objective):
+    """
+    Best value over all the assignments.
+    """
+    best = 0.
+    for choice in product(range(len(ENEMIES)), repeat=len(ATTACKERS)):
+        targets = {a.name: ENEMIES[c].name for a, c in zip(ATTACKERS, choice)}
+        best = max(best, _value(targets, objective))
+    return best
+
+
+def _value(targets, objective):
+    # Rebuild the value of an assignment through `assign` on fixed pairs
+    value = 0.
+    for enemy in ENEMIES:
+        members = [a for a in ATTACKERS if targets[a.name] == enemy.name]
+        if members:
+            value += assign(members, [enemy], objective).value
+    return value
+
+
+def test_hungarian():
+    """
+    Compare with all the permutations.
+    """
+    values = [[7, 2, 5], [3, 9, 1], [4, 8, 6], [1, 1, 1]]
+    choice = hungarian(values)
+    assert sorted(c for c in choice if c is not None) == [0, 1, 2]
+    best = max(sum(values[i][p[i]] for i in range(4) if p[i] < 3) for p in permutations(range(4)))
+    assert sum(values[i][c] for i, c in enumerate(choice) if c is not None) == best
+
+
+@pytest.mark.parametrize("objective", ["kills", "points"])
+def test_assign_optimal(objective):
+    """
+    The search over the subsets of attackers is optimal, the local search is never better.
+    """
+    plan = assign(ATTACKERS, ENEMIES, objective)
+    assert set(plan.targets) == {a.name for a in ATTACKERS}
+    assert plan.value == pytest.approx(_brute_force(objective))
+    local = assign(ATTACKERS, ENEMIES, objective, max_dp_attackers=0)
+    assert local.value <= plan.value + 1e-9
+
+
+def test_assign_exclusive():
+    """
+    At most one attacker per enemy.
+    """
+    plan = assign(ATTACKERS, ENEMIES, exclusive=True)
+    assert len(set(plan.targets.values())) == len(plan.targets) == len(ATTACKERS)
+
+
+def test_kill_first():
+    """
+    A "kill first" threshold is served before the other kills.
+    """
+    enemies = [ENEMIES[0], EnemyUnit("terminator", ENEMIES[1].target, 5, points=200, min_dead=3), ENEMIES[2]]
+    plan = assign(ATTACKERS, enemies)
+    free = assign(ATTACKERS, [ENEMIES[0], ENEMIES[1], ENEMIES[2]])
+    assert plan.threshold_probabilities["terminator"] > 0.
+    assert plan.expected_dead["terminator"] > free.expected_dead["terminator"]
+
+
+def test_split():
+    parts = split(ATTACKERS[0], 3)
+    assert [p.weapon.nb_figs for p in parts] == [4, 3, 3]
+    assert len(kill_matrix(parts, ENEMIES)) == 3
+
+
+def test_unknown_objective():
+    with pytest.raises(ValueError):
+        assign(ATTACKERS, ENEMIES, "glory")
@@ -0,0 +1,77 @@
+"""
+Test module attrition.py
+"""
+import pytest
+import os, sys
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.attrition import Squad, attrition, kill_tables
+from src.common.distribution import exact_distribution
+from src.common.profile import WeaponProfile, TargetProfile, RuleSet
+
+SQUAD_A = Squad(weapon=WeaponProfile(nb_figs=20, weapon_a=2, hit_threshold=3, weapon_s=4, weapon_ap=0, weapon_d=1),
+                target=TargetProfile(enemy_toughness=4, svg_enemy=3, enemy_hp=2))
+SQUAD_B = Squad(weapon=WeaponProfile(nb_figs=20, weapon_a=1, hit_threshold=4, weapon_s=3, weapon_ap=0, weapon_d=1),
+                target=TargetProfile(enemy_toughness=3, svg_enemy=5, enemy_hp=1))
+
+
+def test_kill_tables():
+    # Table of n shooters: same as the exact distribution of n figurines
+    tables = kill_tables(SQUAD_A.weapon, SQUAD_B.target, SQUAD_A.rules, 5)
+    assert len(tables) == 6 and tables[0].to_pmf() == {0: 1.}
+    exact = exact_distribution(SQUAD_A.weapon.replace(nb_figs=5), SQUAD_B.target, SQUAD_A.rules)
+    assert tables[5].to_pmf() == pytest.approx(exact.dead_pmf)
+
+
+def test_single_turn():
+    # One turn: losses of B are the kills of 20 figurines of A (capped by the size of B)
+    result = attrition(SQUAD_A, SQUAD_B, nb_turns=1)
+    exact = exact_distribution(SQUAD_A.weapon, SQUAD_B.target, SQUAD_A.rules)
+    expected = sum(min(dead, 20) * p for dead, p in exact.dead_pmf.items())
+    assert result.expected_losses_b[0] == pytest.approx(expected)
+    assert sum(result.distributions[0].values()) == pytest.approx(1)
+
+
+@pytest.mark.parametrize("simultaneous", [False, True])
+def test_attrition(simultaneous):
+    result = attrition(SQUAD_A, SQUAD_B, nb_turns=5, simultaneous=simultaneous)
+    assert len(result.expected_losses_a) == 5
+    # Wiped out stays wiped out
+    assert result.wipe_probability_b == sorted(result.wipe_probability_b)
+    # B loses the exchange (A: better shots and tougher)
+    assert result.wipe_probability_b[-1] > 0.99 and result.wipe_probability_a[-1] < 0.01
+    assert sum(result.expected_losses_b) > sum(result.expected_losses_a)
+    assert 0 <= result.error < 1e-6
+
+    # Shooting at the same time: B shoots with more figurines, so A loses more
+    if simultaneous:
+        assert sum(result.expected_losses_a) > sum(attrition(SQUAD_A, SQUAD_B, nb_turns=5).expected_losses_a)
+
+
+def test_exchange_cost(monkeypatch):
+    """
+    Simultaneous shots: 2 passes over tables folded at the size of the target, a few times the cost of sequential
+    shots (the product states * kills of A * kills of B is about 11 times).
+    """
+    import src.common.attrition as attrition_module
+    get = attrition_module._Survivors.get
+    operations = []
+
+    def counted_get(self, shooters, targets):
+        outcomes = get(self, shooters, targets)
+        assert len(outcomes[0]) <= targets + 1
+        operations.append(len(outcomes[0]))
+        return outcomes
+
+    monkeypatch.setattr(attrition_module._Survivors, "get", counted_get)
+    cost = {}
+    for simultaneous in (False, True):
+        operations.clear()
+        attrition(SQUAD_A, SQUAD_B, nb_turns=5, simultaneous=simultaneous)
+        cost[simultaneous] = sum(operations)
+    assert cost[True] < 6 * cost[False]
@@ -0,0 +1,64 @@
+"""
+Test module build_enemy.py
+"""
+import json
+import pytest
+import os, sys
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.build_enemy import build_datasheets, read_datasheets
+from src.common.enemy import opponent_datasheets
+
+HEADER = "Name;svg;svg invul;feel no pain;toughness;w\n"
+
+
+def _load(path):
+    namespace = {}
+    with open(path) as file:
+        exec(file.read(), namespace)
+    return namespace
+
+
+def test_read_datasheets(tmp_path):
+    # Same content as the shipped `enemy.py`
+    assert dict(read_datasheets(os.path.join(ROOT_DIR, "data", "enemy.csv"))) == opponent_datasheets
+
+    path = tmp_path / "bad.csv"
+    path.write_text(HEADER + "marine;3;;;four;2\n")
+    with pytest.raises(ValueError, match=":2: invalid value 'four'"):
+        list(read_datasheets(str(path)))
+    path.write_text(HEADER + "marine;3;;;4;2\nmarine;3;;;4;2\n")
+    with pytest.raises(ValueError, match="duplicated"):
+        list(read_datasheets(str(path)))
+    path.write_text("Name;svg\nmarine;3\n")
+    with pytest.raises(ValueError, match="missing columns"):
+        list(read_datasheets(str(path)))
+
+
+def test_incremental_build(tmp_path):
+    csv_path, output = tmp_path / "units.csv", str(tmp_path / "units.py")
+    csv_path.write_text(HEADER + "marine;3;;;4;2\nsororita;3;6;;3;1\n")
+    report = build_datasheets(str(csv_path), output)
+    assert report["built"] and report["changes"]["added"] == ["marine", "sororita"]
+    namespace = _load(output)
+    assert namespace["opponent_datasheets"]["sororita"]["svg invul"] == 6
+    assert set(namespace["opponent_tables"]) == {"marine", "sororita"}
+
+    # Unchanged: not rebuilt
+    assert not build_datasheets(str(csv_path), output)["built"]
+    # The manifest only depends on the input: the changes are in the report only
+    with open(str(tmp_path / "units.json")) as file:
+        assert set(json.load(file)) == {"input", "file_hash", "version", "rows"}
+
+    # Only the rows changed are reported (formatting changes are not)
+    csv_path.write_text(HEADER + "marine;3.0;;;4;2\nsororita;3;5;;3;1\nknight;3;5;;12;22\n")
+    report = build_datasheets(str(csv_path), output)
+    assert report["built"]
+    assert report["changes"] == {"added": ["knight"], "modified": ["sororita"], "removed": []}
+    csv_path.write_text(HEADER + "knight;3;5;;12;22\n")
+    assert build_datasheets(str(csv_path), output)["changes"]["removed"] == ["marine", "sororita"]
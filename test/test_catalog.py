@@ -0,0 +1,83 @@
+"""
+Test module catalog.py
+"""
+import pytest
+import os, sys
+import random
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.catalog import (load_catalog, target_mix, evaluate_catalog, top_k, pareto_frontier, expected_dead,
+                                optimistic_dead)
+from src.common.approx import approximate
+from src.common.profile import WeaponProfile, RuleSet
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    """
+    Random catalog of 300 profiles.
+    """
+    random.seed(0)
+    rows = ["name;points;nb_figs;weapon_a;hit_threshold;weapon_s;weapon_ap;weapon_d;sustain_hit;lethal_hit;torrent"]
+    for k in range(300):
+        rows.append(f"w{k};{random.randint(5, 200)};{random.randint(1, 10)};{random.choice(['1', '2', 'D6'])};"
+                    f"{random.randint(2, 5)};{random.randint(3, 12)};{random.randint(0, 4)};"
+                    f"{random.choice(['1', '2', 'D3', 'D6+1'])};{random.choice([0, 1, 'D3'])};"
+                    f"{random.choice(['True', 'False'])};{random.choice(['True', 'False', 'False'])}")
+    path = tmp_path / "catalog.csv"
+    path.write_text("\n".join(rows))
+    return load_catalog(str(path))
+
+
+def test_load_catalog(catalog):
+    assert len(catalog) == 300
+    assert catalog[0].name == "w0"
+    assert type(catalog[0].rules.lethal_hit) is bool
+
+
+def test_expected_dead():
+    """
+    Same mean as the approximation (large pools).
+    """
+    weapon = WeaponProfile(nb_figs=40, weapon_a=2, weapon_s=5, weapon_ap=1, weapon_d="D3")
+    rules = RuleSet(sustain_hit=1, lethal_hit=True)
+    for target, _ in target_mix():
+        assert expected_dead(weapon, target, rules) == pytest.approx(
+            approximate(weapon, target, rules, min_attacks=0).mean_dead)
+        assert optimistic_dead(weapon, target, rules) >= expected_dead(weapon, target, rules)
+
+
+def test_top_k(catalog):
+    """
+    Same ranking as sorting the whole catalog.
+    """
+    mix = target_mix()
+    values = evaluate_catalog(catalog, mix)
+    expected = sorted(range(len(catalog)), key=lambda i: (-values[i] / catalog[i].points, i))[:10]
+    ranking = top_k(catalog, mix, k=10)
+    assert [r.entry.name for r in ranking] == [catalog[i].name for i in expected]
+    assert ranking[0].per_point >= ranking[-1].per_point
+
+    # Nothing asked, nothing evaluated
+    assert top_k(catalog, mix, k=0) == [] and top_k(catalog, mix, k=-1) == []
+
+
+def test_pareto_frontier(catalog):
+    """
+    Same frontier as the pairwise comparison.
+    """
+    mix = target_mix(weights={"marine": 2., "terminator": 1.})
+    values = evaluate_catalog(catalog, mix)
+    expected = [i for i in range(len(catalog))
+                if not any(catalog[j].points <= catalog[i].points and values[j] > values[i]
+                           for j in range(len(catalog)))]
+    frontier = pareto_frontier(catalog, mix)
+    assert sorted(r.entry.name for r in frontier) == sorted(catalog[i].name for i in expected)
+    # Increasing cost and kills
+    assert all(a.entry.points < b.entry.points and a.expected_dead < b.expected_dead
+               for a, b in zip(frontier, frontier[1:]))
@@ -0,0 +1,89 @@
+"""
+Test module checkpoint.py
+"""
+import pytest
+import os, sys
+import csv
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common import checkpoint
+from src.common.checkpoint import plan_chunks, run_checkpointed_sweep, load_manifest, iter_chunks
+from src.common.sweep import run_sweep
+
+GRID = {"weapon_s": [3, 4, 5], "weapon_ap": [0, 1], "enemy_toughness": [3, 4]}
+
+
+def _rows(path):
+    with open(path) as file:
+        return list(csv.reader(file))
+
+
+def test_plan_chunks():
+    """
+    Deterministic chunks, changing the grid only changes the chunks affected.
+    """
+    chunks = plan_chunks(GRID)
+    assert len(chunks) == 6
+    assert chunks == plan_chunks(dict(GRID))
+    assert chunks[0][1] == {"weapon_s": [3], "weapon_ap": [0], "enemy_toughness": [3, 4]}
+
+    more = plan_chunks({**GRID, "weapon_s": [3, 4, 5, 6]})
+    assert {c for c, _ in chunks} < {c for c, _ in more}
+    assert len(plan_chunks(GRID, chunk_keys=["weapon_s"])) == 3
+    with pytest.raises(ValueError):
+        plan_chunks(GRID, chunk_keys=["unknown"])
+
+
+def test_run_checkpointed_sweep(tmp_path):
+    counters = run_checkpointed_sweep(GRID, str(tmp_path))
+    assert counters == {"chunks": 6, "skipped": 0, "computed": 6, "removed": 0}
+    manifest = load_manifest(str(tmp_path))
+    assert all(c["done"] and c["rows"] == 2 for c in manifest["chunks"])
+
+    # Same result as a single sweep (results columns)
+    run_sweep(GRID, str(tmp_path / "full.csv"))
+    full = [row[-2:] for row in _rows(tmp_path / "full.csv")[1:]]
+    chunked = [row[-2:] for _, path in iter_chunks(str(tmp_path)) for row in _rows(path)[1:]]
+    assert chunked == full
+
+    # Restart: nothing to do. New values: only the new chunks
+    assert run_checkpointed_sweep(GRID, str(tmp_path))["computed"] == 0
+    counters = run_checkpointed_sweep({**GRID, "weapon_s": [3, 4, 5, 6]}, str(tmp_path))
+    assert counters["skipped"] == 6 and counters["computed"] == 2
+
+
+def test_resume_after_crash(tmp_path, monkeypatch):
+    """
+    A crash during a chunk: the chunks done are kept, the partial file is removed.
+    """
+    calls = []
+
+    def crashing_sweep(grid, path, **kwargs):
+        if len(calls) == 2:
+            open(path, "w").write("partial")
+            raise KeyboardInterrupt
+        calls.append(path)
+        return run_sweep(grid, path, **kwargs)
+
+    monkeypatch.setattr(checkpoint, "run_sweep", crashing_sweep)
+    with pytest.raises(KeyboardInterrupt):
+        run_checkpointed_sweep(GRID, str(tmp_path))
+    monkeypatch.undo()
+
+    manifest = load_manifest(str(tmp_path))
+    assert sum(c["done"] for c in manifest["chunks"]) == 2
+    counters = run_checkpointed_sweep(GRID, str(tmp_path))
+    assert counters["skipped"] == 2 and counters["computed"] == 4
+    assert not [name for name in os.listdir(tmp_path / "chunks") if ".tmp" in name]
+
+
+def test_clean(tmp_path):
+    run_checkpointed_sweep(GRID, str(tmp_path))
+    counters = run_checkpointed_sweep({**GRID, "weapon_s": [3]}, str(tmp_path), clean=True)
+    assert counters["removed"] == 4
+    assert len(os.listdir(tmp_path / "chunks")) == 2
@@ -0,0 +1,115 @@
+"""
+Test module cluster.py
+"""
+import pytest
+import os, sys
+import csv
+import multiprocessing
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.checkpoint import run_checkpointed_sweep, iter_chunks, load_manifest
+from src.common.cluster import (ChunkQueue, Coordinator, run_worker, evaluate_chunk, get_authkey, pack_results,
+                                unpack_results)
+
+GRID = {"weapon_s": [3, 4, 5], "weapon_ap": [0, 1], "enemy_toughness": [3, 4]}
+
+
+def _results(directory):
+    rows = []
+    for _, path in iter_chunks(directory):
+        with open(path) as file:
+            rows += [row for row in csv.reader(file)][1:]
+    return rows
+
+
+def test_pack_results():
+    results = [(1.5, 2.), (0.25, 3.)]
+    columns = unpack_results(pack_results(results))
+    assert list(columns["enemy_dead"]) == [1.5, 0.25]
+    assert list(columns["remaining_hp"]) == [2., 3.]
+    assert len(pack_results(results, "float32")) < len(pack_results(results, "float64"))
+    with pytest.raises(ValueError):
+        unpack_results(b"XXXX" + pack_results(results)[4:])
+    # Truncated, too long, or unknown typecode
+    data = pack_results(results)
+    for invalid in (data[:-8], data + b"\0", data[:4] + b"q" + data[5:]):
+        with pytest.raises(ValueError):
+            unpack_results(invalid)
+
+
+def test_lease_reissue_and_fail(tmp_path):
+    queue = ChunkQueue(GRID, str(tmp_path), lease_timeout=0.)
+    chunk, sub_grid = queue.lease("a")
+    # Lease expired: given to another worker, the first result wins
+    assert queue.lease("b")[0] == chunk
+    assert queue.status()["reissued"] == 1
+    data = pack_results(evaluate_chunk(sub_grid))
+    assert queue.complete("b", chunk, data)
+    assert not queue.complete("a", chunk, data)
+
+    # Invalid results or errors: the chunk is given again, then abandoned
+    queue.lease_timeout = 60.
+    chunk, _ = queue.lease("a")
+    assert not queue.complete("a", chunk, pack_results([(0., 0.)]))
+    assert queue.lease("b")[0] == chunk
+    queue.fail("b", chunk, "error")
+    assert queue.lease("c")[0] == chunk
+    queue.fail("c", chunk, "error")
+    assert queue.failures() == {chunk: "error"}
+    assert queue.status()["failed"] == 1
+
+
+def test_cluster(tmp_path):
+    """
+    Several workers on localhost: same results as a local checkpointed sweep, and the directory can be resumed.
+    """
+    coordinator = Coordinator(GRID, str(tmp_path / "cluster"), address=("127.0.0.1", 0), authkey=b"test")
+    coordinator.start()
+    try:
+        workers = [multiprocessing.Process(target=run_worker, args=(coordinator.address, b"test", f"w{i}", 0.01))
+                   for i in range(3)]
+        for worker in workers:
+            worker.start()
+        status = coordinator.wait(poll=0.01)
+        for worker in workers:
+            worker.join(30)
+    finally:
+        coordinator.stop()
+    assert status["done"] == 6 and status["todo"] == 0 and status["failed"] == 0
+    assert all(c["done"] for c in load_manifest(str(tmp_path / "cluster"))["chunks"])
+
+    run_checkpointed_sweep(GRID, str(tmp_path / "local"))
+    assert _results(str(tmp_path / "cluster")) == _results(str(tmp_path / "local"))
+    assert run_checkpointed_sweep(GRID, str(tmp_path / "cluster"))["computed"] == 0
+
+
+def test_authkey(monkeypatch):
+    monkeypatch.delenv("CLUSTER_AUTHKEY", raising=False)
+    # No default secret: refused on a non-loopback address, random secret of the process on loopback
+    with pytest.raises(ValueError):
+        Coordinator(GRID, "unused", address=("0.0.0.0", 0))
+    with pytest.raises(ValueError):
+        get_authkey("coordinator.example.org")
+    assert get_authkey("127.0.0.1") == bytes(multiprocessing.current_process().authkey)
+
+    assert get_authkey("0.0.0.0", b"secret") == b"secret"
+    monkeypatch.setenv("CLUSTER_AUTHKEY", "from env")
+    assert get_authkey("0.0.0.0") == b"from env"
+
+
+def test_truncated_results(tmp_path):
+    """
+    A truncated payload counts as a failure: the chunk is not committed, and is given to another worker.
+    """
+    queue = ChunkQueue(GRID, str(tmp_path), lease_timeout=60.)
+    chunk, sub_grid = queue.lease("a")
+    data = pack_results(evaluate_chunk(sub_grid))
+    assert not queue.complete("a", chunk, data[:-8])
+    assert queue.status()["done"] == 0 and not any(c["done"] for c in load_manifest(str(tmp_path))["chunks"])
+    assert queue.lease("b")[0] == chunk
+    assert queue.complete("b", chunk, data)
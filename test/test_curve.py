@@ -0,0 +1,66 @@
+"""
+Test module curve.py
+"""
+import pytest
+import os, sys
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.curve import response_curve, response_curves
+from src.common.distribution import exact_distribution
+from src.common.engine import evaluate
+from src.common.profile import WeaponProfile, TargetProfile, RuleSet
+
+WEAPON = WeaponProfile(weapon_a="D3", hit_threshold=3, weapon_s=5, weapon_ap=1, weapon_d="D3")
+RULES = RuleSet(sustain_hit=1, lethal_hit=True)
+TARGETS = {"marine": TargetProfile(enemy_toughness=4, svg_enemy=3, svg_invul_enemy=7, fnp_enemy=7, enemy_hp=2),
+           "tough marine": TargetProfile(enemy_toughness=4, svg_enemy=3, svg_invul_enemy=7, fnp_enemy=5, enemy_hp=2),
+           "big marine": TargetProfile(enemy_toughness=4, svg_enemy=3, svg_invul_enemy=7, fnp_enemy=7, enemy_hp=3),
+           "gravis": TargetProfile(enemy_toughness=6, svg_enemy=2, svg_invul_enemy=4, fnp_enemy=7, enemy_hp=3)}
+
+
+def test_response_curve_exact():
+    target = TARGETS["gravis"]
+    curve = response_curve(WEAPON, target, RULES, max_figs=8, min_dead=2)
+    assert curve.nb_figs == tuple(range(1, 9)) and len(curve) == 8
+
+    # Same as one exact distribution per number of figurines
+    for i, nb_figs in enumerate(curve.nb_figs):
+        expected = exact_distribution(WEAPON.replace(nb_figs=nb_figs), target, RULES)
+        assert curve.mean_dead[i] == pytest.approx(expected.mean_dead, abs=1e-9)
+        assert curve.mean_hp_lost[i] == pytest.approx(expected.mean_hp_lost, abs=1e-9)
+        assert curve.kill_probability[i] == pytest.approx(expected.kill_probability(2), abs=1e-9)
+        assert 0 <= curve.error[i] < 1e-6
+
+    # More figurines: more kills
+    assert list(curve.mean_dead) == sorted(curve.mean_dead)
+    assert response_curve(WEAPON, target, RULES, max_figs=8).kill_probability is None
+
+
+def test_response_curve_average():
+    target = TARGETS["marine"]
+    curve = response_curve(WEAPON, target, RULES, max_figs=12, engine="average")
+    assert curve.kill_probability is None and curve.error == (0.,) * 12
+    for i, nb_figs in enumerate(curve.nb_figs):
+        expected = evaluate(WEAPON.replace(nb_figs=nb_figs), target, RULES, engine="average")
+        assert curve.mean_dead[i] == pytest.approx(expected.mean_dead)
+        assert curve.mean_hp_lost[i] == pytest.approx(expected.mean_hp_lost)
+
+
+def test_response_curves():
+    # Targets sharing their events / allocation: same curves as computed alone
+    curves = response_curves(WEAPON, TARGETS, RULES, max_figs=6, min_dead=1)
+    assert list(curves) == list(TARGETS)
+    for name, target in TARGETS.items():
+        alone = response_curve(WEAPON, target, RULES, max_figs=6, min_dead=1)
+        assert curves[name].mean_dead == pytest.approx(alone.mean_dead)
+        assert curves[name].kill_probability == pytest.approx(alone.kill_probability)
+
+    with pytest.raises(ValueError):
+        response_curves(WEAPON, TARGETS, RULES, engine="montecarlo")
+    with pytest.raises(ValueError):
+        response_curves(WEAPON, TARGETS, RULES, max_figs=0)
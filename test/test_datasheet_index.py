@@ -0,0 +1,67 @@
+"""
+Test module datasheet_index.py
+"""
+import pytest
+import os, sys
+import random
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.datasheet_index import DatasheetIndex, STAT_COLUMNS
+
+
+def _random_datasheets(n, seed=0):
+    rng = random.Random(seed)
+    return {f"{rng.choice(['Marine', 'knight', 'ork'])} {i}": {"svg": rng.randint(2, 6),
+                                                               "svg invul": rng.choice([None, 4, 5, 6]),
+                                                               "feel no pain": rng.choice([None, 5, 6]),
+                                                               "toughness": rng.randint(2, 14),
+                                                               "w": rng.randint(1, 24)}
+            for i in range(n)}
+
+
+def _scan(datasheets, prefix="", **ranges):
+    """
+    Linear scan (reference).
+    """
+    names = []
+    for name, carac in datasheets.items():
+        values = {stat: 7 if carac[column] is None else carac[column] for stat, column in STAT_COLUMNS.items()}
+        if not name.casefold().startswith(prefix.casefold()):
+            continue
+        if all((low is None or values[stat] >= low) and (high is None or values[stat] <= high)
+               for stat, (low, high) in ((s, (r, r) if isinstance(r, int) else r) for s, r in ranges.items())):
+            names.append(name)
+    return sorted(names, key=lambda name: (name.casefold(), name))
+
+
+def test_shipped_datasheets():
+    index = DatasheetIndex()
+    assert len(index) == 7
+    assert index.select(enemy_toughness=(8, None), svg_enemy=(None, 2), svg_invul_enemy=(None, 4)) == ["monster"]
+    assert index.select(enemy_hp=(3, 6)) == ["captain_terminator", "terminator"]
+    assert index.autocomplete("TER") == ["terminator"]
+    with pytest.raises(ValueError):
+        index.select(unknown=3)
+
+
+def test_queries_equal_scan():
+    datasheets = _random_datasheets(3000)
+    index = DatasheetIndex(datasheets)
+    queries = [{},
+               {"enemy_toughness": (8, None), "svg_enemy": (None, 2), "svg_invul_enemy": (None, 4)},
+               {"enemy_hp": (3, 6)},
+               {"fnp_enemy": 7, "enemy_toughness": 4},
+               {"enemy_hp": (30, None)},
+               {"prefix": "mar", "svg_enemy": (3, 3)},
+               {"prefix": "knight 1"}]
+    for query in queries:
+        expected = _scan(datasheets, **query)
+        assert index.select(**query) == expected
+        assert index.count(**query) == len(expected)
+        assert index.select(limit=5, **query) == expected[:5]
+    assert index.autocomplete("KNIGHT 2", limit=3) == _scan(datasheets, "knight 2")[:3]
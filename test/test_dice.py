@@ -90,3 +90,26 @@ def test_get_wound_threshold():
     assert get_wound_threshold(weapon_s=4, enemy_toughness=5) == 5
 
 
+
+def test_dice_expression_pmf():
+    assert dice_expression_pmf(DiceExpression(nb_dice=0, dice_face=6, bonus=2)) == {2: 1}
+    assert dice_expression_pmf(DiceExpression(nb_dice=1, dice_face=3, bonus=1)) == pytest.approx({2: 1/3, 3: 1/3, 4: 1/3})
+    pmf = dice_expression_pmf(DiceExpression(nb_dice=2, dice_face=6, bonus=0))
+    assert pmf[7] == pytest.approx(6/36)
+    assert sum(v * p for v, p in pmf.items()) == pytest.approx(7)
+
+def test_fnp_damage_pmf():
+    assert fnp_damage_pmf({2: 1.}, proba_fnp_failed=1) == {2: 1.}
+    assert fnp_damage_pmf({2: 1.}, proba_fnp_failed=1/2) == pytest.approx({0: 1/4, 1: 1/2, 2: 1/4})
+
+def test_proba_outcomes():
+    assert proba_outcomes(dice_requested=4, crit=6) == pytest.approx((1/2, 1/3, 1/6))
+    # Re-roll the ones: same as `proba_rr_ones`
+    fail, success, critical = proba_outcomes(dice_requested=3, crit=6, rr_ones=True)
+    assert success + critical == pytest.approx(proba_rr_ones(3))
+    # Re-roll all: same as `proba_rr_all`
+    fail, success, critical = proba_outcomes(dice_requested=3, crit=6, rr_all=True)
+    assert success + critical == pytest.approx(proba_rr_all(3))
+    assert critical == pytest.approx(1/6 + 2/6 * 1/6)
+    # Fish: re-roll everything except the 6
+    assert proba_outcomes(dice_requested=3, crit=6, rr_all=True, fish=True)[2] == pytest.approx(1/6 + 5/6 * 1/6)
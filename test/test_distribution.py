@@ -0,0 +1,112 @@
+"""
+Test module distribution.py
+"""
+import pytest
+import os, sys
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.distribution import (exact_distribution, allocation_states, extend_allocation, power, compound,
+                                     convolve, Distribution, AllocationSummary, event_damage_pmf,
+                                     figurine_event_counts)
+from src.common.montecarlo import simulate
+from src.common.profile import WeaponProfile, TargetProfile, RuleSet
+
+WEAPON = WeaponProfile(nb_figs=5, weapon_a="D3", hit_threshold=3, weapon_s=4, weapon_ap=1, weapon_d="D3")
+TARGET = TargetProfile(enemy_toughness=4, svg_enemy=3, svg_invul_enemy=7, fnp_enemy=5, enemy_hp=2)
+
+
+def test_pmf_operations():
+    coin = {0: 0.5, 1: 0.5}
+    assert power(coin, 3).to_pmf() == pytest.approx({0: 1/8, 1: 3/8, 2: 3/8, 3: 1/8})
+    # 1 or 2 coins
+    assert compound({1: 0.5, 2: 0.5}, coin).to_pmf() == pytest.approx({0: 3/8, 1: 1/2, 2: 1/8})
+
+
+def test_distribution_pruning():
+    # Compact support: dense, scattered support: sparse
+    assert Distribution({0: 0.5, 1: 0.25, 2: 0.25}).is_dense
+    sparse = Distribution({0: 0.5, 100: 0.5})
+    assert not sparse.is_dense
+    assert convolve(sparse, sparse).to_pmf() == {0: 0.25, 100: 0.5, 200: 0.25}
+
+    # Probabilities below epsilon are dropped, and their mass tracked
+    d = Distribution({0: 0.5, 1: 0.5 - 1e-9, 2: 1e-9}, epsilon=1e-6)
+    assert d.max_value == 1 and d.discarded == pytest.approx(1e-9)
+
+    # 100 coins: the tails are dropped, the bound holds
+    coins = power({0: 0.5, 1: 0.5}, 100, epsilon=1e-12)
+    exact = power({0: 0.5, 1: 0.5}, 100)
+    assert len(coins) < len(exact) == 101
+    assert 0 < coins.discarded < 1e-9
+    assert abs(1 - sum(p for _, p in coins.items()) - coins.discarded) < 1e-12
+
+
+def test_allocation_states():
+    # Damage 2 on 3 HP figurines: 1 HP lost per figurine
+    states, discarded = allocation_states({2: 1.}, enemy_hp=3, max_events=4)
+    assert discarded == [0.] * 5
+    assert states[1] == {(0, 2): 1.}
+    assert states[2] == {(1, 0): 1.}
+    assert states[4] == {(2, 0): 1.}
+
+    # Extended from 2 events: same states
+    extended, extended_discarded = allocation_states({2: 1.}, enemy_hp=3, max_events=2)
+    extend_allocation(extended, extended_discarded, {2: 1.}, enemy_hp=3, max_events=4)
+    assert (extended, extended_discarded) == (states, discarded)
+
+
+def test_allocation_summary():
+    # Events of 0 to 5 figurines, mixed by one summary: same as the exact distribution of each number of figurines
+    counts = figurine_event_counts(WEAPON, TARGET, RuleSet(), max_figs=5)
+    assert len(counts) == 6 and counts[0].to_pmf() == {0: 1.}
+
+    allocation = AllocationSummary(event_damage_pmf(WEAPON, TARGET), TARGET.enemy_hp)
+    for nb_figs in (5, 2):
+        dead, mean_hp_lost = allocation.mix(counts[nb_figs])
+        expected = exact_distribution(WEAPON.replace(nb_figs=nb_figs), TARGET, RuleSet())
+        assert dead.to_pmf() == pytest.approx(expected.dead_pmf, abs=1e-12)
+        assert mean_hp_lost == pytest.approx(expected.mean_hp_lost)
+        assert dead.discarded == pytest.approx(expected.error, abs=1e-12)
+    # Allocated once, up to the largest number of events
+    assert len(allocation.states) == counts[5].max_value + 1
+
+
+def test_exact_distribution():
+    # 4+ > 4+ > 4+ on 1 HP: binomial(10, 1/8)
+    weapon = WEAPON.replace(nb_figs=10, weapon_a=1, hit_threshold=4, weapon_ap=0, weapon_d=1)
+    target = TARGET.replace(svg_enemy=4, fnp_enemy=7, enemy_hp=1)
+    result = exact_distribution(weapon, target, RuleSet())
+    assert result.mean_dead == pytest.approx(10 / 8)
+    assert result.kill_probability(1) == pytest.approx(1 - (7 / 8) ** 10)
+    assert sum(result.dead_pmf.values()) == pytest.approx(1)
+
+
+@pytest.mark.parametrize("rules", [RuleSet(),
+                                   RuleSet(sustain_hit="D3", lethal_hit=True, crit=5),
+                                   RuleSet(devastating_wounds=True, twin=True, fish_wound=True,
+                                           rr_hit_all=True, fish_hit=True),
+                                   RuleSet(torrent=True)])
+def test_exact_vs_simulation(rules):
+    result = exact_distribution(WEAPON, TARGET, rules)
+    r = simulate(WEAPON, TARGET, rules, nb_trials=2000)
+    assert abs(result.mean_dead - r.mean_dead) < 4 * r.std_error
+    assert abs(result.mean_hp_lost - r.mean_hp_lost) < 4 * r.std_error * TARGET.enemy_hp
+
+
+def test_exact_distribution_pruned():
+    # Large pool on W22 figurines: the pruned distribution stays within its error bound
+    weapon = WEAPON.replace(nb_figs=40, weapon_a="D6", weapon_s=9, weapon_ap=3, weapon_d="D6+1")
+    target = TargetProfile(enemy_toughness=12, svg_enemy=3, svg_invul_enemy=5, fnp_enemy=7, enemy_hp=22)
+    rules = RuleSet(sustain_hit=1)
+
+    pruned = exact_distribution(weapon, target, rules, epsilon=1e-12)
+    exact = exact_distribution(weapon, target, rules, epsilon=0)
+    assert exact.error == 0 and 0 < pruned.error < 1e-9
+    for min_dead in range(10):
+        assert pruned.kill_probability(min_dead) <= exact.kill_probability(min_dead) + 1e-15
+        assert exact.kill_probability(min_dead) <= pruned.kill_probability(min_dead) + pruned.error + 1e-15
@@ -0,0 +1,87 @@
+"""
+Test module engine.py
+"""
+import pytest
+import os, sys
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common import engine
+from src.common.engine import evaluate, estimate_work, recalibrate, benchmark, iter_refinements, DECISIONS
+from src.common.workflow import launch_workflow_profiles
+from src.common.profile import WeaponProfile, TargetProfile, RuleSet
+
+WEAPON = WeaponProfile(nb_figs=5, weapon_a=2, hit_threshold=3, weapon_s=4, weapon_ap=1, weapon_d="D3")
+TARGET = TargetProfile(enemy_toughness=4, svg_enemy=3, svg_invul_enemy=7, fnp_enemy=7, enemy_hp=2)
+
+
+def test_average():
+    # Averages only: same results as `launch_workflow`
+    result = evaluate(WEAPON, TARGET, RuleSet(lethal_hit=True))
+    assert result.engine == "average"
+    assert (result.enemy_dead, result.remaining_hp) == launch_workflow_profiles(WEAPON, TARGET, RuleSet(lethal_hit=True))
+    assert result.kill_probability is None
+
+    # Decision recorded
+    assert DECISIONS[-1].engine == "average" and DECISIONS[-1].elapsed == result.elapsed
+
+
+def test_dispatch():
+    # Small pool: the approximation is not accurate enough, the exact distribution is cheap
+    result = evaluate(WEAPON, TARGET, RuleSet(), min_dead=2, accuracy=0.01, latency=1)
+    assert result.engine == "exact" and result.error < 1e-9
+
+    # Large pool: the approximation is accurate enough
+    result = evaluate(WEAPON.replace(nb_figs=500), TARGET, RuleSet(), min_dead=100, accuracy=0.05, latency=1)
+    assert result.engine == "approx" and result.error <= 0.05
+
+    # Forced engine: same probability up to the error of the simulation
+    exact = evaluate(WEAPON, TARGET, RuleSet(), min_dead=2, engine="exact")
+    simulated = evaluate(WEAPON, TARGET, RuleSet(), min_dead=2, accuracy=0.05, engine="montecarlo")
+    assert abs(exact.kill_probability - simulated.kill_probability) <= simulated.error
+
+    with pytest.raises(ValueError):
+        evaluate(WEAPON, TARGET, RuleSet(), engine="unknown")
+
+
+def test_cost_model():
+    # More figurines, more work (except for the approximation: O(1))
+    for name in ("exact", "montecarlo"):
+        assert estimate_work(name, WEAPON.replace(nb_figs=10), TARGET, RuleSet(), 100) > \
+               estimate_work(name, WEAPON, TARGET, RuleSet(), 100)
+
+    saved = dict(engine.COST_MODEL)
+    try:
+        decisions = benchmark([(WEAPON.replace(nb_figs=n), TARGET, RuleSet()) for n in (1, 3)], accuracy=0.1)
+        assert len(decisions) == 2 * len(engine.ENGINES)
+        cost_model = recalibrate(decisions)
+        assert all(overhead >= 0 and per_work >= 0 for overhead, per_work in cost_model.values())
+    finally:
+        engine.COST_MODEL.update(saved)
+
+
+
+def test_iter_refinements():
+    # Cheap exact distribution: a single final result
+    refinements = list(iter_refinements(WEAPON, TARGET, RuleSet()))
+    assert len(refinements) == 1 and refinements[0][0].engine == "exact" and refinements[0][1]
+
+    # Monte Carlo batches: more and more accurate, the last one is final
+    refinements = list(iter_refinements(WEAPON, TARGET, RuleSet(), exact_budget=0, batch_trials=100, max_trials=400))
+    assert [final for _, final in refinements] == [False, False, False, True]
+    errors = [r.error for r, _ in refinements]
+    assert errors == sorted(errors, reverse=True)
+
+    exact = evaluate(WEAPON, TARGET, RuleSet(), engine="exact")
+    assert abs(refinements[-1][0].mean_hp_lost - exact.mean_hp_lost) < refinements[-1][0].error * TARGET.enemy_hp
+
+    # `max_trials` not a multiple of `batch_trials`: the last batch stops at `max_trials` (same trials as one batch)
+    refinements = list(iter_refinements(WEAPON, TARGET, RuleSet(), exact_budget=0, batch_trials=100, max_trials=250))
+    assert [final for _, final in refinements] == [False, False, True]
+    single, = iter_refinements(WEAPON, TARGET, RuleSet(), exact_budget=0, batch_trials=250, max_trials=250)
+    assert refinements[-1][0].mean_hp_lost == pytest.approx(single[0].mean_hp_lost)
+    assert refinements[-1][0].error == pytest.approx(single[0].error)
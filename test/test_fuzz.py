@@ -0,0 +1,60 @@
+"""
+Test module fuzz.py
+"""
+import pytest
+import os, sys
+import random
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.fuzz import fuzz, random_case, check_case
+from src.common.profile import WeaponProfile, TargetProfile, RuleSet
+from src.common.workflow import launch_workflow_profiles
+
+
+def _buggy_average(weapon, target, rules):
+    """
+    `launch_workflow` with a bug injected when lethal hits are enabled.
+    """
+    enemy_dead, remaining_hp = launch_workflow_profiles(weapon, target, rules)
+    return enemy_dead * target.enemy_hp + target.enemy_hp - remaining_hp + 0.5 * rules.lethal_hit
+
+
+def test_random_case():
+    assert random_case(random.Random(1)) == random_case(random.Random(1))
+
+
+def test_seed():
+    """
+    The seed of the run also seeds the simulation: another seed is an independent check of the same case.
+    """
+    always = lambda weapon, target, rules: 0.
+    case = (WeaponProfile(nb_figs=3), TargetProfile(), RuleSet())
+    references = {seed: check_case(case, always, "montecarlo", nb_trials=200, z_threshold=0, index=0, seed=seed)
+                  for seed in (0, 1)}
+    assert references[0].reference != references[1].reference
+    assert references[1].seed == 1
+    assert check_case(case, always, "montecarlo", nb_trials=200, z_threshold=0, index=0, seed=1) == references[1]
+
+
+def test_no_discrepancy():
+    assert fuzz(nb_cases=8, nb_trials=1000, processes=1) == []
+    # Kernels equal `launch_workflow`
+    assert fuzz(nb_cases=50, analytic="average", reference="workflow", processes=2) == []
+
+
+def test_discrepancies_shrunk():
+    discrepancies = fuzz(nb_cases=20, analytic=_buggy_average, reference="workflow", processes=1)
+    assert discrepancies and all(d.rules.lethal_hit for d in discrepancies)
+    # Minimal reproducer: default profiles, only the faulty flag
+    d = discrepancies[0]
+    assert (d.weapon, d.target, d.rules) == (WeaponProfile(), TargetProfile(), RuleSet(lethal_hit=True))
+    assert d.analytic - d.reference == pytest.approx(0.5)
+    assert check_case((d.weapon, d.target, d.rules), _buggy_average, "workflow") is not None
+
+    with pytest.raises(ValueError):
+        fuzz(nb_cases=1, analytic="unknown")
@@ -0,0 +1,62 @@
+"""
+Test module kernel.py: specialized kernels shall give the same results as `launch_workflow`.
+"""
+from itertools import product
+import pytest
+import os, sys
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common import kernel
+from src.common.kernel import FLAGS, evaluate, evaluate_batch, flags_key, get_kernel
+from src.common.profile import WeaponProfile, TargetProfile, RuleSet
+from src.common.workflow import launch_workflow_profiles
+from src.common.enemy import opponent_datasheets
+
+WEAPONS = [WeaponProfile(nb_figs=10, weapon_a="D6", hit_threshold=3, weapon_s=5, weapon_ap=1, weapon_d="D3"),
+           WeaponProfile(nb_figs=5, weapon_a=2, hit_threshold=4, weapon_s=12, weapon_ap=3, weapon_d=6)]
+TARGETS = [TargetProfile.from_datasheet(carac) for carac in opponent_datasheets.values()]
+
+
+def all_rules():
+    """
+    All combinations of flags (with sustain hit and criticals at 5+).
+    """
+    for values in product([False, True], repeat=len(FLAGS)):
+        yield RuleSet(crit=5, sustain_hit="D3", **dict(zip(FLAGS, values)))
+
+
+def test_kernels_equal_workflow():
+    for rules in all_rules():
+        for weapon, target in product(WEAPONS, TARGETS):
+            expected = launch_workflow_profiles(weapon, target, rules)
+            assert evaluate(weapon, target, rules) == pytest.approx(expected)
+
+
+def test_kernel_cache():
+    rules = RuleSet(lethal_hit=True)
+    assert get_kernel(flags_key(rules)) is get_kernel(flags_key(RuleSet(lethal_hit=True, crit=5)))
+
+
+def test_evaluate_batch():
+    rows = [(weapon, target, rules) for rules in list(all_rules())[::7] for weapon, target in product(WEAPONS, TARGETS)]
+    expected = [launch_workflow_profiles(*row) for row in rows]
+
+    assert evaluate_batch(rows) == pytest.approx(expected)
+
+
+def test_evaluate_batch_vectorized(monkeypatch):
+    pytest.importorskip("numpy")
+    monkeypatch.setattr(kernel, "VECTORIZE_MIN_ROWS", 1)
+
+    rows = [(weapon.replace(nb_figs=n), target, rules) for rules in list(all_rules())[::5]
+            for weapon, target in product(WEAPONS, TARGETS) for n in (1, 7, 20)]
+    expected = [launch_workflow_profiles(*row) for row in rows]
+
+    for (dead, hp), (expected_dead, expected_hp) in zip(evaluate_batch(rows), expected):
+        assert dead == expected_dead
+        assert hp == pytest.approx(expected_hp, abs=1e-9)
@@ -0,0 +1,68 @@
+"""
+Test module montecarlo.py
+"""
+import pytest
+import os, sys
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.montecarlo import UniformStream, simulate, compare, simulate_trial
+from src.common.profile import WeaponProfile, TargetProfile, RuleSet
+
+# 20 attacks, 3+ > 4+ > 4+ (save 3+, AP 1) on 1 HP enemies: 20 * 2/3 * 1/2 * 1/2 = 3.33 dead
+WEAPON = WeaponProfile(nb_figs=10, weapon_a=2, hit_threshold=3, weapon_s=4, weapon_ap=1, weapon_d=1)
+TARGET = TargetProfile(enemy_toughness=4, svg_enemy=3, svg_invul_enemy=7, fnp_enemy=7, enemy_hp=1)
+
+
+def test_uniform_stream_mirror():
+    u = UniformStream(seed=1)
+    draws = [u() for _ in range(5)]
+    mirrored = u.mirror(seed=2)
+    assert [pytest.approx(1 - x) for x in draws] == [mirrored() for _ in range(5)]
+
+    # Reproducible
+    assert UniformStream(seed=1)() == draws[0]
+
+
+def test_simulate():
+    r = simulate(WEAPON, TARGET, RuleSet(), nb_trials=2000)
+    assert r.mean_dead == r.mean_hp_lost  # 1 HP enemies
+    # Within 4 standard errors of the expected value
+    assert abs(r.mean_hp_lost - 20 * 2 / 3 * 1 / 2 * 1 / 2) < 4 * r.std_error
+
+    assert simulate(WEAPON, TARGET, RuleSet(), nb_trials=100) == simulate(WEAPON, TARGET, RuleSet(), nb_trials=100)
+
+    with pytest.raises(ValueError):
+        simulate(WEAPON, TARGET, RuleSet(), nb_trials=1)
+
+
+def test_torrent_lethal_devastating():
+    # Torrent: no hit dice, so no critical hit (lethal hits never proc)
+    # (with crit at 1+, every hit dice would be a lethal hit > 20 wounds)
+    no_save = TARGET.replace(svg_enemy=7)
+    r = simulate(WEAPON, no_save, RuleSet(torrent=True, lethal_hit=True, crit=1), nb_trials=200)
+    assert abs(r.mean_hp_lost - 20 * 1 / 2) < 4 * r.std_error
+    assert simulate_trial(WEAPON, no_save, RuleSet(lethal_hit=True, crit=1), UniformStream(0)) == (20, 20)
+
+    # Critical at 1+ with devastating wounds: all wounds ignore saves
+    r = simulate(WEAPON, TARGET.replace(svg_enemy=2, svg_invul_enemy=2),
+                 RuleSet(torrent=True, crit_wounds=1, devastating_wounds=True), nb_trials=10)
+    assert r.mean_hp_lost == 20
+
+
+def test_variance_reduction():
+    profiles = [(WEAPON, TARGET, RuleSet()), (WEAPON.replace(weapon_s=5), TARGET, RuleSet())]
+
+    crn = compare(profiles, nb_trials=500)
+    independent = compare(profiles, nb_trials=500, common_random_numbers=False)
+    assert crn.variance_reductions[1] > 2
+    assert crn.std_errors[1] < independent.std_errors[1]
+
+    # Antithetic
+    r = simulate(WEAPON, TARGET, RuleSet(), nb_trials=1000, antithetic=True)
+    assert r.nb_trials == 1000
+    assert r.variance_reduction > 1
@@ -0,0 +1,92 @@
+"""
+Test module profile.py
+"""
+import pickle
+import pytest
+import os, sys
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.profile import WeaponProfile, TargetProfile, RuleSet, profiles_from_kwargs
+from src.common.workflow import launch_workflow, launch_workflow_profiles
+from src.common.enemy import opponent_datasheets
+
+
+def test_validation():
+    with pytest.raises(ValueError):
+        WeaponProfile(weapon_a="aba")
+    with pytest.raises(ValueError):
+        WeaponProfile(hit_threshold=8)
+    with pytest.raises(ValueError):
+        WeaponProfile(nb_figs=-1)
+    with pytest.raises(ValueError):
+        TargetProfile(enemy_hp=0)
+    with pytest.raises(ValueError):
+        RuleSet(sustain_hit="x")
+    # Wound modifiers are capped to +1 / -1
+    with pytest.raises(ValueError):
+        RuleSet(bonus_wound=10)
+    with pytest.raises(ValueError):
+        RuleSet(bonus_wound=-2)
+    assert RuleSet(bonus_wound=-1).bonus_wound == -1
+
+    # Missing saves are stored as 7
+    target = TargetProfile.from_datasheet(opponent_datasheets["marine"])
+    assert target.svg_invul_enemy == 7 and target.fnp_enemy == 7
+
+    # CSV floats are accepted if they are int
+    assert TargetProfile(svg_invul_enemy=5.0).svg_invul_enemy == 5
+
+
+def test_frozen_and_hashable():
+    weapon = WeaponProfile(weapon_a="D3", weapon_d="d6+1")
+    with pytest.raises(AttributeError):
+        weapon.weapon_s = 5
+
+    # Usable as dict key, equal if same content
+    cache = {weapon: 1}
+    assert cache[WeaponProfile(weapon_a="D3", weapon_d="D6+1")] == 1
+    assert weapon != weapon.replace(weapon_s=5)
+    assert weapon.replace(weapon_s=5).weapon_s == 5
+    assert weapon.average_d == 4.5
+
+    # No `__dict__` (slots)
+    assert not hasattr(weapon, "__dict__")
+
+    assert pickle.loads(pickle.dumps(weapon)) == weapon
+
+
+def test_rule_set_incompatible_options():
+    rules = RuleSet(torrent=True, rr_hit_all=True, fish_hit=True, twin=True, rr_wounds_ones=True)
+    assert not rules.rr_hit_all and not rules.fish_hit and not rules.rr_wounds_ones
+    assert RuleSet(rr_hit_all=True, fish_hit=True).fish_hit
+
+
+def test_launch_workflow_profiles():
+    # Same results as `launch_workflow`
+    kwargs = dict(nb_figs=10, weapon_a="D6", hit_threshold=3, weapon_s=5, weapon_ap=1, weapon_d="D3",
+                  crit=5, crit_wounds=6, bonus_wound=0, torrent=False, rr_hit_ones=False, rr_hit_all=True,
+                  sustain_hit="D3", lethal_hit=True, rr_wounds_ones=False, twin=True, devastating_wounds=True,
+                  fish_hit=True, fish_wound=True)
+
+    for name, carac in opponent_datasheets.items():
+        target = TargetProfile.from_datasheet(carac)
+        weapon = WeaponProfile(**{k: kwargs[k] for k in WeaponProfile._FIELDS})
+        rules = RuleSet(**{k: kwargs[k] for k in RuleSet._FIELDS})
+
+        expected = launch_workflow(**kwargs, **target.as_kwargs(), verbose=False)
+        assert launch_workflow_profiles(weapon, target, rules) == pytest.approx(expected)
+
+
+def test_profiles_from_kwargs():
+    weapon, target, rules = profiles_from_kwargs(weapon_s=5, enemy_hp=3, twin=True)
+    assert (weapon.weapon_s, target.enemy_hp, rules.twin) == (5, 3, True)
+    # Missing arguments: default values
+    assert weapon.weapon_ap == WeaponProfile().weapon_ap
+
+    with pytest.raises(TypeError):
+        profiles_from_kwargs(unknown=1)
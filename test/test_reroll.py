@@ -0,0 +1,62 @@
+"""
+Test module reroll.py
+"""
+import pytest
+import os, sys
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.reroll import optimal_reroll_policy
+from src.common.montecarlo import simulate
+from src.common.profile import WeaponProfile, TargetProfile, RuleSet
+
+WEAPON = WeaponProfile(nb_figs=10, weapon_a=1, hit_threshold=4, weapon_s=4, weapon_ap=0, weapon_d=1)
+TARGET = TargetProfile(enemy_toughness=4, svg_enemy=4, svg_invul_enemy=7, fnp_enemy=7, enemy_hp=1)
+
+
+def test_no_reroll():
+    # 10 * 1/2 * 1/2 * 1/2
+    policy = optimal_reroll_policy(WEAPON, TARGET, RuleSet())
+    assert policy.hit_rerolls == () and policy.wound_rerolls == ()
+    assert policy.expected_damage == pytest.approx(10 / 8)
+    assert policy.expected_damage == pytest.approx(policy.expected_damage_rules)
+
+
+def test_fish_devastating_wounds():
+    # 2+ save: a normal wound is worth 1/6, a devastating wound 1 > re-roll everything but the 6
+    target = TARGET.replace(svg_enemy=2)
+    policy = optimal_reroll_policy(WEAPON, target, RuleSet(twin=True, devastating_wounds=True))
+    assert policy.wound_rerolls == (1, 2, 3, 4, 5)
+    assert policy.expected_damage >= policy.expected_damage_rules
+
+    # Without devastating wounds: re-roll failures only
+    assert optimal_reroll_policy(WEAPON, target, RuleSet(twin=True)).wound_rerolls == (1, 2, 3)
+
+    # Only the ones can be re-rolled
+    assert optimal_reroll_policy(WEAPON, target, RuleSet(rr_wounds_ones=True)).wound_rerolls == (1,)
+
+
+def test_rules_policy_vs_simulation():
+    rules = RuleSet(rr_hit_all=True, fish_hit=True, sustain_hit=2, twin=True, crit=5)
+    # NB: damage 1 > no damage lost on figurines already wounded (not modeled by the per dice values)
+    weapon = WEAPON.replace(weapon_a=2)
+    target = TARGET.replace(enemy_hp=2, fnp_enemy=5)
+
+    policy = optimal_reroll_policy(weapon, target, rules)
+    r = simulate(weapon, target, rules, nb_trials=3000)
+    assert abs(policy.expected_damage_rules - r.mean_hp_lost) < 4 * r.std_error
+    assert policy.expected_damage >= policy.expected_damage_rules
+
+
+def test_single_reroll():
+    # 1 attack, 4+ > 4+ > 4+: re-rolling a failed hit doubles the expected damage
+    policy = optimal_reroll_policy(WEAPON.replace(nb_figs=1), TARGET, RuleSet())
+    assert policy.single_reroll_stage == "hit"
+    assert policy.single_reroll_gain == pytest.approx(policy.expected_damage / 2)
+
+    # Torrent: no hit dice
+    assert optimal_reroll_policy(WEAPON, TARGET, RuleSet(torrent=True)).single_reroll_stage == "wound"
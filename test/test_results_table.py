@@ -0,0 +1,102 @@
+"""
+Test module results_table.py
+"""
+import pytest
+import os, sys
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.dice import compute_average_enemy_dead
+from src.common.engine import evaluate
+from src.common.profile import WeaponProfile, TargetProfile, RuleSet
+from src.common.results_table import ResultsTable, visible_range, NAME_COLUMN, VALUE_COLUMN
+
+WEAPON = WeaponProfile(nb_figs=10, weapon_s=5, weapon_ap=1, weapon_d=2)
+DATASHEETS = {f"unit {i:03d}": {"svg": 2 + i % 5, "svg invul": None, "feel no pain": None, "toughness": 3 + i % 8,
+                                "w": 1 + i % 4}
+              for i in range(200)}
+
+
+def test_visible_range():
+    assert visible_range(1., 100, 10, 1000) == (0, 11)
+    assert visible_range(0., 100, 10, 1000) == (990, 1000)
+    assert visible_range(0.5, 100, 10, 5) == (0, 5)
+
+
+def test_no_inputs():
+    # Before the first submit (scroll, sort): nothing computed
+    table = ResultsTable(list(DATASHEETS), DATASHEETS)
+    table.set_visible(0, 10)
+    assert table.wanted(include_rest=False) and table.compute(table.wanted(include_rest=False)) == []
+    assert table.values == [None] * len(DATASHEETS)
+
+
+def test_lazy_computation():
+    table = ResultsTable(list(DATASHEETS), DATASHEETS, margin=5)
+    generation = table.set_inputs(WEAPON, RuleSet())
+    table.set_visible(50, 60)
+
+    # Visible rows first, then the margin, then the others
+    wanted = table.wanted(include_rest=False)
+    assert wanted[:10] == list(range(50, 60)) and sorted(wanted) == list(range(45, 65))
+    assert table.compute(wanted, generation) == wanted
+    assert all(table.values[row] is None for row in range(45)) and table.data()[0]["value"] == ""
+    assert table.wanted(limit=3) == [65, 66, 67]
+
+    # Same value as the app
+    target = TargetProfile.from_datasheet(DATASHEETS["unit 050"])
+    result = evaluate(WEAPON, target, RuleSet())
+    assert table.values[50] == compute_average_enemy_dead(result.enemy_dead, result.remaining_hp, target.enemy_hp)
+
+    # New inputs: results of the old ones are dropped
+    assert table.set_inputs(WEAPON.replace(weapon_s=8), RuleSet()) == generation + 1
+    assert table.compute([0], generation) == [] and table.values[0] is None
+    assert not table.set_value(0, 1., generation)
+
+
+def test_sort():
+    table = ResultsTable(list(DATASHEETS), DATASHEETS)
+    table.set_inputs(WEAPON, RuleSet())
+    table.compute(list(range(0, 200, 2)))
+
+    table.sort(VALUE_COLUMN, reverse=True)
+    values = [table.values[row] for row in table.order]
+    assert values[:100] == sorted(values[:100], reverse=True) and values[100:] == [None] * 100
+
+    table.sort(NAME_COLUMN, reverse=True)
+    assert table.data()[0]["name"] == "unit 199"
+    table.set_visible(0, 3)
+    assert table.visible_rows() == [199, 198, 197]
+    with pytest.raises(ValueError):
+        table.sort("unknown")
+
+
+def test_changes():
+    table = ResultsTable(list(DATASHEETS), DATASHEETS)
+    generation = table.set_inputs(WEAPON, RuleSet())
+    # New inputs: the whole data is reloaded, then only the rows changed since
+    assert table.changes() is None
+    assert table.changes() == []
+    table.compute([3, 1], generation)
+    assert [position for position, _ in table.changes()] == [1, 3]
+    assert table.changes() == []
+
+    # Sorted: reloaded, then positions in the new order
+    table.sort(NAME_COLUMN, reverse=True)
+    assert table.changes() is None
+    table.set_value(0, 1.5, generation, refining=True)
+    assert table.changes() == [(199, {"name": "unit 000 ...", "value": "1.50"})]
+
+
+def test_claim_refinement():
+    table = ResultsTable(list(DATASHEETS), DATASHEETS)
+    generation = table.set_inputs(WEAPON, RuleSet())
+    # Each row refined once per generation (rows scrolled to later are refined then)
+    assert table.claim_refinement([0, 1, 2], generation) == [0, 1, 2]
+    assert table.claim_refinement([1, 2, 3], generation) == [3]
+    assert table.claim_refinement([4], generation - 1) == []
+    assert table.claim_refinement([0], table.set_inputs(WEAPON, RuleSet())) == [0]
@@ -0,0 +1,161 @@
+"""
+Test module service.py
+"""
+import pytest
+import src.common.service as service
+import os, sys
+import json
+import threading
+from urllib.error import HTTPError
+from urllib.request import urlopen, Request
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.service import EvaluationService, MicroBatcher, ResultCache, make_server
+from src.common.kernel import evaluate
+from src.common.profile import WeaponProfile, TargetProfile, RuleSet
+
+REQUEST = {"weapon": {"nb_figs": 10, "weapon_a": 2, "weapon_s": 5, "weapon_ap": 1, "weapon_d": "D3"},
+           "target": {"enemy_toughness": 4, "svg_enemy": 3, "enemy_hp": 2},
+           "rules": {"sustain_hit": 1}}
+
+
+@pytest.fixture
+def url():
+    """
+    Service running on a free port of localhost.
+    """
+    server = make_server("127.0.0.1", 0, EvaluationService(window=0.02))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    server.service.close()
+
+
+def _post(url, content):
+    request = Request(url, data=json.dumps(content).encode(), headers={"Content-Type": "application/json"})
+    with urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def _get(url):
+    with urlopen(url, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def test_evaluate(url):
+    """
+    Same result as the kernel.
+    """
+    result = _post(url + "/evaluate", REQUEST)
+    enemy_dead, remaining_hp = evaluate(WeaponProfile(**REQUEST["weapon"]), TargetProfile(**REQUEST["target"]),
+                                        RuleSet(**REQUEST["rules"]))
+    assert result == {"enemy_dead": enemy_dead, "remaining_hp": remaining_hp}
+
+
+def test_evaluate_batch(url):
+    rows = [{"weapon": {"weapon_s": s}} for s in range(3, 9)]
+    results = _post(url + "/evaluate_batch", {"rows": rows})["results"]
+    assert len(results) == 6
+    assert results[0] == _post(url + "/evaluate", rows[0])
+
+
+def test_micro_batching(url):
+    """
+    Concurrent requests are merged into a few batches, duplicates of a batch are evaluated once.
+    """
+    results = [None] * 20
+
+    def call(k):
+        results[k] = _post(url + "/evaluate", {"weapon": {"weapon_s": 3 + k % 5}})
+
+    threads = [threading.Thread(target=call, args=(k,)) for k in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = _get(url + "/stats")
+    assert stats["requests"] == 20
+    assert stats["batches"] < 20
+    assert 5 <= stats["rows_evaluated"] < 20
+    assert stats["latency_p99_ms"] >= stats["latency_p50_ms"] > 0
+    assert results[0] == results[5]
+
+
+def test_bad_request(url):
+    with pytest.raises(HTTPError) as e:
+        _post(url + "/evaluate", {"weapon": {"weapon_s": "strong"}})
+    assert e.value.code == 400
+    with pytest.raises(HTTPError) as e:
+        _post(url + "/unknown", {})
+    assert e.value.code == 404
+
+
+def test_evaluation_error(url, monkeypatch):
+    """
+    A row failing: only its request gets an error (500), the other rows of the batch are evaluated.
+    """
+    evaluate_batch = service.evaluate_batch
+
+    def failing_batch(rows):
+        if any(weapon.nb_figs == 13 for weapon, _, _ in rows):
+            raise RuntimeError("unlucky")
+        return evaluate_batch(rows)
+
+    monkeypatch.setattr(service, "evaluate_batch", failing_batch)
+    results = [None] * 2
+
+    def call(k, nb_figs):
+        try:
+            results[k] = _post(url + "/evaluate", {"weapon": {"nb_figs": nb_figs}})
+        except HTTPError as e:
+            results[k] = e.code
+
+    threads = [threading.Thread(target=call, args=(0, 13)), threading.Thread(target=call, args=(1, 12))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results[0] == 500 and set(results[1]) == {"enemy_dead", "remaining_hp"}
+
+
+def test_close(monkeypatch):
+    """
+    Requests still queued when the batcher is closed are woken up with an error.
+    """
+    # The batcher is held in the evaluation of a first request, while a second one is queued
+    evaluating, release = threading.Event(), threading.Event()
+
+    def blocking_batch(rows):
+        evaluating.set()
+        release.wait(10)
+        return [(0., 0.)] * len(rows)
+
+    monkeypatch.setattr(service, "evaluate_batch", blocking_batch)
+    batcher = MicroBatcher(ResultCache(10), window=0.)
+    results = {}
+    first = threading.Thread(target=lambda: results.update(first=batcher.submit([(WeaponProfile(), TargetProfile(),
+                                                                                   RuleSet())])))
+    second = threading.Thread(target=lambda: results.update(second=batcher.submit([(WeaponProfile(nb_figs=3),
+                                                                                    TargetProfile(), RuleSet())])))
+    first.start()
+    assert evaluating.wait(10)
+    second.start()
+    while not batcher._queue:
+        second.join(0.01)
+    closing = threading.Thread(target=batcher.close)
+    closing.start()
+    while batcher._running:
+        closing.join(0.01)
+    release.set()
+    for thread in (first, second, closing):
+        thread.join(10)
+        assert not thread.is_alive()
+    assert results["first"] == [(0., 0.)] and type(results["second"][0]).__name__ == "EvaluationError"
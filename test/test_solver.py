@@ -0,0 +1,62 @@
+"""
+Test module solver.py
+"""
+import pytest
+import os, sys
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.solver import solve, solve_batch, average_dead, kill_probability
+from src.common.profile import WeaponProfile, TargetProfile, RuleSet
+from src.common.enemy import opponent_datasheets
+
+WEAPON = WeaponProfile(nb_figs=1, weapon_a=1, hit_threshold=4, weapon_s=4, weapon_ap=0, weapon_d=1)
+# 4+ > 4+ > 4+ on 1 HP enemies: 1/8 dead per attack
+TARGET = TargetProfile(enemy_toughness=4, svg_enemy=4, svg_invul_enemy=7, fnp_enemy=7, enemy_hp=1)
+
+
+def brute_force(parameter, values, goal):
+    """
+    First value of `values` for which the average dead reaches `goal`.
+    """
+    for v in values:
+        if average_dead(WEAPON.replace(**{parameter: v}), TARGET, RuleSet()) >= goal:
+            return v
+
+
+def test_solve_average():
+    # 1 dead on average: 8 attacks
+    assert solve(WEAPON, TARGET, RuleSet(), parameter="nb_figs", min_dead=1) == 8
+    assert solve(WEAPON, TARGET, RuleSet(), parameter="nb_figs", min_dead=2.5) == brute_force("nb_figs", range(1, 100), 2.5)
+
+    w = WEAPON.replace(nb_figs=10)
+    assert solve(w, TARGET, RuleSet(), parameter="weapon_ap", min_dead=1.5) == 1  # 10 * 1/2 * 1/2 * 2/3 = 1.67
+    assert solve(w, TARGET, RuleSet(), parameter="weapon_s", min_dead=1.5) == 5  # 10 * 1/2 * 2/3 * 1/2 = 1.67
+    assert solve(w, TARGET, RuleSet(), parameter="hit_threshold", min_dead=1.5) == 3  # 10 * 2/3 * 1/2 * 1/2 = 1.67
+    # Unreachable
+    assert solve(w, TARGET, RuleSet(), parameter="weapon_ap", min_dead=100) is None
+    assert solve(w, TARGET, RuleSet(), parameter="nb_figs", min_dead=10 ** 6) is None
+
+    with pytest.raises(ValueError):
+        solve(w, TARGET, RuleSet(), parameter="svg_enemy")
+    with pytest.raises(ValueError):
+        solve(w, TARGET, RuleSet(), parameter="hit_threshold", min_dead=1.5, max_value=4)
+
+
+def test_solve_probability():
+    # P(at least one dead) = 1 - (7/8)^n >= 0.8 --> n = 13 (exact), Monte Carlo: around 13
+    n = solve(WEAPON, TARGET, RuleSet(), parameter="nb_figs", min_dead=1, probability=0.8, nb_trials=2000)
+    assert 11 <= n <= 15
+    assert kill_probability(WEAPON.replace(nb_figs=n), TARGET, RuleSet(), 1, 2000) >= 0.8
+
+
+def test_solve_batch():
+    targets = {name: TargetProfile.from_datasheet(carac) for name, carac in opponent_datasheets.items()}
+    result = solve_batch(WEAPON.replace(weapon_a=2), targets, RuleSet(), parameter="nb_figs", min_dead=1)
+
+    assert result["marine"] >= result["astra militarum"]
+    assert result["heavy imperial knight"] is None or result["heavy imperial knight"] > result["marine"]
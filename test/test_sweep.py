@@ -0,0 +1,100 @@
+"""
+Test module sweep.py
+"""
+import csv
+import pytest
+import os, sys
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.sweep import iter_record_batches, run_sweep, open_sweep, SweepWriter
+from src.common.workflow import launch_workflow
+
+GRID = {"weapon_s": [3, 4, 5], "weapon_ap": [0, 1], "weapon_d": [1, "D3"], "enemy_toughness": [4]}
+
+
+def test_iter_record_batches():
+    # 3 * 2 * 2 * 1 = 12 rows, by batch of 5 > 5, 5, 2
+    sizes = [len(batch["enemy_dead"]) for batch in iter_record_batches(GRID, batch_size=5)]
+    assert sizes == [5, 5, 2]
+
+    # Dictionary encoding: first row is the first value of each list
+    batch = next(iter_record_batches(GRID, batch_size=5))
+    assert batch["weapon_s"][0] == 0 and batch["weapon_d"][1] == 1
+
+    # Results are the ones of `launch_workflow`
+    expected = launch_workflow(weapon_s=3, weapon_ap=0, weapon_d="D3", enemy_toughness=4, verbose=False)
+    assert pytest.approx(batch["enemy_dead"][1]) == expected[0]
+    assert pytest.approx(batch["remaining_hp"][1]) == expected[1]
+
+    with pytest.raises(ValueError):
+        next(iter_record_batches(GRID, result_dtype="int8"))
+
+
+def test_float32():
+    batch = next(iter_record_batches(GRID, result_dtype="float32"))
+    assert batch["remaining_hp"].typecode == "f"
+
+
+def test_run_sweep_csv(tmp_path):
+    path = str(tmp_path / "sweep.csv")
+    assert run_sweep(GRID, path, batch_size=4) == 12
+
+    with open(path) as file:
+        rows = list(csv.DictReader(file, delimiter=";"))
+    assert len(rows) == 12
+    assert rows[1]["weapon_d"] == "D3"
+
+    with pytest.raises(ValueError):
+        run_sweep(GRID, str(tmp_path / "sweep.txt"))
+
+
+def test_run_sweep_arrow(tmp_path):
+    pytest.importorskip("pyarrow")
+
+    for extension in (".arrow", ".parquet"):
+        path = str(tmp_path / f"sweep{extension}")
+        assert run_sweep(GRID, path, batch_size=4, result_dtype="float32") == 12
+
+        dataset = open_sweep(path)
+        assert dataset.count_rows() == 12
+        assert dataset.to_table().column("weapon_d").to_pylist()[1] == "D3"
+
+
+def test_arrow_batches(tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow.dataset as ds
+
+    # Reference: one batch per row, copied before the buffers are reused
+    expected = [(batch["enemy_dead"][0], batch["remaining_hp"][0])
+                for batch in iter_record_batches(GRID, batch_size=1, result_dtype="float64")]
+
+    for extension in (".arrow", ".parquet"):
+        # 3 batches: the buffers exported to Arrow are reused between them, written values must not change
+        path = str(tmp_path / f"sweep{extension}")
+        run_sweep(GRID, path, batch_size=5, result_dtype="float64")
+
+        dataset = open_sweep(path)
+        table = dataset.to_table()
+        assert list(zip(table.column("enemy_dead").to_pylist(), table.column("remaining_hp").to_pylist())) == expected
+        assert table.column("weapon_s").to_pylist() == [GRID["weapon_s"][i // 4] for i in range(12)]
+
+        # Filter and projection pushed down to the scan
+        threshold = sorted(e for e, _ in expected)[6]
+        filtered = dataset.to_table(columns=["enemy_dead"], filter=ds.field("enemy_dead") > threshold)
+        assert filtered.column_names == ["enemy_dead"]
+        assert filtered.num_rows == sum(e > threshold for e, _ in expected)
+
+
+def test_incomplete_writer(tmp_path):
+    # A writer without `close`: fails when instantiated, not at the end of the sweep
+    class IncompleteWriter(SweepWriter):
+        def write_batch(self, batch):
+            pass
+
+    with pytest.raises(TypeError):
+        IncompleteWriter(str(tmp_path / "out"), {"weapon_s": [4]})
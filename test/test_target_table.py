@@ -0,0 +1,39 @@
+"""
+Test module target_table.py
+"""
+import pytest
+import os, sys
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.dice import proba_dice, get_wound_threshold
+from src.common.enemy import opponent_datasheets, opponent_tables
+from src.common.profile import TargetProfile
+from src.common.target_table import compute_target_table, target_table, TargetTable
+
+
+def test_shipped_tables_up_to_date():
+    """
+    Tables of `enemy.py` shall be the ones computed from the datasheets (else: run `build_enemy.py`).
+    """
+    assert set(opponent_tables) == set(opponent_datasheets)
+    for name, carac in opponent_datasheets.items():
+        target = TargetProfile.from_datasheet(carac)
+        assert TargetTable.from_dict(opponent_tables[name]) == compute_target_table(target)
+        assert target_table(target) == compute_target_table(target)
+
+
+def test_lookups():
+    target = TargetProfile(enemy_toughness=5, svg_enemy=3, svg_invul_enemy=5, fnp_enemy=6, enemy_hp=3)
+    table = target_table(target)
+    # AP applied, then invulnerable save, no save above AP 4
+    assert table.save == (3, 4, 5, 5, 5, 5, 5)
+    assert table.failed_save(0) == proba_dice(3, False)
+    assert table.failed_save(10) == proba_dice(5, False)
+    assert table.proba_fnp_failed == proba_dice(6, False)
+    for weapon_s in range(1, 30):
+        assert table.wound(weapon_s) == get_wound_threshold(weapon_s, 5)
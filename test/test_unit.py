@@ -0,0 +1,88 @@
+"""
+Test module unit.py
+"""
+import pytest
+import os, sys
+
+# Go into root dir to enable imports
+ROOT_DIR = os.path.dirname(os.path.realpath(__file__)) + "/../"
+
+# Modify Python path to enable import custom modules in root dir.
+sys.path.append(ROOT_DIR)
+
+from src.common.unit import ModelGroup, TargetUnit, unit_distribution, group_table
+from src.common.distribution import exact_distribution
+from src.common.profile import WeaponProfile, TargetProfile, RuleSet
+
+WEAPON = WeaponProfile(nb_figs=10, weapon_a=2, hit_threshold=3, weapon_s=5, weapon_ap=1, weapon_d="D3")
+BODYGUARD = TargetProfile(enemy_toughness=4, svg_enemy=3, enemy_hp=2)
+LEADER = TargetProfile(enemy_toughness=4, svg_enemy=2, svg_invul_enemy=4, fnp_enemy=5, enemy_hp=5)
+
+
+def test_toughness():
+    """
+    Toughness of the majority of the models, the highest on ties.
+    """
+    unit = TargetUnit((ModelGroup(BODYGUARD, 5), ModelGroup(LEADER.replace(enemy_toughness=5), 1)))
+    assert unit.toughness == 4
+    assert unit.nb_models == 6
+    unit = TargetUnit((ModelGroup(BODYGUARD, 1), ModelGroup(LEADER.replace(enemy_toughness=5), 1)))
+    assert unit.toughness == 5
+
+
+def test_single_group():
+    """
+    A unit of one group is a homogeneous target: same result as the exact distribution.
+    """
+    unit = TargetUnit((ModelGroup(BODYGUARD, 100),))
+    expected = exact_distribution(WEAPON, BODYGUARD, RuleSet())
+    result = unit_distribution(WEAPON, unit, RuleSet())
+    assert result.mean_dead == pytest.approx(expected.mean_dead, abs=1e-9)
+    assert result.mean_hp_lost == pytest.approx(expected.mean_hp_lost, abs=1e-9)
+    assert result.kill_probability(3) == pytest.approx(expected.kill_probability(3), abs=1e-9)
+
+
+def test_leader():
+    """
+    The leader only takes wounds once the bodyguards are dead.
+    """
+    unit = TargetUnit((ModelGroup(BODYGUARD, 5, "bodyguard"), ModelGroup(LEADER, 1, "leader")))
+    result = unit_distribution(WEAPON, unit, RuleSet())
+    assert sum(result.dead_pmf.values()) == pytest.approx(1.)
+    assert 0 <= result.error < 1e-9
+    assert result.mean_dead == pytest.approx(sum(result.expected_dead))
+    # Leader dead => bodyguards wiped out
+    assert result.wipe_probabilities[1] <= result.wipe_probabilities[0]
+    assert result.wipe_probabilities[1] == pytest.approx(result.dead_pmf.get(6, 0.))
+    # A tougher leader: less HP lost, same kills among the bodyguards
+    tougher = TargetUnit((ModelGroup(BODYGUARD, 5), ModelGroup(LEADER.replace(enemy_hp=8), 1)))
+    tougher_result = unit_distribution(WEAPON, tougher, RuleSet())
+    assert tougher_result.expected_dead[0] == pytest.approx(result.expected_dead[0])
+    assert tougher_result.wipe_probabilities[1] <= result.wipe_probabilities[1]
+
+
+def test_group_cache():
+    """
+    Changing the leader does not recompute the table of the bodyguards.
+    """
+    group_table.cache_clear()
+    unit_distribution(WEAPON, TargetUnit((ModelGroup(BODYGUARD, 5), ModelGroup(LEADER, 1))), RuleSet())
+    unit_distribution(WEAPON, TargetUnit((ModelGroup(BODYGUARD, 5), ModelGroup(LEADER.replace(fnp_enemy=7), 1))),
+                      RuleSet())
+    info = group_table.cache_info()
+    assert info.misses == 3
+    assert info.hits == 1
+
+
+def test_pruning_error():
+    """
+    Mass dropped by the pruning: tracked (the probabilities kept plus the error sum to 1).
+    """
+    unit = TargetUnit((ModelGroup(BODYGUARD, 5), ModelGroup(LEADER, 1)))
+    exact = unit_distribution(WEAPON, unit, RuleSet(), epsilon=0.)
+    pruned = unit_distribution(WEAPON, unit, RuleSet(), epsilon=1e-6)
+    assert exact.error == 0. and 0 < pruned.error < 1e-3
+    assert sum(pruned.dead_pmf.values()) + pruned.error == pytest.approx(1., abs=1e-12)
+    for min_dead in range(7):
+        assert pruned.kill_probability(min_dead) <= exact.kill_probability(min_dead) + 1e-12
+        assert exact.kill_probability(min_dead) <= pruned.kill_probability(min_dead) + pruned.error + 1e-12